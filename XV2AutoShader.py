@@ -14,28 +14,199 @@ bl_info = {
 }
 
 import bpy
+import argparse
+import bisect
+import collections
+import contextlib
+import cProfile
+import hashlib
+import json
+import logging
 import os
 import re
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+import time
 import xml.etree.ElementTree as ET
-from bpy.props import StringProperty, EnumProperty, BoolProperty
+from concurrent.futures import ThreadPoolExecutor
+from bpy.app.handlers import persistent
+from bpy.props import StringProperty, EnumProperty, BoolProperty, IntProperty
 from bpy.types import AddonPreferences, Panel, Operator
 import struct
 import tempfile
 import mathutils
+import numpy as np
 _copied_dyt_image = None
 _copied_dyt_line = None
 
 
+# --- LOGGING ---
+# Everything goes through the "xv2autoshader" logger (WARNING by default). Messages use
+# %-style arguments so disabled levels never format; expensive debug-only work is
+# guarded with isEnabledFor. The sidebar can show recent records from a ring buffer.
+
+
+log = logging.getLogger("xv2autoshader")
+eye_log = log.getChild("eye")
+data_log = log.getChild("data")
+fix_log = log.getChild("dytfix")
+batch_log = log.getChild("batch")
+
+LOG_LEVELS = ("WARNING", "INFO", "DEBUG")
+LOG_LEVEL_ICONS = {"CRITICAL": 'CANCEL', "ERROR": 'CANCEL', "WARNING": 'ERROR'}
+LOG_FORMAT = "[%(name)s] %(levelname)s: %(message)s"
+
+
+class RingBufferHandler(logging.Handler):
+    """Keeps the most recent records in memory as (levelname, message) for the sidebar"""
+
+    def __init__(self, capacity=200):
+        super().__init__()
+        self.records = collections.deque(maxlen=capacity)
+
+    def resize(self, capacity):
+        if capacity != self.records.maxlen:
+            self.records = collections.deque(self.records, maxlen=capacity)
+
+    def emit(self, record):
+        try:
+            self.records.append((record.levelname, self.format(record)))
+        except Exception:
+            self.handleError(record)
+
+
+_log_buffer = RingBufferHandler()
+_log_buffer.setFormatter(logging.Formatter("%(message)s"))
+
+
+def configure_logging(level="WARNING", ui_buffer=False, ui_capacity=200):
+    """Set the addon's log level and attach the console and (optionally) sidebar handlers"""
+    for handler in list(log.handlers):
+        # Drop handlers left behind by a previous load of this module (addon reload)
+        if getattr(handler, "xv2_handler", False) and handler not in (_log_console, _log_buffer):
+            log.removeHandler(handler)
+    if _log_console not in log.handlers:
+        log.addHandler(_log_console)
+    if ui_buffer:
+        _log_buffer.resize(ui_capacity)
+        if _log_buffer not in log.handlers:
+            log.addHandler(_log_buffer)
+    elif _log_buffer in log.handlers:
+        log.removeHandler(_log_buffer)
+    log.setLevel(level)
+    log.propagate = False
+
+
+_log_console = logging.StreamHandler(sys.stdout)
+_log_console.setFormatter(logging.Formatter(LOG_FORMAT))
+_log_console.xv2_handler = True
+_log_buffer.xv2_handler = True
+configure_logging()
+
+
+def apply_logging_prefs(prefs):
+    configure_logging(prefs.log_level, prefs.log_to_sidebar, prefs.log_sidebar_capacity)
+
+
+# --- STAGE TIMING ---
+# Apply wraps its stages in `with stage("name"):`. Without an active StageTimer this
+# returns one shared null context, so the instrumentation costs a global lookup.
+
+
+_NULL_STAGE = contextlib.nullcontext()
+_stage_timer = None
+_last_apply_timings = None
+
+
+class _Stage:
+    __slots__ = ("timer", "name", "material", "start", "child")
+
+    def __init__(self, timer, name, material):
+        self.timer = timer
+        self.name = name
+        self.material = material
+
+    def __enter__(self):
+        self.child = 0.0
+        self.timer.stack.append(self)
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        timer = self.timer
+        timer.stack.pop()
+        # Stage times are exclusive: nested stages are not counted twice
+        timer.stages[self.name] = timer.stages.get(self.name, 0.0) + elapsed - self.child
+        if timer.stack:
+            timer.stack[-1].child += elapsed
+        if self.material:
+            timer.materials[self.material] = timer.materials.get(self.material, 0.0) + elapsed
+        return False
+
+
+class StageTimer:
+    """Wall time per Apply stage and per material for one run"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stack = []
+        self.stages = {}
+        self.materials = {}
+
+    def summary(self, top_n=5):
+        return {
+            "total": time.perf_counter() - self.start,
+            "stages": sorted(self.stages.items(), key=lambda item: item[1], reverse=True),
+            "slowest_materials": sorted(self.materials.items(), key=lambda item: item[1], reverse=True)[:top_n],
+        }
+
+
+def stage(name, material=None):
+    """Time a block as stage name (and towards material's total) when a StageTimer is active"""
+    if _stage_timer is None:
+        return _NULL_STAGE
+    return _Stage(_stage_timer, name, material)
+
+
+def set_stage_timer(timer):
+    global _stage_timer
+    _stage_timer = timer
+
+
+def format_timing_summary(summary):
+    lines = [f"XV2 Apply timings: {summary['total'] * 1000:.1f} ms total"]
+    lines += [f"    {name}: {seconds * 1000:.1f} ms" for name, seconds in summary["stages"]]
+    if summary["slowest_materials"]:
+        lines.append("  Slowest materials:")
+        lines += [f"    {name}: {seconds * 1000:.1f} ms" for name, seconds in summary["slowest_materials"]]
+    return lines
+
+
+def profile_output_path():
+    """<blend name>_xv2_apply_<time>.prof next to the .blend, or in the temp folder when unsaved"""
+    stamp = time.strftime("%Y%m%d_%H%M%S")
+    if bpy.data.filepath:
+        folder = os.path.dirname(bpy.data.filepath)
+        stem = os.path.splitext(os.path.basename(bpy.data.filepath))[0]
+    else:
+        folder = bpy.app.tempdir or tempfile.gettempdir()
+        stem = "untitled"
+    return os.path.join(folder, f"{stem}_xv2_apply_{stamp}.prof")
+
+
 # --- NODE GROUP DEFINITIONS ---
 
 
 def scan_and_store_dyt_data_files(mat, dyt_image):
     """Scan for DATA_001.dds, DATA_002.dds etc. in the DYT image's folder and store results"""
-    print(f"[XV2 DATA DEBUG] Starting DATA scan for material: {mat.name}")
-    print(f"[XV2 DATA DEBUG] DYT image name: {dyt_image.name if dyt_image else 'None'}")
+    data_log.debug("Starting DATA scan for material: %s", mat.name)
+    data_log.debug("DYT image name: %s", dyt_image.name if dyt_image else 'None')
 
     if not mat or not dyt_image:
-        print(f"[XV2 DATA DEBUG] ABORT: Missing mat or dyt_image")
+        data_log.debug("ABORT: Missing mat or dyt_image")
         return
 
     # Method 1: Try image filepath
@@ -43,57 +214,57 @@ def scan_and_store_dyt_data_files(mat, dyt_image):
     if dyt_image.filepath:
         raw_path = dyt_image.filepath
         abs_path = bpy.path.abspath(dyt_image.filepath)
-        print(f"[XV2 DATA DEBUG] DYT image filepath (raw): '{raw_path}'")
-        print(f"[XV2 DATA DEBUG] DYT image filepath (absolute): '{abs_path}'")
-        print(f"[XV2 DATA DEBUG] Path exists: {os.path.exists(abs_path)}")
+        abs_exists = os.path.exists(abs_path)
+        data_log.debug("DYT image filepath (raw): '%s'", raw_path)
+        data_log.debug("DYT image filepath (absolute): '%s'", abs_path)
+        data_log.debug("Path exists: %s", abs_exists)
 
-        if os.path.exists(abs_path):
+        if abs_exists:
             dyt_path = abs_path
-            print(f"[XV2 DATA DEBUG] ✓ Using DYT path from image filepath: {dyt_path}")
+            data_log.debug("✓ Using DYT path from image filepath: %s", dyt_path)
         else:
-            print(f"[XV2 DATA DEBUG] ✗ DYT filepath doesn't exist on disk")
+            data_log.debug("✗ DYT filepath doesn't exist on disk")
     else:
-        print(f"[XV2 DATA DEBUG] ✗ DYT image has no filepath")
+        data_log.debug("✗ DYT image has no filepath")
 
     if not dyt_path:
-        print(f"[XV2 DATA DEBUG] ✗ Could not locate DYT file for '{mat.name}' - DATA scanning skipped")
+        data_log.warning("✗ Could not locate DYT file for '%s' - DATA scanning skipped", mat.name)
         return
 
-    # Now scan for DATA files in the same folder
-    dyt_folder = os.path.dirname(dyt_path)
-    print(f"[XV2 DATA DEBUG] DYT folder: {dyt_folder}")
-    print(f"[XV2 DATA DEBUG] Folder exists: {os.path.isdir(dyt_folder)}")
+    store_dyt_data_files(mat, dyt_path, find_dyt_data_files(os.path.dirname(dyt_path)))
+
+
+def find_dyt_data_files(dyt_folder):
+    """Sequential DATA_001.dds / DATA001.dds ... paths in dyt_folder. Touches only the filesystem."""
+    data_log.debug("DYT folder: %s", dyt_folder)
 
     if not os.path.isdir(dyt_folder):
-        print(f"[XV2 DATA DEBUG] ✗ DYT folder is not a directory")
-        return
+        data_log.debug("✗ DYT folder is not a directory")
+        return []
 
-    # List all files in the DYT folder for debugging
+    # List all files in the DYT folder for debugging; skipped entirely unless DEBUG is on
     try:
-        all_files = os.listdir(dyt_folder)
-        print(f"[XV2 DATA DEBUG] All files in DYT folder ({len(all_files)}): {all_files}")
+        all_files = os.listdir(dyt_folder) if data_log.isEnabledFor(logging.DEBUG) else []
+        data_log.debug("All files in DYT folder (%s): %s", len(all_files), all_files)
 
         # Filter to just .dds files
         dds_files = [f for f in all_files if f.lower().endswith('.dds')]
-        print(f"[XV2 DATA DEBUG] DDS files in folder: {dds_files}")
+        data_log.debug("DDS files in folder: %s", dds_files)
 
         # Filter to DATA_xxx.dds files (try both naming patterns)
         data_files_underscore = [f for f in dds_files if f.upper().startswith('DATA_')]
         data_files_no_underscore = [f for f in dds_files if
                                     f.upper().startswith('DATA') and not f.upper().startswith('DATA_')]
-        print(f"[XV2 DATA DEBUG] DATA_xxx.dds files found: {data_files_underscore}")
-        print(f"[XV2 DATA DEBUG] DATAxxx.dds files found: {data_files_no_underscore}")
+        data_log.debug("DATA_xxx.dds files found: %s", data_files_underscore)
+        data_log.debug("DATAxxx.dds files found: %s", data_files_no_underscore)
     except Exception as e:
-        print(f"[XV2 DATA DEBUG] Error listing files: {e}")
-
-    # Store original DYT path
-    mat["xv2_original_dyt_path"] = dyt_path
+        data_log.warning("Error listing files: %s", e)
 
     # Scan for DATA files - try both naming patterns
     available_data_files = []
     data_index = 1
 
-    print(f"[XV2 DATA DEBUG] Starting sequential DATA file scan...")
+    data_log.debug("Starting sequential DATA file scan...")
     while True:
         # Try pattern 1: DATA_001.dds (with underscore)
         data_filename_1 = f"DATA_{str(data_index).zfill(3)}.dds"
@@ -103,34 +274,55 @@ def scan_and_store_dyt_data_files(mat, dyt_image):
         data_filename_2 = f"DATA{str(data_index).zfill(3)}.dds"
         data_path_2 = os.path.join(dyt_folder, data_filename_2)
 
-        print(f"[XV2 DATA DEBUG] Checking for patterns:")
-        print(f"  Pattern 1: {data_filename_1} exists: {os.path.exists(data_path_1)}")
-        print(f"  Pattern 2: {data_filename_2} exists: {os.path.exists(data_path_2)}")
-
         if os.path.exists(data_path_1):
             available_data_files.append(data_path_1)
-            print(f"[XV2 DATA DEBUG] ✓ Found DATA file #{data_index}: {data_filename_1}")
+            data_log.debug("✓ Found DATA file #%s: %s", data_index, data_filename_1)
             data_index += 1
         elif os.path.exists(data_path_2):
             available_data_files.append(data_path_2)
-            print(f"[XV2 DATA DEBUG] ✓ Found DATA file #{data_index}: {data_filename_2}")
+            data_log.debug("✓ Found DATA file #%s: %s", data_index, data_filename_2)
             data_index += 1
         else:
-            print(f"[XV2 DATA DEBUG] ✗ DATA file #{data_index} not found in either pattern, stopping scan")
+            data_log.debug("✗ DATA file #%s not found in either pattern, stopping scan", data_index)
             break  # Stop when we don't find the next sequential DATA file
 
+    return available_data_files
+
+
+_data_files_cache = {}
+
+
+def get_dyt_data_files(dyt_folder):
+    """find_dyt_data_files(dyt_folder), reused until the folder's mtime changes"""
+    key = os.path.normcase(os.path.abspath(dyt_folder))
+    cached = _data_files_cache.get(key)
+    mtime = path_mtime(dyt_folder)
+    if cached and mtime is not None and cached[0] == mtime:
+        return list(cached[1])
+    data_files = find_dyt_data_files(dyt_folder)
+    _data_files_cache[key] = (mtime, data_files)
+    return list(data_files)
+
+
+def store_dyt_data_files(mat, dyt_path, available_data_files):
+    """Record the original DYT path and the DATA files found next to it on the material"""
+    # Store original DYT path
+    mat["xv2_original_dyt_path"] = dyt_path
+
     # Store available DATA files
     mat["xv2_data_files_count"] = len(available_data_files)
     for i, data_path in enumerate(available_data_files):
         mat[f"xv2_data_file_{i + 1}"] = data_path
 
-    print(f"[XV2 DATA DEBUG] FINAL RESULT: {len(available_data_files)} DATA files stored in material")
+    data_log.debug("FINAL RESULT: %s DATA files stored in material", len(available_data_files))
 
     if available_data_files:
-        print(
-            f"[XV2 Transform] Found {len(available_data_files)} DATA files for '{mat.name}': DATA_001 to DATA_{str(len(available_data_files)).zfill(3)}")
+        data_log.info("Found %d DATA files for '%s': DATA_001 to DATA_%03d",
+                      len(available_data_files), mat.name, len(available_data_files))
     else:
-        print(f"[XV2 Transform] No DATA files found in {dyt_folder}")
+        data_log.info("No DATA files found in %s", os.path.dirname(dyt_path))
+
+
 def get_selected_objects_max_data_count(context):
     """Get the maximum DATA file count across all selected objects' materials"""
     max_count = 0
@@ -166,7 +358,7 @@ def apply_dyt_transformation(context, transform_index):
                 continue
 
             mat = slot.material
-            dyt_node = mat.node_tree.nodes.get("Image Texture.004") if mat.use_nodes and mat.node_tree else None
+            dyt_node = get_role_index(mat.node_tree).node("dyt") if mat.use_nodes and mat.node_tree else None
 
             if not dyt_node or dyt_node.type != 'TEX_IMAGE':
                 continue
@@ -176,11 +368,11 @@ def apply_dyt_transformation(context, transform_index):
                 original_path = mat.get("xv2_original_dyt_path")
                 if original_path and os.path.exists(original_path):
                     try:
-                        original_image = bpy.data.images.load(original_path, check_existing=True)
+                        original_image = load_material_dyt(mat, original_path)
                         dyt_node.image = original_image
                         materials_updated += 1
                     except RuntimeError as e:
-                        print(f"[XV2 Transform] Warning: Could not load original DYT: {original_path} - {e}")
+                        data_log.warning("Could not load original DYT: %s - %s", original_path, e)
 
             else:
                 # Apply DATA file
@@ -189,12 +381,13 @@ def apply_dyt_transformation(context, transform_index):
                     data_path = mat.get(f"xv2_data_file_{transform_index}")
                     if data_path and os.path.exists(data_path):
                         try:
-                            data_image = bpy.data.images.load(data_path, check_existing=True)
+                            data_image = load_material_dyt(mat, data_path)
                             dyt_node.image = data_image
                             materials_updated += 1
                         except RuntimeError as e:
-                            print(f"[XV2 Transform] Warning: Could not load DATA file: {data_path} - {e}")
+                            data_log.warning("Could not load DATA file: %s - %s", data_path, e)
 
+    enforce_image_budget()
     return materials_updated
 
 
@@ -284,7 +477,7 @@ def assign_images_enhanced_with_data_scan(mat, primary_stub, original_material_n
 
     # After assignment, scan for DATA files if DYT was assigned
     if mat and mat.use_nodes and mat.node_tree:
-        dyt_node = mat.node_tree.nodes.get("Image Texture.004")
+        dyt_node = get_role_index(mat.node_tree).node("dyt")
         if dyt_node and dyt_node.image:
             scan_and_store_dyt_data_files(mat, dyt_node.image)
 
@@ -300,15 +493,21 @@ def xenoverse___dimps_001_node_group_def():
         has_is_msk = any(s.name == "Is MSK" for s in group_to_check.interface.items_tree if
                          s.item_type == 'SOCKET' and s.in_out == 'INPUT')
         if has_msk_strength or has_is_msk:
-            print("[XV2 DEBUG] 'Xenoverse - Dimps.001' node group has old MSK logic. Removing and recreating.")
+            log.debug("'Xenoverse - Dimps.001' node group has old MSK logic. Removing and recreating.")
             bpy.data.node_groups.remove(group_to_check)
         else:
-            print("[XV2 DEBUG] Found existing 'Xenoverse - Dimps.001' node group (assumed up-to-date).")
+            log.debug("Found existing 'Xenoverse - Dimps.001' node group (assumed up-to-date).")
             return group_to_check
 
     xenoverse___dimps_001 = bpy.data.node_groups.new(type='ShaderNodeTree', name="Xenoverse - Dimps.001")
-    print("[XV2 DEBUG] Creating new 'Xenoverse - Dimps.001' node group (MSK = inverted XVM).")
+    # Shader variants folded from an earlier build of this group see the new stamp and rebuild
+    xenoverse___dimps_001[MAIN_GROUP_BUILD_PROPERTY] = str(time.time_ns())
+    log.debug("Creating new 'Xenoverse - Dimps.001' node group (MSK = inverted XVM).")
+    return build_xenoverse___dimps_001(xenoverse___dimps_001)
 
+
+def build_xenoverse___dimps_001(xenoverse___dimps_001):
+    """Fill an empty node tree with the main shader graph (also used for the folded variants)"""
     # Interface Sockets - REMOVED MSK Strength and Is MSK sockets only
     xenoverse___dimps_001.interface.new_socket(name="Result", in_out='OUTPUT', socket_type='NodeSocketShader')
     s = xenoverse___dimps_001.interface.new_socket(name="EMB Color", in_out='INPUT', socket_type='NodeSocketColor')
@@ -596,7 +795,7 @@ def dyt_control__camera_based__node_group_def():  # Suffix _def
         return bpy.data.node_groups["DYT Control [CAMERA BASED]"]
 
     dyt_control__camera_based_ = bpy.data.node_groups.new(type='ShaderNodeTree', name="DYT Control [CAMERA BASED]")
-    print("[XV2 DEBUG] Creating new 'DYT Control [CAMERA BASED]' node group.")
+    log.debug("Creating new 'DYT Control [CAMERA BASED]' node group.")
 
     X_OFFSET = 200
     Y_OFFSET = 150
@@ -1175,47 +1374,56 @@ def xenoverse_eye_shader___dimps_node_group():
 def setup_msk_as_inverted_xvm(mat, shader_type):
     """MSK detection: invert mask and route through XVM system with 2x strength"""
     if not mat or not mat.node_tree:
-        return
+        return False
 
     is_msk_shader = shader_type and "MSK" in shader_type.upper()
     if not is_msk_shader:
-        return
+        return False
 
-    print(f"[XV2] MSK detected for '{mat.name}' - setting up as inverted XVM with 2x strength")
+    log.debug("MSK detected for '%s' - setting up as inverted XVM with 2x strength", mat.name)
 
-    dual_emb_node = mat.node_tree.nodes.get("Image Texture Dual EMB")
-    group_node = mat.node_tree.nodes.get("Group")
+    index = get_role_index(mat.node_tree)
+    dual_emb_node = index.node("mask")
+    group_node = index.node("main_group")
 
     if not (dual_emb_node and group_node):
-        return
+        return False
 
     # Create/get invert node
-    invert_msk = mat.node_tree.nodes.get("MSK Invert")
-    if not invert_msk:
-        invert_msk = mat.node_tree.nodes.new("ShaderNodeInvert")
-        invert_msk.name = "MSK Invert"
+    invert_msk, created = index.ensure_node("ShaderNodeInvert", "MSK Invert")
+    if created:
         invert_msk.label = "MSK Mask Invert"
         invert_msk.location = dual_emb_node.location + mathutils.Vector((300, 0))
         invert_msk.inputs[0].default_value = 1.0
 
     # Set up connections and 2x strength
     dual_emb_mask_input = group_node.inputs.get("Dual EMB Mask")
-    if dual_emb_mask_input:
-        # Remove existing direct connection
-        for link in list(mat.node_tree.links):
-            if link.to_node == group_node and link.to_socket == dual_emb_mask_input:
-                mat.node_tree.links.remove(link)
+    if not dual_emb_mask_input:
+        return False
 
-        # Route through invert
-        mat.node_tree.links.new(dual_emb_node.outputs["Color"], invert_msk.inputs["Color"])
-        mat.node_tree.links.new(invert_msk.outputs["Color"], dual_emb_mask_input)
+    # Route through invert (replaces the direct mask connection)
+    index.ensure_link(dual_emb_node.outputs["Color"], invert_msk.inputs["Color"])
+    index.ensure_link(invert_msk.outputs["Color"], dual_emb_mask_input)
 
-        # Set 2x strength for MSK
-        if "Is XVM" in group_node.inputs:
-            group_node.inputs["Is XVM"].default_value = 2.0
-        if "Dual EMB Strength" in group_node.inputs:
-            group_node.inputs["Dual EMB Strength"].default_value = 2.0
-            print(f"    MSK strength set to 2.0")
+    # Set 2x strength for MSK
+    if "Is XVM" in group_node.inputs:
+        set_socket_default(group_node.inputs["Is XVM"], 2.0)
+    if "Dual EMB Strength" in group_node.inputs:
+        if set_socket_default(group_node.inputs["Dual EMB Strength"], 2.0):
+            log.debug("MSK strength set to 2.0")
+    return True
+
+
+def remove_msk_invert(mat):
+    """Undo setup_msk_as_inverted_xvm: drop the invert node and feed the mask directly again."""
+    index = get_role_index(mat.node_tree)
+    dual_emb_node = index.node("mask")
+    group_node = index.node("main_group")
+    invert_msk = index.node("msk_invert")
+    if invert_msk:
+        index.remove_node(invert_msk)
+    if dual_emb_node and group_node and "Dual EMB Mask" in group_node.inputs:
+        index.ensure_link(dual_emb_node.outputs["Color"], group_node.inputs["Dual EMB Mask"])
 
 
 def xenoverse_2_eye___dimps_node_group(mat_node_tree):
@@ -1224,6 +1432,7 @@ def xenoverse_2_eye___dimps_node_group(mat_node_tree):
     # Clear existing nodes
     for node in list(mat_node_tree.nodes):
         mat_node_tree.nodes.remove(node)
+    invalidate_role_index(mat_node_tree)
 
     mat_node_tree.color_tag = 'NONE'
     mat_node_tree.description = ""
@@ -1511,37 +1720,44 @@ def get_eye_shader_config(shader_type):
 
 def create_eye_material(material_name, shader_type="", primary_stub="", rows=None):
     """Create eye material using the exact pattern"""
-    print(f"[XV2 Eye] Creating eye material: {material_name} (shader: {shader_type})")
+    eye_log.debug("Creating eye material: %s (shader: %s)", material_name, shader_type)
 
     # Create or get material
     mat = bpy.data.materials.get(material_name)
     if not mat:
         mat = bpy.data.materials.new(name=material_name)
 
-    mat.use_nodes = True
+    set_if_changed(mat, "use_nodes", True)
 
-    # Create the node tree
-    xenoverse_2_eye___dimps_node_group(mat.node_tree)
+    # Create the node tree, or patch the existing eye layout in place on re-apply
+    rebuilt = not layout_is_current(mat.node_tree, EYE_LAYOUT_NODES)
+    if rebuilt:
+        xenoverse_2_eye___dimps_node_group(mat.node_tree)
+    else:
+        patch_layout_links(mat.node_tree, EYE_LAYOUT_LINKS)
     mat_scale1x = rows.get(primary_stub.lower(), 0) if rows else 0
     primary_dyt_line = (mat_scale1x + 1) * 0.1 + 0.07
     secondary_dyt_line = (mat_scale1x + 1) * 0.10  # Secondary uses 0.10 multiplier
 
     # Apply calculated DYT line values to eye shader nodes
-    group_primary = mat.node_tree.nodes.get("Group")  # Primary DYT control
-    group_secondary = mat.node_tree.nodes.get("Group.001")  # Secondary DYT control
+    index = get_role_index(mat.node_tree)
+    group_primary = index.node("dyt_control")  # Primary DYT control
+    group_secondary = index.node("dyt_control_secondary")  # Secondary DYT control
 
     if group_primary and len(group_primary.inputs) > 0:
-        group_primary.inputs[0].default_value = primary_dyt_line  # DYT Line input
-        print(f"[XV2 Eye] Set primary DYT Line to {primary_dyt_line:.3f} for {material_name}")
+        set_socket_default(group_primary.inputs[0], primary_dyt_line)  # DYT Line input
+        eye_log.debug("Set primary DYT Line to %.3f for %s", primary_dyt_line, material_name)
 
     if group_secondary and len(group_secondary.inputs) > 0:
-        group_secondary.inputs[0].default_value = secondary_dyt_line  # DYT Line input
-        print(f"[XV2 Eye] Set secondary DYT Line to {secondary_dyt_line:.3f} for {material_name}")
+        set_socket_default(group_secondary.inputs[0], secondary_dyt_line)  # DYT Line input
+        eye_log.debug("Set secondary DYT Line to %.3f for %s", secondary_dyt_line, material_name)
 
-    # Apply eye-specific settings to the Group.002 node (the eye shader)
+    # Apply eye-specific settings to the Group.002 node (the eye shader).
+    # Only on a fresh layout: assign_eye_textures always decides the final pushes,
+    # so writing the MUT defaults over a patched layout would just flip them back and forth.
     eye_config = get_eye_shader_config(shader_type)
-    group_002 = mat.node_tree.nodes.get("Group.002")
-    if group_002:
+    group_002 = index.node("main_group")
+    if group_002 and rebuilt:
         group_002.inputs[1].default_value = eye_config['red_channel_push']    # Red Channel Push
         group_002.inputs[2].default_value = eye_config['green_channel_push']  # Green Channel Push
         group_002.inputs[3].default_value = eye_config['blue_channel_push']   # Blue Channel Push
@@ -1549,69 +1765,174 @@ def create_eye_material(material_name, shader_type="", primary_stub="", rows=Non
     return mat
 
 
-def analyze_mask_type(image):
-    """Determine if mask is grayscale (R=G=B), single-channel, or multi-channel"""
-    if not image or not hasattr(image, 'pixels') or len(image.pixels) == 0:
+MASK_ANALYSIS_MODES = ("FIRST", "STRATIFIED", "FULL")
+MASK_FIRST_PIXELS = 100  # FIRST: the leading pixels of the buffer, as the analysis always did
+MASK_STRATIFIED_GRID = 64  # STRATIFIED: a 64 x 64 grid spread over the whole image
+MASK_FULL_CHUNK_PIXELS = 1 << 20  # FULL: pixels classified per step, bounds the float64 temporaries
+_mask_pixel_buffer = None
+
+
+def addon_preferences():
+    """This addon's preferences, or None when it runs without being enabled (batch scripts)"""
+    addon = bpy.context.preferences.addons.get(__name__)
+    return addon.preferences if addon else None
+
+
+def current_mask_analysis_mode():
+    """Mask analysis mode from the preferences, FIRST without them"""
+    prefs = addon_preferences()
+    return prefs.mask_analysis_mode if prefs else 'FIRST'
+
+
+def mask_pixel_buffer(size):
+    """Float32 view of exactly size floats, backed by one buffer reused across masks"""
+    global _mask_pixel_buffer
+    if _mask_pixel_buffer is None or len(_mask_pixel_buffer) < size:
+        _mask_pixel_buffer = np.empty(size, dtype=np.float32)
+    return _mask_pixel_buffer[:size]
+
+
+def release_mask_pixel_buffer():
+    global _mask_pixel_buffer
+    _mask_pixel_buffer = None
+
+
+def count_mask_pixel_types(rgb):
+    """(grayscale, single_channel, multi_channel) pixel counts for an (N, 3) float64 array.
+
+    Near-black pixels are skipped; the thresholds are the ones the per-pixel loop used.
+    """
+    r, g, b = rgb[:, 0], rgb[:, 1], rgb[:, 2]
+    lit = ~((r < 0.01) & (g < 0.01) & (b < 0.01))
+    gray = lit & (np.abs(r - g) < 0.01) & (np.abs(g - b) < 0.01) & (np.abs(r - b) < 0.01)
+    colored = lit & ~gray
+    channels_with_data = (r > 0.01).astype(np.int8) + (g > 0.01) + (b > 0.01)
+    return (int(np.count_nonzero(gray)),
+            int(np.count_nonzero(colored & (channels_with_data == 1))),
+            int(np.count_nonzero(colored & (channels_with_data > 1))))
+
+
+def classify_mask_counts(grayscale_count, single_channel_count, multi_channel_count):
+    total_samples = grayscale_count + single_channel_count + multi_channel_count
+
+    if total_samples == 0:
         return "unknown"
 
-    try:
-        pixels = list(image.pixels)
-        if len(pixels) < 4:
-            return "unknown"
+    # Determine mask type based on majority
+    if grayscale_count > (total_samples * 0.7):
+        return "grayscale"
+    elif single_channel_count > (total_samples * 0.7):
+        return "single_channel"
+    elif multi_channel_count > (total_samples * 0.4):  # Lower threshold since it's a new category
+        return "multi_channel"
+    else:
+        return "unknown"
 
-        # Sample first 100 pixels to determine mask type
-        sample_size = min(400, len(pixels))  # 100 pixels * 4 channels
 
-        grayscale_count = 0
-        single_channel_count = 0
-        multi_channel_count = 0
+def classify_mask_rgba(rgba, width, height, mode):
+    """Mask type for an (N, 4) RGBA array laid out like image.pixels (bottom row first)"""
+    if mode == 'FIRST':
+        return classify_mask_counts(*count_mask_pixel_types(rgba[:MASK_FIRST_PIXELS, :3].astype(np.float64)))
+
+    if mode == 'STRATIFIED':
+        if width * height != len(rgba):
+            width, height = len(rgba), 1
+        rows = np.unique(np.linspace(0, height - 1, min(MASK_STRATIFIED_GRID, height)).astype(np.intp))
+        cols = np.unique(np.linspace(0, width - 1, min(MASK_STRATIFIED_GRID, width)).astype(np.intp))
+        grid = rgba.reshape(height, width, 4)[np.ix_(rows, cols)]
+        return classify_mask_counts(*count_mask_pixel_types(grid[..., :3].reshape(-1, 3).astype(np.float64)))
+
+    counts = np.zeros(3, dtype=np.int64)
+    for start in range(0, len(rgba), MASK_FULL_CHUNK_PIXELS):
+        chunk = rgba[start:start + MASK_FULL_CHUNK_PIXELS, :3].astype(np.float64)
+        counts += count_mask_pixel_types(chunk)
+    return classify_mask_counts(*(int(c) for c in counts))
+
+
+def analyze_dds_mask(filepath, mode):
+    """analyze_mask_type for a BCn DDS file, decoded straight from disk.
+
+    FIRST decodes only the bottom block rows of the top mip, STRATIFIED the smallest mip
+    that still covers the sample grid, FULL the whole top mip.
+    """
+    header = read_bc_dds_header(filepath)
+    if mode == 'FIRST':
+        width, height, pixels = decode_dds_pixels(filepath, 0, bottom_rows=-(-MASK_FIRST_PIXELS // header.width))
+    elif mode == 'STRATIFIED':
+        width, height, pixels = decode_dds_pixels(filepath, dds_mip_for_size(header.width, header.height,
+                                                                             header.mip_levels, MASK_STRATIFIED_GRID))
+    else:
+        width, height, pixels = decode_dds_pixels(filepath, 0)
+    return classify_mask_rgba(pixels.reshape(-1, 4), width, height, mode)
 
-        for i in range(0, sample_size, 4):
-            r, g, b = pixels[i], pixels[i + 1], pixels[i + 2]
 
-            # Skip completely black pixels
-            if r < 0.01 and g < 0.01 and b < 0.01:
-                continue
+def analyze_mask_type(image, mode=None):
+    """Determine if mask is grayscale (R=G=B), single-channel, or multi-channel.
 
-            # Check if this pixel is grayscale (R=G=B)
-            if abs(r - g) < 0.01 and abs(g - b) < 0.01 and abs(r - b) < 0.01:
-                grayscale_count += 1
-            else:
-                # Count how many channels have significant data
-                channels_with_data = sum([r > 0.01, g > 0.01, b > 0.01])
+    mode FIRST looks at the first 100 pixels (the original behaviour), STRATIFIED at an
+    evenly spread grid and FULL at every pixel. Defaults to the addon preference.
+    BCn DDS files are decoded from disk, so Blender never has to load the image.
+    """
+    if not image:
+        return "unknown"
+    if mode is None:
+        mode = current_mask_analysis_mode()
 
-                if channels_with_data == 1:
-                    single_channel_count += 1
-                elif channels_with_data > 1:
-                    multi_channel_count += 1
+    dds_path = dds_source_path(image)
+    if dds_path:
+        try:
+            return analyze_dds_mask(dds_path, mode)
+        except (OSError, ValueError) as e:
+            eye_log.debug("Could not decode '%s' (%s), reading image pixels instead", dds_path, e)
 
-        total_samples = grayscale_count + single_channel_count + multi_channel_count
+    if not hasattr(image, 'pixels') or len(image.pixels) == 0:
+        return "unknown"
 
-        if total_samples == 0:
+    try:
+        float_count = len(image.pixels)
+        if float_count < 4:
             return "unknown"
 
-        # Determine mask type based on majority
-        if grayscale_count > (total_samples * 0.7):
-            return "grayscale"
-        elif single_channel_count > (total_samples * 0.7):
-            return "single_channel"
-        elif multi_channel_count > (total_samples * 0.4):  # Lower threshold since it's a new category
-            return "multi_channel"
-        else:
-            return "unknown"
+        if mode == 'FIRST':
+            # Slicing reads only the sample instead of converting the whole image
+            sample_floats = min(MASK_FIRST_PIXELS * 4, float_count) // 4 * 4
+            rgba = np.asarray(image.pixels[:sample_floats], dtype=np.float64).reshape(-1, 4)
+            return classify_mask_rgba(rgba, 0, 0, mode)
+
+        pixels = mask_pixel_buffer(float_count)
+        image.pixels.foreach_get(pixels)
+        width, height = image.size
+        return classify_mask_rgba(pixels[:float_count // 4 * 4].reshape(-1, 4), width, height, mode)
 
     except Exception as e:
-        print(f"[XV2 Eye] Error analyzing mask type: {e}")
+        eye_log.warning("Error analyzing mask type: %s", e)
         return "unknown"
 
 
 def calculate_channel_pushes_from_mask(mask_image):
-    """Calculate optimal channel push values based on mask analysis"""
+    """Calculate optimal channel push values based on mask analysis.
 
-    mask_type = analyze_mask_type(mask_image)
+    Results for images loaded from disk are cached by file size and mtime, so an
+    unchanged mask is never read again.
+    """
+    mode = current_mask_analysis_mode()
+    source_path = image_source_path(mask_image) if mask_image else None
+    cached = lookup_mask_analysis(source_path, mode) if source_path else None
+    if cached:
+        eye_log.debug("Cached mask type for '%s': %s", source_path, cached["mask_type"])
+        return dict(cached["pushes"])
 
-    print(f"[XV2 Eye] Detected mask type: {mask_type}")
+    with stage("mask analysis"):
+        mask_type = analyze_mask_type(mask_image, mode)
 
+    eye_log.debug("Detected mask type: %s", mask_type)
+    pushes = channel_pushes_for_mask_type(mask_type)
+    if source_path:
+        store_mask_analysis(source_path, mode, mask_type, pushes)
+    return pushes
+
+
+def channel_pushes_for_mask_type(mask_type):
     if mask_type == "grayscale":
         # Grayscale mask (R=G=B): like eye_R_000.dds
         return {
@@ -1635,7 +1956,7 @@ def calculate_channel_pushes_from_mask(mask_image):
         }
     else:
         # Fallback to safe defaults
-        print(f"[XV2 Eye] Unknown mask type, using fallback values")
+        eye_log.debug("Unknown mask type, using fallback values")
         return {
             'red_channel_push': 0.15,
             'green_channel_push': -0.1,
@@ -1647,17 +1968,24 @@ def assign_eye_textures(mat, primary_stub, original_material_name, tex_root):
     """Assign textures to eye material, now with _001 support and mask analysis."""
     if not mat or not mat.node_tree:
         return
-    print(f"[XV2 Eye] Assigning textures for: {mat.name}")
-
-    # Get texture nodes from the eye material layout
-    eye_main_node = mat.node_tree.nodes.get("Image Texture.001")  # This is the main EMB texture node
-    dyt_004_node = mat.node_tree.nodes.get("Image Texture.004")  # Main DYT
-    dyt_005_node = mat.node_tree.nodes.get("Image Texture.005")  # Green area DYT (often same as main)
-
     # Search for textures
     img_000 = find_image(primary_stub, original_material_name, "000", tex_root)
     img_001 = find_image(primary_stub, original_material_name, "001", tex_root)
     img_dyt = find_image(primary_stub, original_material_name, "dyt", tex_root)
+    assign_eye_images(mat, img_000, img_001, img_dyt)
+
+
+def assign_eye_images(mat, img_000, img_001, img_dyt):
+    """Put already resolved eye textures into the eye layout and apply mask analysis"""
+    if not mat or not mat.node_tree:
+        return
+    eye_log.debug("Assigning textures for: %s", mat.name)
+
+    # Get texture nodes from the eye material layout
+    index = get_role_index(mat.node_tree)
+    eye_main_node = index.node("emb")  # This is the main EMB texture node
+    dyt_004_node = index.node("dyt")  # Main DYT
+    dyt_005_node = index.node("dyt_secondary")  # Green area DYT (often same as main)
 
     # Assign eye texture with _001 as a fallback
     assigned_eye_tex = None
@@ -1666,61 +1994,59 @@ def assign_eye_textures(mat, primary_stub, original_material_name, tex_root):
     if eye_main_node:
         if img_000:
             assigned_eye_tex = img_000
-            print(f"[XV2 Eye] Main eye texture (000): {img_000.name}")
+            eye_log.debug("Main eye texture (000): %s", img_000.name)
         elif img_001:
             assigned_eye_tex = img_001
-            print(f"[XV2 Eye] Main eye texture (fallback to 001): {img_001.name}")
+            eye_log.debug("Main eye texture (fallback to 001): %s", img_001.name)
 
-        if assigned_eye_tex:
-            eye_main_node.image = assigned_eye_tex
-        else:
-            eye_main_node.image = None
-            print(f"[XV2 Eye] Main eye texture (000/001): NONE")
+        set_if_changed(eye_main_node, "image", assigned_eye_tex)
+        if not assigned_eye_tex:
+            eye_log.debug("Main eye texture (000/001): NONE")
 
     # Determine which texture to use for mask analysis
     # Priority: 001 for masks, then 000 as fallback
     if img_001:
         assigned_mask_tex = img_001
-        print(f"[XV2 Eye] Using 001 texture for mask analysis: {img_001.name}")
+        eye_log.debug("Using 001 texture for mask analysis: %s", img_001.name)
     elif img_000:
         assigned_mask_tex = img_000
-        print(f"[XV2 Eye] Using 000 texture for mask analysis: {img_000.name}")
+        eye_log.debug("Using 000 texture for mask analysis: %s", img_000.name)
 
     # Assign DYT textures
     if img_dyt:
         if dyt_004_node:
-            dyt_004_node.image = img_dyt
-            print(f"[XV2 Eye] Main DYT: {img_dyt.name}")
+            set_if_changed(dyt_004_node, "image", img_dyt)
+            eye_log.debug("Main DYT: %s", img_dyt.name)
         if dyt_005_node:
-            dyt_005_node.image = img_dyt
-            print(f"[XV2 Eye] Green area DYT: {img_dyt.name}")
+            set_if_changed(dyt_005_node, "image", img_dyt)
+            eye_log.debug("Green area DYT: %s", img_dyt.name)
 
     # Apply mask-analyzed channel pushes
-    group_002 = mat.node_tree.nodes.get("Group.002")  # The eye shader group
+    group_002 = index.node("main_group")  # The eye shader group
     if group_002 and assigned_mask_tex:
         # Analyze the mask texture to get optimal channel push values
         eye_config = calculate_channel_pushes_from_mask(assigned_mask_tex)
 
         # Apply the analyzed channel push values
         if len(group_002.inputs) > 1:
-            group_002.inputs[1].default_value = eye_config['red_channel_push']  # Red Channel Push
+            set_socket_default(group_002.inputs[1], eye_config['red_channel_push'])  # Red Channel Push
         if len(group_002.inputs) > 2:
-            group_002.inputs[2].default_value = eye_config['green_channel_push']  # Green Channel Push
+            set_socket_default(group_002.inputs[2], eye_config['green_channel_push'])  # Green Channel Push
         if len(group_002.inputs) > 3:
-            group_002.inputs[3].default_value = eye_config['blue_channel_push']  # Blue Channel Push
+            set_socket_default(group_002.inputs[3], eye_config['blue_channel_push'])  # Blue Channel Push
 
-        print(
-            f"[XV2 Eye] Applied mask-analyzed channel pushes: R={eye_config['red_channel_push']}, G={eye_config['green_channel_push']}, B={eye_config['blue_channel_push']}")
+        eye_log.debug("Applied mask-analyzed channel pushes: R=%s, G=%s, B=%s", eye_config['red_channel_push'],
+                      eye_config['green_channel_push'], eye_config['blue_channel_push'])
     else:
-        print(f"[XV2 Eye] No mask texture available for analysis, using fallback channel pushes")
+        eye_log.debug("No mask texture available for analysis, using fallback channel pushes")
         # Apply safe fallback values
         if group_002:
             if len(group_002.inputs) > 1:
-                group_002.inputs[1].default_value = 0.15  # Red fallback
+                set_socket_default(group_002.inputs[1], 0.15)  # Red fallback
             if len(group_002.inputs) > 2:
-                group_002.inputs[2].default_value = -0.1  # Green fallback
+                set_socket_default(group_002.inputs[2], -0.1)  # Green fallback
             if len(group_002.inputs) > 3:
-                group_002.inputs[3].default_value = 0.35  # Blue fallback
+                set_socket_default(group_002.inputs[3], 0.35)  # Blue fallback
 
 
 # Integration functions to replace existing ones
@@ -1745,16 +2071,16 @@ def ensure_eye_node_groups():
     """Ensure eye shader node groups are available"""
     if "DYT Control" not in bpy.data.node_groups:
         dyt_control_node_group()
-        print("[XV2 Eye] Created DYT Control node group")
+        eye_log.debug("Created DYT Control node group")
 
     if "Xenoverse Eye Shader - Dimps" not in bpy.data.node_groups:
         xenoverse_eye_shader___dimps_node_group()
-        print("[XV2 Eye] Created Xenoverse Eye Shader - Dimps node group")
+        eye_log.debug("Created Xenoverse Eye Shader - Dimps node group")
 
 
 def ensure_node_group(name, create_fn_def):
     if name not in bpy.data.node_groups:
-        print(f"[XV2] Node group '{name}' not found, creating it via definition.")
+        log.debug("Node group '%s' not found, creating it via definition.", name)
         return create_fn_def()
 
     # For "Xenoverse - Dimps.001", ensure it's the latest version by calling the def function
@@ -1765,10 +2091,436 @@ def ensure_node_group(name, create_fn_def):
     return bpy.data.node_groups[name]
 
 
-def setup_dual_emb_color(mat, shader_type=""):
-    """Set up DYT dual color sampling for Dual EMB Masks OR MSK AO."""
-    dyt_texture_node = mat.node_tree.nodes.get("Image Texture.004")
-    group_node = mat.node_tree.nodes.get("Group")
+# --- SHADER VARIANTS ---
+# "Xenoverse - Dimps.001" switches its XVM/MSK and TOON_UNIF_ENV branches with the
+# constant "Is XVM" and "Is TOON_UNIF_ENV" inputs, so EEVEE compiles and runs every
+# branch for every material. Apply swaps the group for a variant with those inputs
+# folded in: Math nodes multiplying by 0 or 1 and Mix nodes with a factor of 0 or 1
+# are bypassed, and whatever no longer reaches the output is dropped. Each fold is
+# exact, so a variant renders the same pixels as the generic group. Variants are tagged
+# with the addon and graph version and the generic group's build stamp, and are rebuilt
+# when any of them changed, so older files never keep folds of an outdated graph.
+
+
+MAIN_GROUP_NAME = "Xenoverse - Dimps.001"
+MAIN_GROUP_FOLDED_INPUTS = ("Is XVM", "Is TOON_UNIF_ENV")
+# "Is XVM" values Apply writes: 0 off, 1 XVM, 2 MSK (inverted mask at double strength)
+MAIN_GROUP_XVM_VARIANTS = {0.0: "", 1.0: "XVM", 2.0: "MSK"}
+MAIN_GROUP_BUILD_PROPERTY = "xv2_build"  # Stamped on the generic group when it is (re)created
+MAIN_GROUP_VARIANT_PROPERTY = "xv2_variant_of"  # Tag of the graph a variant was folded from
+
+
+def is_group_or_variant(name, group_name):
+    return name == group_name or name.startswith(group_name + " [")
+
+
+def main_group_variant_name(is_xvm, is_toon_unif_env):
+    """Node group name of the variant for these input values, None if there is none"""
+    is_xvm, is_toon_unif_env = round(is_xvm, 4), round(is_toon_unif_env, 4)
+    if is_xvm not in MAIN_GROUP_XVM_VARIANTS or is_toon_unif_env not in (0.0, 1.0):
+        return None
+    parts = [MAIN_GROUP_XVM_VARIANTS[is_xvm], "TOON" if is_toon_unif_env else ""]
+    return f"{MAIN_GROUP_NAME} [{' '.join(p for p in parts if p) or 'PLAIN'}]"
+
+
+def _bypass_output(node_tree, output, source):
+    """Feed everything linked to output from source instead"""
+    for link in list(output.links):
+        to_socket = link.to_socket
+        node_tree.links.remove(link)
+        node_tree.links.new(source, to_socket)
+
+
+def _fold_node(node_tree, node):
+    """Fold one Math/Mix node whose constant inputs make it a pass-through or a constant"""
+    if node.type == 'MATH' and node.operation == 'MULTIPLY' and not getattr(node, "use_clamp", False) and \
+            node.outputs[0].is_linked:
+        for constant, other in ((node.inputs[0], node.inputs[1]), (node.inputs[1], node.inputs[0])):
+            if constant.is_linked:
+                continue
+            if constant.default_value == 1.0 and other.is_linked:
+                _bypass_output(node_tree, node.outputs[0], other.links[0].from_socket)
+                return True
+            targets = [link.to_socket for link in node.outputs[0].links]
+            if constant.default_value == 0.0 and \
+                    all(isinstance(getattr(s, "default_value", None), float) for s in targets):
+                for link in list(node.outputs[0].links):
+                    node_tree.links.remove(link)
+                for socket in targets:
+                    socket.default_value = 0.0
+                return True
+    elif node.type == 'MIX' and node.data_type == 'RGBA' and node.blend_type == 'MIX' and \
+            not getattr(node, "clamp_result", False) and not node.inputs[0].is_linked:
+        kept = {0.0: node.inputs[6], 1.0: node.inputs[7]}.get(node.inputs[0].default_value)
+        if kept is not None and kept.is_linked and node.outputs[2].is_linked:
+            _bypass_output(node_tree, node.outputs[2], kept.links[0].from_socket)
+            return True
+    return False
+
+
+def fold_group_inputs(node_tree, constants):
+    """Turn the named group inputs into constants, fold what they switch and drop dead nodes"""
+    for link in list(node_tree.links):
+        if link.from_node.type == 'GROUP_INPUT' and link.from_socket.name in constants:
+            # The link is freed on removal, read everything from it first
+            to_socket, value = link.to_socket, float(constants[link.from_socket.name])
+            node_tree.links.remove(link)
+            to_socket.default_value = value
+    while any([_fold_node(node_tree, node) for node in list(node_tree.nodes)]):
+        pass
+    removed = True
+    while removed:
+        removed = False
+        for node in list(node_tree.nodes):
+            if node.type not in ('GROUP_INPUT', 'GROUP_OUTPUT', 'FRAME') and \
+                    not any(output.is_linked for output in node.outputs):
+                node_tree.nodes.remove(node)
+                removed = True
+    for frame in [n for n in node_tree.nodes if n.type == 'FRAME']:
+        if not any(n.parent == frame for n in node_tree.nodes):
+            node_tree.nodes.remove(frame)
+
+
+def main_group_variant(is_xvm, is_toon_unif_env):
+    """Folded main group for these input values (built on first use), None if there is none"""
+    name = main_group_variant_name(is_xvm, is_toon_unif_env)
+    if name is None:
+        return None
+    generic = bpy.data.node_groups.get(MAIN_GROUP_NAME)
+    tag = repr((bl_info["version"], XV2_GRAPH_VERSION,
+                generic.get(MAIN_GROUP_BUILD_PROPERTY, "") if generic else ""))
+    old = bpy.data.node_groups.get(name)
+    if old and old.get(MAIN_GROUP_VARIANT_PROPERTY) == tag:
+        return old
+    group = bpy.data.node_groups.new(type='ShaderNodeTree', name=name)
+    group[MAIN_GROUP_VARIANT_PROPERTY] = tag
+    build_xenoverse___dimps_001(group)
+    constants = dict(zip(MAIN_GROUP_FOLDED_INPUTS, (is_xvm, is_toon_unif_env)))
+    fold_group_inputs(group, constants)
+    for item in group.interface.items_tree:
+        if item.item_type == 'SOCKET' and item.in_out == 'INPUT' and item.name in constants:
+            item.hide_value = True  # folded in, changing it on the node has no effect
+    if old:
+        log.debug("Shader variant '%s' was folded from an outdated graph, rebuilding.", name)
+        old.user_remap(group)
+        bpy.data.node_groups.remove(old)
+        group.name = name
+    log.debug("Created shader variant '%s' (%s nodes).", name, len(group.nodes))
+    return group
+
+
+def specialize_main_group(mat, enabled):
+    """Point the main group node at the variant for its flags, or back at the generic group"""
+    group_node = get_role_index(mat.node_tree).node("main_group")
+    if not group_node or group_node.type != 'GROUP' or not group_node.node_tree or \
+            not is_group_or_variant(group_node.node_tree.name, MAIN_GROUP_NAME):
+        return
+    group = None
+    if enabled and all(name in group_node.inputs and not group_node.inputs[name].is_linked
+                       for name in MAIN_GROUP_FOLDED_INPUTS):
+        group = main_group_variant(*(group_node.inputs[name].default_value for name in MAIN_GROUP_FOLDED_INPUTS))
+    if group is None:
+        group = ensure_node_group(MAIN_GROUP_NAME, xenoverse___dimps_001_node_group_def)
+    set_if_changed(group_node, "node_tree", group)
+
+
+# --- IN-PLACE NODE PATCHING ---
+# Re-applying shaders patches an existing XV2 layout instead of rebuilding it.
+# Every write below is skipped when the value is already in place, so a no-op
+# re-apply leaves the node trees untouched and EEVEE does not recompile them.
+
+# (node name, node type, node group name) that make up a complete layout
+XV2_LAYOUT_NODES = (
+    ("Image Texture.004", 'TEX_IMAGE', None),
+    ("Image Texture.001", 'TEX_IMAGE', None),
+    ("Image Texture Dual EMB", 'TEX_IMAGE', None),
+    ("Group", 'GROUP', "Xenoverse - Dimps.001"),
+    ("Group.002", 'GROUP', "DYT Control [CAMERA BASED]"),
+    ("Material Output", 'OUTPUT_MATERIAL', None),
+)
+# (from node, from socket, to node, to socket) links every layout must have.
+# EMB Alpha and Dual EMB Mask depend on the shader type and are patched later.
+XV2_LAYOUT_LINKS = (
+    ("Image Texture.001", "Color", "Group", "EMB Color"),
+    ("Image Texture.004", "Color", "Group", "DYT"),
+    ("Group.002", "Vector", "Image Texture.004", "Vector"),
+    ("Group", "Result", "Material Output", "Surface"),
+)
+
+EYE_LAYOUT_NODES = (
+    ("Image Texture.004", 'TEX_IMAGE', None),
+    ("Image Texture.001", 'TEX_IMAGE', None),
+    ("Image Texture.005", 'TEX_IMAGE', None),
+    ("Group", 'GROUP', "DYT Control"),
+    ("Group.001", 'GROUP', "DYT Control"),
+    ("Group.002", 'GROUP', "Xenoverse Eye Shader - Dimps"),
+    ("Texture Coordinate", 'TEX_COORD', None),
+    ("Normal", 'NORMAL', None),
+    ("Mapping", 'MAPPING', None),
+    ("Mix", 'MIX', None),
+    ("Material Output", 'OUTPUT_MATERIAL', None),
+)
+EYE_LAYOUT_LINKS = (
+    ("Texture Coordinate", 2, "Normal", 0),
+    ("Normal", 0, "Mapping", 1),
+    ("Texture Coordinate", 2, "Mapping", 0),
+    ("Group.002", 0, "Material Output", 0),
+    ("Group", 0, "Image Texture.004", 0),
+    ("Image Texture.004", 0, "Group.002", 4),
+    ("Mapping", 0, "Image Texture.001", 0),
+    ("Group.001", 0, "Image Texture.005", 0),
+    ("Image Texture.001", 1, "Mix", 0),
+    ("Image Texture.001", 0, "Mix", 2),
+    ("Image Texture.001", 0, "Mix", 6),
+    ("Mix", 2, "Group.002", 0),
+    ("Image Texture.005", 0, "Group.002", 11),
+)
+
+TOON_UNIF_ENV_UV_NODES = ("TOON_UNIF_ENV Tex Coord", "TOON_UNIF_ENV Transform", "TOON_UNIF_ENV Mapping")
+
+
+def values_equal(current, value, tolerance=1e-6):
+    """Compare a node/socket property against a desired value, tolerating float noise"""
+    if isinstance(value, (int, float)) and isinstance(current, (int, float)):
+        return abs(current - value) <= tolerance
+    if isinstance(value, (tuple, list)):
+        try:
+            return len(current) == len(value) and all(abs(a - b) <= tolerance for a, b in zip(current, value))
+        except TypeError:
+            return False
+    return current == value
+
+
+def set_if_changed(target, attr, value):
+    """Assign target.attr only when it differs. Returns True if a write happened."""
+    if target is None or values_equal(getattr(target, attr), value):
+        return False
+    setattr(target, attr, value)
+    return True
+
+
+def set_socket_default(socket, value):
+    return set_if_changed(socket, "default_value", value)
+
+
+def layout_is_current(node_tree, layout_nodes):
+    """True if every node of the layout exists with the expected type and node group."""
+    if not node_tree:
+        return False
+    index = get_role_index(node_tree)
+    for name, node_type, group_name in layout_nodes:
+        node = index.get(name)
+        if not node or node.type != node_type:
+            return False
+        if group_name is not None and (not node.node_tree or not is_group_or_variant(node.node_tree.name, group_name)):
+            return False
+    return True
+
+
+def patch_layout_links(node_tree, layout_links):
+    """Restore any missing layout links. Returns the number of links created."""
+    index = get_role_index(node_tree)
+    created = 0
+    for from_name, from_key, to_name, to_key in layout_links:
+        from_node = index.get(from_name)
+        to_node = index.get(to_name)
+        if from_node and to_node and index.ensure_link(from_node.outputs[from_key], to_node.inputs[to_key]):
+            created += 1
+    return created
+
+
+# --- NODE ROLE INDEX ---
+# Operators look nodes up by their role (DYT texture, main group, ...) and edit
+# links into key sockets. Instead of name probing and scanning node_tree.links,
+# each node tree gets an index built in one pass and cached by tree pointer.
+# It is revalidated by node/link counts and kept in sync by its own edits. Lookups
+# return cached entries after O(1) checks (the node still has its name, the link still
+# ends in the socket asked about) and only fall back to the tree when those fail.
+# Undo and file loads free whole trees and drop the cache; materials the addon removes
+# drop their tree's index first, so a new tree at the same address never inherits it.
+
+NODE_ROLES = {
+    "xv2": {
+        "dyt": "Image Texture.004",
+        "emb": "Image Texture.001",
+        "mask": "Image Texture Dual EMB",
+        "main_group": "Group",
+        "dyt_control": "Group.002",
+        "msk_invert": "MSK Invert",
+        "dual_sampler": "DYT Dual Color Sampler",
+        "dual_uv_map": "Dual Color UV Map",
+        "dyt_line_attribute": "XV2 DYT Line Attribute",
+        "dyt_line_missing": "XV2 DYT Line Missing",
+        "dyt_line": "XV2 DYT Line",
+    },
+    "eye": {
+        "dyt": "Image Texture.004",
+        "dyt_secondary": "Image Texture.005",
+        "emb": "Image Texture.001",
+        "main_group": "Group.002",
+        "dyt_control": "Group",
+        "dyt_control_secondary": "Group.001",
+    },
+}
+
+_role_index_cache = {}
+
+
+class NodeRoleIndex:
+    """Role -> node map plus the incoming link of every linked input socket of one node tree"""
+    __slots__ = ("node_tree", "tree_pointer", "node_count", "link_count", "layout", "nodes", "incoming", "outgoing")
+
+    def __init__(self, node_tree):
+        self.node_tree = node_tree
+        self.tree_pointer = node_tree.as_pointer()
+        self.nodes = {node.name: node for node in node_tree.nodes}
+        self.incoming = {}
+        self.outgoing = {}  # from node name -> keys into incoming
+        for link in node_tree.links:
+            key = (link.to_node.name, link.to_socket.identifier)
+            self.incoming[key] = link
+            self.outgoing.setdefault(link.from_node.name, set()).add(key)
+        self.node_count = len(self.nodes)
+        self.link_count = len(node_tree.links)
+        eye_group = self.nodes.get("Group.002")
+        is_eye = (eye_group is not None and eye_group.type == 'GROUP' and eye_group.node_tree and
+                  eye_group.node_tree.name == "Xenoverse Eye Shader - Dimps")
+        self.layout = "eye" if is_eye else "xv2"
+
+    def is_valid(self, node_tree):
+        return (self.tree_pointer == node_tree.as_pointer() and
+                self.node_count == len(node_tree.nodes) and self.link_count == len(node_tree.links))
+
+    def get(self, name):
+        node = self.nodes.get(name)
+        if node is None or node.name == name:
+            return node
+        # Renamed in the node editor; ask the tree once and remember the answer
+        node = self.node_tree.nodes.get(name)
+        if node is None:
+            self.nodes.pop(name, None)
+        else:
+            self.nodes[name] = node
+        return node
+
+    def node(self, role):
+        name = NODE_ROLES[self.layout].get(role)
+        return self.get(name) if name else None
+
+    def _live_link(self, key, to_socket):
+        link = self.incoming.get(key)
+        if link is None or link.to_socket == to_socket:
+            return link
+        # Relinked in the node editor; scan this socket's links once
+        self._forget_link(key)
+        links = to_socket.links
+        if links:
+            self._remember_link(key, links[0])
+            return links[0]
+        return None
+
+    def _remember_link(self, key, link):
+        self.incoming[key] = link
+        self.outgoing.setdefault(link.from_node.name, set()).add(key)
+
+    def _forget_link(self, key):
+        link = self.incoming.pop(key, None)
+        if link is not None:
+            self.outgoing.get(link.from_node.name, set()).discard(key)
+
+    def incoming_link(self, to_socket):
+        return self._live_link((to_socket.node.name, to_socket.identifier), to_socket)
+
+    def ensure_link(self, from_socket, to_socket):
+        key = (to_socket.node.name, to_socket.identifier)
+        link = self._live_link(key, to_socket)
+        if link is not None:
+            if link.from_socket == from_socket:
+                return False
+            self._forget_link(key)
+            self.node_tree.links.remove(link)
+            self.link_count -= 1
+        self._remember_link(key, self.node_tree.links.new(from_socket, to_socket))
+        self.link_count += 1
+        return True
+
+    def unlink(self, to_socket, from_socket=None):
+        key = (to_socket.node.name, to_socket.identifier)
+        link = self._live_link(key, to_socket)
+        if link is None or (from_socket is not None and link.from_socket != from_socket):
+            return 0
+        self._forget_link(key)
+        self.node_tree.links.remove(link)
+        self.link_count -= 1
+        return 1
+
+    def ensure_node(self, bl_idname, name):
+        node = self.get(name)
+        if node and node.bl_idname == bl_idname:
+            return node, False
+        if node:
+            self.remove_node(node)
+        node = self.node_tree.nodes.new(bl_idname)
+        node.name = name
+        self.nodes[node.name] = node
+        self.node_count += 1
+        return node, True
+
+    def remove_node(self, node):
+        name = node.name
+        attached = {key for key in self.incoming if key[0] == name} | self.outgoing.pop(name, set())
+        for key in attached:
+            self._forget_link(key)
+        self.node_tree.nodes.remove(node)
+        self.nodes.pop(name, None)
+        self.node_count -= 1
+        self.link_count -= len(attached)
+
+
+def get_role_index(node_tree):
+    """Cached NodeRoleIndex for node_tree, rebuilt when the tree changed behind its back"""
+    if not node_tree:
+        return None
+    key = node_tree.as_pointer()
+    index = _role_index_cache.get(key)
+    if index is None or not index.is_valid(node_tree):
+        index = NodeRoleIndex(node_tree)
+        _role_index_cache[key] = index
+    return index
+
+
+def invalidate_role_index(node_tree=None):
+    if node_tree is None:
+        _role_index_cache.clear()
+    else:
+        _role_index_cache.pop(node_tree.as_pointer(), None)
+
+
+def remove_material(mat):
+    """bpy.data.materials.remove(mat), dropping its node tree's role index first"""
+    if mat.node_tree:
+        invalidate_role_index(mat.node_tree)
+    bpy.data.materials.remove(mat)
+
+
+@persistent
+def _clear_role_index_cache(*_args):
+    # Undo and file loads free the node trees the cached indexes point at
+    if _role_index_cache:
+        _role_index_cache.clear()
+
+
+ROLE_INDEX_HANDLERS = ("load_post", "undo_post", "redo_post")
+
+
+def setup_dual_emb_color(mat, shader_type="", dual_image=None):
+    """Set up DYT dual color sampling for Dual EMB Masks OR MSK AO.
+
+    dual_image replaces the DYT texture in the sampler (its DYT ramp).
+    """
+    index = get_role_index(mat.node_tree)
+    dyt_texture_node = index.node("dyt")
+    group_node = index.node("main_group")
 
     if not (dyt_texture_node and dyt_texture_node.image and group_node and "Dual EMB Color" in group_node.inputs):
         return
@@ -1779,61 +2531,44 @@ def setup_dual_emb_color(mat, shader_type=""):
     old_sampler_name = "DYT Dual Color Sampler"
     old_uv_map_name = "Dual Color UV Map"
 
-    # Remove existing nodes if they are there to ensure clean setup
-    if mat.node_tree.nodes.get(old_sampler_name):
-        mat.node_tree.nodes.remove(mat.node_tree.nodes[old_sampler_name])
-    if mat.node_tree.nodes.get(old_uv_map_name):
-        mat.node_tree.nodes.remove(mat.node_tree.nodes[old_uv_map_name])
-
-    dyt_dual_sampler = mat.node_tree.nodes.new("ShaderNodeTexImage")
-    dyt_dual_sampler.name = old_sampler_name
+    # Reuse the sampler nodes from a previous Apply and only patch what differs
+    dyt_dual_sampler, _ = index.ensure_node("ShaderNodeTexImage", old_sampler_name)
     # Label reflects what the "Dual EMB Color" input is used for based on shader type
     # If MSK, it samples X=0.1. If XVM (or other), it samples Y=0.9.
-    dyt_dual_sampler.label = f"DYT Sample for 'Dual EMB Color' (X0.1 if MSK, Y0.9 else)"
-    dyt_dual_sampler.location = group_node.location + mathutils.Vector((-300, -550))
-    dyt_dual_sampler.image = dyt_texture_node.image
-    dyt_dual_sampler.hide = True
+    set_if_changed(dyt_dual_sampler, "label", f"DYT Sample for 'Dual EMB Color' (X0.1 if MSK, Y0.9 else)")
+    set_if_changed(dyt_dual_sampler, "location", group_node.location + mathutils.Vector((-300, -550)))
+    set_if_changed(dyt_dual_sampler, "image", dual_image or dyt_texture_node.image)
+    set_if_changed(dyt_dual_sampler, "hide", True)
 
-    dual_uv_map = mat.node_tree.nodes.new("ShaderNodeMapping")
-    dual_uv_map.name = old_uv_map_name
-    dual_uv_map.label = "UV for 'Dual EMB Color' Sample"
-    dual_uv_map.location = dyt_dual_sampler.location + mathutils.Vector((-200, 0))
+    dual_uv_map, _ = index.ensure_node("ShaderNodeMapping", old_uv_map_name)
+    set_if_changed(dual_uv_map, "label", "UV for 'Dual EMB Color' Sample")
+    set_if_changed(dual_uv_map, "location", dyt_dual_sampler.location + mathutils.Vector((-200, 0)))
 
+    location_socket = dual_uv_map.inputs["Location"]
     if is_msk:  # This condition is from the original logic for this function
         # For MSK-identified materials, "Dual EMB Color" input gets DYT sampled at X=0.1
-        dual_uv_map.inputs["Location"].default_value[0] = 0.1
-        dual_uv_map.inputs["Location"].default_value[1] = 0.0
+        set_socket_default(location_socket, (0.1, 0.0, location_socket.default_value[2]))
     else:
         # For non-MSK (e.g., XVM), "Dual EMB Color" input gets DYT sampled at Y=0.9
-        dual_uv_map.inputs["Location"].default_value[0] = 0.0
-        dual_uv_map.inputs["Location"].default_value[1] = 0.9
+        set_socket_default(location_socket, (0.0, 0.9, location_socket.default_value[2]))
 
-    dual_uv_map.hide = True
+    set_if_changed(dual_uv_map, "hide", True)
 
-    dyt_uv_source_socket = None
-    dyt_main_tex_node = mat.node_tree.nodes.get("Image Texture.004")
-    if dyt_main_tex_node:
-        # Find what's connected to the DYT texture's Vector input (usually the DYT Control group)
-        dyt_uv_source_socket = next((link.from_socket for link in mat.node_tree.links if
-                                     link.to_node == dyt_main_tex_node and link.to_socket == dyt_main_tex_node.inputs[
-                                         "Vector"]), None)
+    # Find what's connected to the DYT texture's Vector input (usually the DYT Control group)
+    dyt_uv_link = index.incoming_link(dyt_texture_node.inputs["Vector"])
+    dyt_uv_source_socket = dyt_uv_link.from_socket if dyt_uv_link else None
 
     if dyt_uv_source_socket:
-        mat.node_tree.links.new(dyt_uv_source_socket, dual_uv_map.inputs["Vector"])
-        mat.node_tree.links.new(dual_uv_map.outputs["Vector"], dyt_dual_sampler.inputs["Vector"])
-
-        target_socket = group_node.inputs["Dual EMB Color"]
-        # Remove any existing links to this target socket before adding new one
-        for link in list(mat.node_tree.links):
-            if link.to_node == group_node and link.to_socket == target_socket:
-                mat.node_tree.links.remove(link)
-        mat.node_tree.links.new(dyt_dual_sampler.outputs["Color"], target_socket)
+        index.ensure_link(dyt_uv_source_socket, dual_uv_map.inputs["Vector"])
+        index.ensure_link(dual_uv_map.outputs["Vector"], dyt_dual_sampler.inputs["Vector"])
+        index.ensure_link(dyt_dual_sampler.outputs["Color"], group_node.inputs["Dual EMB Color"])
     else:
-        print(f"[XV2][DualEMBSamplerSetup] '{mat.name}': No UV source for DYT. 'Dual EMB Color' sampling skipped.")
+        log.debug("'%s': No UV source for DYT. 'Dual EMB Color' sampling skipped.", mat.name)
 
 
 def xenoverse_2___dimps_node_group(node_tree):
     for node in list(node_tree.nodes): node_tree.nodes.remove(node)
+    invalidate_role_index(node_tree)
 
     # Frames for texture nodes
     dyt_frame = node_tree.nodes.new("NodeFrame");
@@ -1915,7 +2650,7 @@ def build_row_map(folder):
     rows = {}
     shader_types = {}
     if not isinstance(folder, str) or not folder or not os.path.isdir(folder):
-        print(f"[XV2] EMM XML folder path is not set or invalid: '{folder}'. Skipping EMM data loading.")
+        log.info("EMM XML folder path is not set or invalid: '%s'. Skipping EMM data loading.", folder)
         return rows, shader_types
     for root, _, files in os.walk(folder):
         for f in files:
@@ -1925,7 +2660,7 @@ def build_row_map(folder):
                     tree = ET.parse(xml_path)
                     xml_root = tree.getroot()
                 except ET.ParseError:
-                    print(f"[XV2] Warning: Could not parse EMM XML: {xml_path}")
+                    log.warning("Could not parse EMM XML: %s", xml_path)
                     continue
                 for m in xml_root.findall(".//Material"):
                     name_attr = m.get("Name")
@@ -1939,41 +2674,78 @@ def build_row_map(folder):
                         try:
                             rows[name] = int(float(mat_scale_param.get("value")))
                         except ValueError:
-                            print(f"[XV2] Warning: Could not parse MatScale1X for EMM material '{name}' in {f}")
+                            log.warning("Could not parse MatScale1X for EMM material '%s' in %s", name, f)
     return rows, shader_types
 
 
+_row_map_cache = {}
+
+
+def emm_folder_mtimes(folder):
+    """mtime of every folder and .emm.xml file under folder, used to validate the cached row map"""
+    mtimes = {}
+    for root, _, files in os.walk(folder):
+        for path in [root] + [os.path.join(root, f) for f in files if f.endswith(".emm.xml")]:
+            try:
+                mtimes[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                pass
+    return mtimes
+
+
+def get_row_map(folder):
+    """build_row_map(folder), reused until a folder or .emm.xml file under it changes"""
+    if not isinstance(folder, str) or not folder or not os.path.isdir(folder):
+        return build_row_map(folder)
+    key = os.path.normcase(os.path.abspath(folder))
+    cached = _row_map_cache.get(key)
+    if cached:
+        mtimes, row_map = cached
+        if all(path_mtime(path) == mtime for path, mtime in mtimes.items()):
+            return row_map
+    mtimes = emm_folder_mtimes(folder)
+    row_map = build_row_map(folder)
+    _row_map_cache[key] = (mtimes, row_map)
+    return row_map
+
+
 def setup_toon_unif_env_camera_uvs(mat, obj=None):
     if not mat or not mat.node_tree:
         return
 
-    emb_tex_node = mat.node_tree.nodes.get("Image Texture.001")
+    index = get_role_index(mat.node_tree)
+    emb_tex_node = index.node("emb")
     if not emb_tex_node:
         return
 
-    if mat.node_tree.nodes.get("TOON_UNIF_ENV Tex Coord"):
+    if index.get("TOON_UNIF_ENV Tex Coord"):
+        # Already set up by a previous Apply - only restore links that went missing
+        tex_coord_node = index.get("TOON_UNIF_ENV Tex Coord")
+        vec_transform = index.get("TOON_UNIF_ENV Transform")
+        mapping_node = index.get("TOON_UNIF_ENV Mapping")
+        if vec_transform and mapping_node:
+            index.ensure_link(tex_coord_node.outputs["Normal"], vec_transform.inputs["Vector"])
+            index.ensure_link(vec_transform.outputs["Vector"], mapping_node.inputs["Vector"])
+            index.ensure_link(mapping_node.outputs["Vector"], emb_tex_node.inputs["Vector"])
         return
 
     X_OFFSET = 250
     BASE_X = emb_tex_node.location[0] - X_OFFSET * 3
     BASE_Y = emb_tex_node.location[1] - X_OFFSET
 
-    tex_coord_node = mat.node_tree.nodes.new("ShaderNodeTexCoord")
-    tex_coord_node.name = "TOON_UNIF_ENV Tex Coord"
+    tex_coord_node, _ = index.ensure_node("ShaderNodeTexCoord", "TOON_UNIF_ENV Tex Coord")
     tex_coord_node.from_instancer = True
     tex_coord_node.location = (BASE_X, BASE_Y)
     tex_coord_node.hide = True
 
-    vec_transform = mat.node_tree.nodes.new("ShaderNodeVectorTransform")
-    vec_transform.name = "TOON_UNIF_ENV Transform"
+    vec_transform, _ = index.ensure_node("ShaderNodeVectorTransform", "TOON_UNIF_ENV Transform")
     vec_transform.convert_from = 'OBJECT'
     vec_transform.convert_to = 'CAMERA'
     vec_transform.vector_type = 'NORMAL'
     vec_transform.location = (BASE_X + X_OFFSET, BASE_Y)
     vec_transform.hide = True
 
-    mapping_node = mat.node_tree.nodes.new("ShaderNodeMapping")
-    mapping_node.name = "TOON_UNIF_ENV Mapping"
+    mapping_node, _ = index.ensure_node("ShaderNodeMapping", "TOON_UNIF_ENV Mapping")
     mapping_node.vector_type = 'POINT'
     mapping_node.location = (BASE_X + X_OFFSET * 2, BASE_Y)
 
@@ -1981,42 +2753,238 @@ def setup_toon_unif_env_camera_uvs(mat, obj=None):
     mapping_node.inputs["Rotation"].default_value = (0.0, 0.0, 0.0)
     mapping_node.inputs["Scale"].default_value = (0.5, -0.5, 0.0)
 
-    mat.node_tree.links.new(tex_coord_node.outputs["Normal"], vec_transform.inputs["Vector"])
-    mat.node_tree.links.new(vec_transform.outputs["Vector"], mapping_node.inputs["Vector"])
+    index.ensure_link(tex_coord_node.outputs["Normal"], vec_transform.inputs["Vector"])
+    index.ensure_link(vec_transform.outputs["Vector"], mapping_node.inputs["Vector"])
+    index.ensure_link(mapping_node.outputs["Vector"], emb_tex_node.inputs["Vector"])
 
-    for link in list(mat.node_tree.links):
-        if link.to_node == emb_tex_node and link.to_socket == emb_tex_node.inputs["Vector"]:
-            mat.node_tree.links.remove(link)
 
-    mat.node_tree.links.new(mapping_node.outputs["Vector"], emb_tex_node.inputs["Vector"])
+def remove_toon_unif_env_camera_uvs(mat):
+    """Remove the TOON_UNIF_ENV camera UV nodes (if any), leaving the EMB texture on default UVs."""
+    if not mat or not mat.node_tree:
+        return
+    index = get_role_index(mat.node_tree)
+    for name in TOON_UNIF_ENV_UV_NODES:
+        node = index.get(name)
+        if node:
+            index.remove_node(node)
 
 
 def enhance_toon_unif_env_settings(mat):
     if not mat: return
-    mat.blend_method = 'BLEND'
-    mat.show_transparent_back = False
-    mat.use_backface_culling = False
+    set_if_changed(mat, "blend_method", 'BLEND')
+    set_if_changed(mat, "show_transparent_back", False)
+    set_if_changed(mat, "use_backface_culling", False)
 
 
 def set_toon_unif_env_properties(mat, is_toon_unif_env):
     if not mat or not mat.node_tree: return
-    group_node = mat.node_tree.nodes.get("Group")
+    group_node = get_role_index(mat.node_tree).node("main_group")
     if group_node and "Is TOON_UNIF_ENV" in group_node.inputs:
-        group_node.inputs["Is TOON_UNIF_ENV"].default_value = 1.0 if is_toon_unif_env else 0.0
-        if is_toon_unif_env: print(f"[XV2] Enabled TOON_UNIF_ENV mode for material '{mat.name}'")
+        set_socket_default(group_node.inputs["Is TOON_UNIF_ENV"], 1.0 if is_toon_unif_env else 0.0)
+        if is_toon_unif_env: log.debug("Enabled TOON_UNIF_ENV mode for material '%s'", mat.name)
+
+
+# --- CACHE PREWARM ---
+# Setting the EMM or texture folder starts a thread that parses the EMM files, indexes
+# the texture root and lists the DATA folders. The thread only touches the filesystem;
+# its results are installed into the caches on the main thread by a bpy.app.timers poll.
+
+
+PREWARM_POLL_INTERVAL = 0.25
+_prewarm_lock = threading.Lock()
+_prewarm_results = []
+_prewarm_generation = 0
+_prewarm_thread = None
+
+
+def prewarm_caches(emm_dir, tex_dir):
+    """(cache, key, value) entries for the EMM, texture and DATA caches. Must not touch bpy."""
+    results = []
+    if isinstance(emm_dir, str) and emm_dir and os.path.isdir(emm_dir):
+        mtimes = emm_folder_mtimes(emm_dir)
+        results.append(("rows", os.path.normcase(os.path.abspath(emm_dir)), (mtimes, build_row_map(emm_dir))))
+    if tex_dir and os.path.isdir(tex_dir):
+        index = TextureIndex(tex_dir)
+        results.append(("textures", os.path.normcase(os.path.abspath(tex_dir)), index))
+        dyt_folders = sorted({os.path.dirname(path) for base, _, path in index.entries if "_dyt" in base})
+        for folder in dyt_folders:
+            mtime = path_mtime(folder)
+            results.append(("data", os.path.normcase(os.path.abspath(folder)),
+                            (mtime, find_dyt_data_files(folder))))
+    return results
+
+
+def install_prewarm_results(results):
+    caches = {"rows": _row_map_cache, "textures": _texture_index_cache, "data": _data_files_cache}
+    for cache, key, value in results:
+        caches[cache][key] = value
+    log.info("Prewarmed %d cache entries", len(results))
+
+
+def _prewarm_worker(generation, emm_dir, tex_dir):
+    try:
+        results = prewarm_caches(emm_dir, tex_dir)
+    except Exception:
+        log.exception("Cache prewarm failed")
+        return
+    with _prewarm_lock:
+        _prewarm_results.append((generation, results))
+
+
+def _poll_prewarm_results():
+    """bpy.app.timers callback: install finished prewarm results on the main thread"""
+    alive = _prewarm_thread is not None and _prewarm_thread.is_alive()
+    with _prewarm_lock:
+        finished = list(_prewarm_results)
+        _prewarm_results.clear()
+    for generation, results in finished:
+        # Results from a thread started for older folder settings are dropped
+        if generation == _prewarm_generation:
+            install_prewarm_results(results)
+    return PREWARM_POLL_INTERVAL if alive else None
+
+
+def start_cache_prewarm(emm_dir, tex_dir):
+    global _prewarm_generation, _prewarm_thread
+    _prewarm_generation += 1
+    _prewarm_thread = threading.Thread(target=_prewarm_worker, name="xv2-cache-prewarm", daemon=True,
+                                       args=(_prewarm_generation, emm_dir, tex_dir))
+    _prewarm_thread.start()
+    if not bpy.app.timers.is_registered(_poll_prewarm_results):
+        bpy.app.timers.register(_poll_prewarm_results, first_interval=PREWARM_POLL_INTERVAL)
+
+
+def stop_cache_prewarm():
+    """Forget any running prewarm; its thread finishes on its own and its results are dropped"""
+    global _prewarm_generation
+    _prewarm_generation += 1
+    if bpy.app.timers.is_registered(_poll_prewarm_results):
+        bpy.app.timers.unregister(_poll_prewarm_results)
+
+
+def _update_prewarm(self, context):
+    start_cache_prewarm(self.emm_dir, self.tex_dir)
+
+
+def _update_logging(self, context):
+    apply_logging_prefs(self)
 
 
 class XV2_Prefs(AddonPreferences):
     bl_idname = __name__
-    emm_dir: StringProperty(name="EMM XML folder", subtype='DIR_PATH',
+    emm_dir: StringProperty(name="EMM XML folder", subtype='DIR_PATH', update=_update_prewarm,
                             description="Folder containing EMM XML definition files")
-    tex_dir: StringProperty(name="Texture folder", subtype='DIR_PATH',
+    tex_dir: StringProperty(name="Texture folder", subtype='DIR_PATH', update=_update_prewarm,
                             description="Root folder for game textures (DDS, PNG, etc.)")
+    time_apply_stages: BoolProperty(name="Time Apply stages", default=False,
+                                    description="Measure each stage of Apply and list the slowest materials")
+    timing_top_n: IntProperty(name="Slowest materials shown", default=5, min=1, max=50)
+    profile_apply: BoolProperty(name="Profile Apply (cProfile)", default=False,
+                                description="Run Apply under cProfile and save a .prof file next to the .blend")
+    cache_dir: StringProperty(name="Cache folder", subtype='DIR_PATH',
+                              description="Where analysis results are kept between sessions "
+                                          "(default: the addon's folder in Blender's user data)")
+    dds_fix_mode: EnumProperty(
+        name="Fixed DYT storage", default='CACHE',
+        items=[('CACHE', "Cache Folder", "Write each fixed DDS once to the cache folder and reference it by path"),
+               ('PACK', "Pack into .blend", "Pack a fixed copy into every .blend (portable, but larger files)")],
+        description="Where the Invisible DYT fix keeps its fixed copies")
+    mask_analysis_mode: EnumProperty(
+        name="Eye mask analysis", default='FIRST',
+        items=[('FIRST', "First Pixels", "Classify eye masks from their first 100 pixels (fastest, original behaviour)"),
+               ('STRATIFIED', "Stratified Sample", "Classify eye masks from a grid spread over the whole image"),
+               ('FULL', "Full Image", "Classify eye masks from every pixel")],
+        description="How much of an eye mask is read to pick its channel pushes")
+    log_level: EnumProperty(name="Log level", default='WARNING', update=_update_logging,
+                            items=[(level, level.title(), f"Log {level.lower()} messages and above")
+                                   for level in LOG_LEVELS],
+                            description="How much the addon writes to the system console")
+    log_to_sidebar: BoolProperty(name="Show log in sidebar", default=False, update=_update_logging,
+                                 description="Keep recent log messages in memory and list them in the XV2 panel")
+    log_sidebar_capacity: IntProperty(name="Messages kept", default=200, min=10, max=5000,
+                                      update=_update_logging)
+    log_sidebar_lines: IntProperty(name="Messages shown", default=8, min=1, max=50)
+    per_object_dyt_line: BoolProperty(
+        name="Per-object DYT Line", default=False,
+        description="Drive the DYT Line of main-shader materials from the object property 'xv2_dyt_line' through an "
+                    "Attribute node, so objects that only differ in their line share one material and one compiled "
+                    "shader. Paste DYT Settings then writes the property on the selected objects")
+    specialize_shaders: BoolProperty(
+        name="Specialized Shader Variants", default=True,
+        description="Give each material a copy of the main shader group with its XVM/MSK and TOON_UNIF_ENV "
+                    "switches folded in, so unused branches are not compiled or evaluated. Renders identically; "
+                    "turn off to edit the shared generic group")
+    dyt_ramps: BoolProperty(
+        name="DYT Ramps", default=False,
+        description="Extract the DYT rows each material samples into small cached ramp textures and assign those "
+                    "instead of the full DYT. Not used with per-object DYT Lines; Paste DYT Settings goes back to "
+                    "the full DYT")
+    proxy_textures: EnumProperty(
+        name="Viewport Proxies",
+        items=[('OFF', "Off", "Apply assigns full resolution textures"),
+               ('256', "256 px", "EMB and mask textures at most 256 pixels in the viewport"),
+               ('512', "512 px", "EMB and mask textures at most 512 pixels in the viewport"),
+               ('1024', "1024 px", "EMB and mask textures at most 1024 pixels in the viewport")],
+        default='OFF',
+        description="Assign downscaled copies of the EMB and mask textures (000/001/002), made from a smaller DDS "
+                    "mip and cached on disk. Final renders swap the full resolution images in. DYT stays as is")
+    dedup_by_content: BoolProperty(
+        name="Deduplicate identical files", default=False,
+        description="Also share one image between texture files with identical contents under different paths. "
+                    "Hashes every loaded file once per session")
+    image_budget_mb: IntProperty(
+        name="Image Budget (MB)", default=0, min=0,
+        description="Remove the least recently used images the addon loaded (Apply textures, DYT and DATA files) "
+                    "that nothing uses any more once their estimated RAM passes this. 0 = no limit")
 
     def draw(self, context):
         layout = self.layout
         layout.prop(self, "emm_dir")
         layout.prop(self, "tex_dir")
+        layout.prop(self, "cache_dir")
+        row = layout.row()
+        row.prop(self, "dds_fix_mode")
+        row.operator("xv2.clear_fixed_dds_cache", text="", icon='TRASH')
+        row = layout.row()
+        row.prop(self, "mask_analysis_mode")
+        row.operator("xv2.clear_mask_cache", text="", icon='TRASH')
+        layout.prop(self, "per_object_dyt_line")
+        layout.prop(self, "specialize_shaders")
+        row = layout.row()
+        row.prop(self, "dyt_ramps")
+        row.operator("xv2.clear_dyt_ramp_cache", text="", icon='TRASH')
+        row = layout.row()
+        row.prop(self, "proxy_textures")
+        row.operator("xv2.clear_proxy_cache", text="", icon='TRASH')
+        row = layout.row()
+        row.prop(self, "image_budget_mb")
+        row.operator("xv2.trim_images", text="", icon='TRASH')
+        row = layout.row()
+        row.prop(self, "dedup_by_content")
+        row.operator("xv2.dedup_images", text="", icon='DUPLICATE')
+        col = layout.column(heading="Diagnostics")
+        col.prop(self, "time_apply_stages")
+        sub = col.row()
+        sub.active = self.time_apply_stages
+        sub.prop(self, "timing_top_n")
+        col.prop(self, "profile_apply")
+        col = layout.column(heading="Logging")
+        col.prop(self, "log_level")
+        col.prop(self, "log_to_sidebar")
+        sub = col.column()
+        sub.active = self.log_to_sidebar
+        sub.prop(self, "log_sidebar_capacity")
+        sub.prop(self, "log_sidebar_lines")
+
+
+class XV2_OT_clear_log(Operator):
+    bl_idname = "xv2.clear_log"
+    bl_label = "Clear XV2 Log"
+    bl_description = "Forget the log messages listed in the sidebar"
+
+    def execute(self, context):
+        _log_buffer.records.clear()
+        return {'FINISHED'}
 
 
 EXTS = (".dds", ".png", ".tga", ".jpg", ".jpeg")
@@ -2025,11 +2993,11 @@ EXTS = (".dds", ".png", ".tga", ".jpg", ".jpeg")
 def strip_num(n): return re.sub(r"\.\d+$", "", n).lower()
 
 
-def find_image(primary_stub, original_material_name_hint, kind, tex_root, mat_scale1x_val=None):
+def texture_name_patterns(primary_stub, original_material_name_hint, kind):
+    """File name prefixes to try, in priority order, for one texture kind of a material"""
     primary_stub = primary_stub.lower()
     original_material_name_hint = original_material_name_hint.lower()
     kind_lower = kind.lower()
-    actual_search_suffixes = [kind_lower]
     patterns = []
     match_dot_num = re.match(r"(.+)\.(\d+)$", original_material_name_hint)
     if match_dot_num:
@@ -2046,122 +3014,339 @@ def find_image(primary_stub, original_material_name_hint, kind, tex_root, mat_sc
     unique_patterns = []
     for p in patterns:
         if p and p not in unique_patterns: unique_patterns.append(p)
-    for pat in unique_patterns:
-        for img in bpy.data.images:
-            img_filepath_base_lower = ""
-            if img.filepath: img_filepath_base_lower = \
-                os.path.splitext(os.path.basename(bpy.path.abspath(img.filepath)))[0].lower()
-            img_name_no_ext_lower = os.path.splitext(img.name)[0].lower()
-            if img_filepath_base_lower.startswith(pat) or img_name_no_ext_lower.startswith(pat): return img
-    if tex_root and os.path.isdir(tex_root):
-        for pat in unique_patterns:
-            for r, _, fs in os.walk(tex_root):
-                for f_walk in fs:
-                    f_walk_lower = f_walk.lower()
-                    f_walk_base_lower = os.path.splitext(f_walk_lower)[0]
-                    if f_walk_base_lower.startswith(pat) and f_walk_lower.endswith(EXTS):
-                        try:
-                            return bpy.data.images.load(os.path.join(r, f_walk), check_existing=True)
-                        except RuntimeError as e:
-                            print(f"[XV2] Warning: Could not load image: {os.path.join(r, f_walk)} - {e}")
+    return unique_patterns
+
+
+class TextureIndex:
+    """Every texture file under a texture root, searchable by file name prefix.
+
+    Built with a single os.walk instead of one walk per pattern. Prefix lookups
+    bisect a sorted list of base names and return the first match in walk order,
+    exactly like walking the tree pattern by pattern did.
+    """
+
+    def __init__(self, tex_root):
+        self.tex_root = tex_root
+        self.dir_mtimes = {}
+        entries = []
+        for r, _, fs in os.walk(tex_root):
+            try:
+                self.dir_mtimes[r] = os.stat(r).st_mtime_ns
+            except OSError:
+                pass
+            for f_walk in fs:
+                f_walk_lower = f_walk.lower()
+                if f_walk_lower.endswith(EXTS):
+                    entries.append((os.path.splitext(f_walk_lower)[0], len(entries), os.path.join(r, f_walk)))
+        entries.sort()
+        self.entries = entries
+        self.bases = [entry[0] for entry in entries]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def is_current(self):
+        """Adding, removing or renaming a file changes its folder's mtime"""
+        for folder, mtime in self.dir_mtimes.items():
+            try:
+                if os.stat(folder).st_mtime_ns != mtime:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def find(self, prefix):
+        best = None
+        for i in range(bisect.bisect_left(self.bases, prefix), len(self.bases)):
+            if not self.bases[i].startswith(prefix):
+                break
+            _, order, path = self.entries[i]
+            if best is None or order < best[0]:
+                best = (order, path)
+        return best[1] if best else None
+
+
+_texture_index_cache = {}
+
+
+def get_texture_index(tex_root):
+    """Cached TextureIndex for tex_root, rebuilt when any folder under it changed"""
+    if not tex_root or not os.path.isdir(tex_root):
+        return None
+    key = os.path.normcase(os.path.abspath(tex_root))
+    index = _texture_index_cache.get(key)
+    if index is None or not index.is_current():
+        index = TextureIndex(tex_root)
+        _texture_index_cache[key] = index
+    return index
+
+
+class ImageSnapshot(list):
+    """(source, key, abs path, path base, name base) entries, searchable by base name prefix.
+
+    find() returns the earliest entry whose path or name base starts with the prefix,
+    the same answer as scanning the list in order, by bisecting a sorted key list.
+    """
+
+    def __init__(self, entries=()):
+        super().__init__(entries)
+        self.keys = sorted((base, order) for order, entry in enumerate(self) for base in {entry[3], entry[4]} if base)
+
+    def append(self, entry):
+        order = len(self)
+        super().append(entry)
+        for base in {entry[3], entry[4]}:
+            if base:
+                bisect.insort(self.keys, (base, order))
+
+    def find(self, prefix):
+        best = None
+        for i in range(bisect.bisect_left(self.keys, (prefix,)), len(self.keys)):
+            base, order = self.keys[i]
+            if not base.startswith(prefix):
+                break
+            if best is None or order < best:
+                best = order
+        return self[best] if best is not None else None
+
+
+def snapshot_images():
+    """Plain-data view of bpy.data.images used to resolve textures without touching bpy"""
+    snapshot = []
+    for img in bpy.data.images:
+        # Proxies are never resolved to; fixed DYT copies stand in for their original file
+        if img.get("xv2_proxy_of"):
+            continue
+        abs_path = img.get("xv2_fixed_from") or (bpy.path.abspath(img.filepath) if img.filepath else "")
+        path_base = os.path.splitext(os.path.basename(abs_path))[0].lower() if abs_path else ""
+        snapshot.append(("image", img.name, abs_path, path_base, os.path.splitext(img.name)[0].lower()))
+    return ImageSnapshot(snapshot)
+
+
+def resolve_texture(primary_stub, original_material_name_hint, kind, images, tex_index):
+    """Pure-Python half of find_image. Returns (source, key, path) or None.
+
+    source is "image" (key = name of an already loaded image) or "file" (key = path to load).
+    plan_apply() may turn a result into "fixed" (key = cached fixed copy of the path).
+    images is a snapshot_images() ImageSnapshot; planned file loads are appended to it so
+    later lookups see them, just like find_image sees images loaded earlier in the same run.
+    """
+    patterns = texture_name_patterns(primary_stub, original_material_name_hint, kind)
+    for pat in patterns:
+        entry = images.find(pat)
+        if entry:
+            return entry[0], entry[1], entry[2]
+    if tex_index:
+        for pat in patterns:
+            path = tex_index.find(pat)
+            if path:
+                base_lower = os.path.splitext(os.path.basename(path))[0].lower()
+                images.append(("file", path, path, base_lower, base_lower))
+                return "file", path, path
     return None
 
 
+def load_resolved_texture(resolved):
+    """bpy half of find_image: turn a resolve_texture() result into an image datablock"""
+    if not resolved:
+        return None
+    source, key, path = resolved
+    if source == "image":
+        img = bpy.data.images.get(key)
+        if img is not None and key in _managed_images:
+            track_image(img, path)
+        return img
+    try:
+        img = load_tracked_image(key)
+        if source == "fixed" and img.name == os.path.basename(key):
+            _managed_images.pop(img.name, None)
+            img.name = f"{os.path.splitext(os.path.basename(path))[0]}_fixed"
+            img["xv2_fixed_from"] = path
+            track_image(img, key)
+        return img
+    except RuntimeError as e:
+        log.warning("Could not load image: %s - %s", key, e)
+        return None
+
+
+def find_image(primary_stub, original_material_name_hint, kind, tex_root, mat_scale1x_val=None):
+    resolved = resolve_texture(primary_stub, original_material_name_hint, kind, snapshot_images(),
+                               get_texture_index(tex_root))
+    return load_resolved_texture(resolved)
+
+
 def get_material_texture_nodes(mat):
     if not mat or not mat.node_tree: return None, None, None
-    dyt_node = mat.node_tree.nodes.get("Image Texture.004")
-    emb_lines_node = mat.node_tree.nodes.get("Image Texture.001")
-    dual_emb_node = mat.node_tree.nodes.get("Image Texture Dual EMB")  # This is the mask texture node
+    index = get_role_index(mat.node_tree)
+    dyt_node = index.node("dyt")
+    emb_lines_node = index.node("emb")
+    dual_emb_node = index.node("mask")  # This is the mask texture node
     return dyt_node, emb_lines_node, dual_emb_node
 
 
 def assign_images(mat, primary_stub, original_material_name, tex_root, shader_type="", mat_scale1x_val=None):
     """ONLY CHANGE: Remove MSK strength logic, add MSK invert setup"""
+    if not mat:
+        return
+    # Find all textures (UNCHANGED)
+    img_dyt = find_image(primary_stub, original_material_name, "dyt", tex_root, mat_scale1x_val)
+    img_000 = find_image(primary_stub, original_material_name, "000", tex_root, mat_scale1x_val)
+    img_001 = find_image(primary_stub, original_material_name, "001", tex_root, mat_scale1x_val)
+    img_002 = find_image(primary_stub, original_material_name, "002", tex_root, mat_scale1x_val)
+    assign_xv2_images(mat, primary_stub, shader_type, img_dyt, img_000, img_001, img_002)
+
+
+def assign_xv2_images(mat, primary_stub, shader_type, img_dyt, img_000, img_001, img_002):
+    """Put already resolved textures into the XV2 layout and set the MSK/XVM flags"""
     if not mat:
         return
 
     dyt_node, emb_lines_node, dual_emb_node = get_material_texture_nodes(mat)
 
     if not (dyt_node and emb_lines_node and dual_emb_node):
-        print(f"[XV2] Warn: Missing core texture nodes in '{mat.name}'. Skipping assignment.")
+        log.warning("Missing core texture nodes in '%s'. Skipping assignment.", mat.name)
         return
 
-    print(f"[XV2] PROCESSING: {mat.name} (stub: {primary_stub}, shader: {shader_type})")
+    log.debug("PROCESSING: %s (stub: %s, shader: %s)", mat.name, primary_stub, shader_type)
 
     is_msk_shader = shader_type and "MSK" in shader_type.upper()
     is_xvm_shader = shader_type and "XVM" in shader_type.upper()
 
-    # Find all textures (UNCHANGED)
-    img_dyt = find_image(primary_stub, original_material_name, "dyt", tex_root, mat_scale1x_val)
-    img_000 = find_image(primary_stub, original_material_name, "000", tex_root, mat_scale1x_val)
-    img_001 = find_image(primary_stub, original_material_name, "001", tex_root, mat_scale1x_val)
-    img_002 = find_image(primary_stub, original_material_name, "002", tex_root, mat_scale1x_val)
-
     # Texture assignment (UNCHANGED)
     if img_dyt:
-        dyt_node.image = img_dyt
-        print(f"[XV2] DYT: {img_dyt.name}")
+        set_if_changed(dyt_node, "image", img_dyt)
+        log.debug("DYT: %s", img_dyt.name)
     else:
-        dyt_node.image = None
+        set_if_changed(dyt_node, "image", None)
 
     if img_000:
-        emb_lines_node.image = img_000
-        print(f"[XV2] EMB Lines (000): {img_000.name}")
+        set_if_changed(emb_lines_node, "image", img_000)
+        log.debug("EMB Lines (000): %s", img_000.name)
     elif not is_msk_shader and img_001:
-        emb_lines_node.image = img_001
-        print(f"[XV2] EMB Lines (000 fallback to 001): {img_001.name}")
+        set_if_changed(emb_lines_node, "image", img_001)
+        log.debug("EMB Lines (000 fallback to 001): %s", img_001.name)
     else:
-        emb_lines_node.image = None
-        print(f"[XV2] EMB Lines (000): NONE")
+        set_if_changed(emb_lines_node, "image", None)
+        log.debug("EMB Lines (000): NONE")
 
     # Mask assignment (UNCHANGED)
     assigned_mask_texture = None
     if is_xvm_shader:
         if img_002:
             assigned_mask_texture = img_002
-            print(f"[XV2] Mask Texture (XVM Primary): {img_002.name} (_002)")
+            log.debug("Mask Texture (XVM Primary): %s (_002)", img_002.name)
         elif img_001:
             assigned_mask_texture = img_001
-            print(f"[XV2] Mask Texture (XVM Fallback): {img_001.name} (_001)")
+            log.debug("Mask Texture (XVM Fallback): %s (_001)", img_001.name)
     elif is_msk_shader:
         if img_001:
             assigned_mask_texture = img_001
-            print(f"[XV2] Mask Texture (MSK): {img_001.name} (_001)")
+            log.debug("Mask Texture (MSK): %s (_001)", img_001.name)
 
-    if assigned_mask_texture:
-        dual_emb_node.image = assigned_mask_texture
-    else:
-        dual_emb_node.image = None
-        print(f"[XV2] Mask Texture (MSK/XVM): No suitable texture found or shader type not requiring it.")
+    set_if_changed(dual_emb_node, "image", assigned_mask_texture)
+    if not assigned_mask_texture:
+        log.debug("Mask Texture (MSK/XVM): No suitable texture found or shader type not requiring it.")
 
     # SIMPLIFIED shader flags - MSK now just sets up invert + XVM
-    group_node = mat.node_tree.nodes.get("Group")
+    group_node = get_role_index(mat.node_tree).node("main_group")
     if group_node:
-        # Reset flags
+        # MSK: Setup invert and enable XVM
+        if is_msk_shader and dual_emb_node.image and setup_msk_as_inverted_xvm(mat, shader_type):
+            return
+
+        # Not (or no longer) MSK: feed the mask directly and reset flags
+        remove_msk_invert(mat)
+        is_xvm_enabled = bool(is_xvm_shader and dual_emb_node.image)
         if "Is XVM" in group_node.inputs:
-            group_node.inputs["Is XVM"].default_value = 0.0
+            set_socket_default(group_node.inputs["Is XVM"], 1.0 if is_xvm_enabled else 0.0)
         if "Dual EMB Strength" in group_node.inputs:
-            group_node.inputs["Dual EMB Strength"].default_value = 1.0
-
-        # MSK: Setup invert and enable XVM
-        if is_msk_shader and dual_emb_node.image:
-            setup_msk_as_inverted_xvm(mat, shader_type)
+            set_socket_default(group_node.inputs["Dual EMB Strength"], 1.0)
 
         # XVM: Enable directly
-        elif is_xvm_shader and dual_emb_node.image:
-            group_node.inputs["Is XVM"].default_value = 1.0
-            print(f"    XVM System: ENABLED")
+        if is_xvm_enabled:
+            log.debug("XVM System: ENABLED")
     else:
-        print(f"[XV2] Warn: Main shader group node not found in '{mat.name}'. Cannot set flags.")
+        log.warning("Main shader group node not found in '%s'. Cannot set flags.", mat.name)
 
 
 def set_dyt_line(mat, val):
     if not mat or not mat.node_tree: return
-    dyt_control_node_instance = mat.node_tree.nodes.get("Group.002")
-    if dyt_control_node_instance and dyt_control_node_instance.type == 'GROUP' and \
-            dyt_control_node_instance.node_tree and dyt_control_node_instance.node_tree.name == "DYT Control [CAMERA BASED]" and \
-            "DYT Line" in dyt_control_node_instance.inputs:
-        dyt_control_node_instance.inputs["DYT Line"].default_value = val
+    index = get_role_index(mat.node_tree)
+    line_node = index.node("dyt_line")
+    if line_node is not None:
+        set_socket_default(line_node.inputs[1], val)
+        return
+    dyt_control_node_instance = camera_dyt_control_node(index)
+    if dyt_control_node_instance:
+        set_socket_default(dyt_control_node_instance.inputs["DYT Line"], val)
+
+
+# --- PER-OBJECT DYT LINE ---
+# In per-object mode the "DYT Line" of the camera-based DYT Control comes from an
+# Attribute node (type OBJECT) reading the object custom property xv2_dyt_line, so
+# objects that only differ in their line share one material and one compiled shader.
+# Real lines are at least 0.1 and a missing property reads as 0, which falls back to
+# the material's own line:  DYT Line = attr + (attr < epsilon) * material line.
+
+
+DYT_LINE_ATTRIBUTE = "xv2_dyt_line"
+DYT_LINE_MISSING_EPSILON = 1e-4
+DYT_LINE_ROLES = ("dyt_line", "dyt_line_missing", "dyt_line_attribute")
+
+
+def camera_dyt_control_node(index):
+    node = index.node("dyt_control")
+    if node and node.type == 'GROUP' and node.node_tree and node.node_tree.name == "DYT Control [CAMERA BASED]" and \
+            "DYT Line" in node.inputs:
+        return node
+    return None
+
+
+def uses_dyt_line_attribute(mat):
+    return bool(mat and mat.use_nodes and mat.node_tree and get_role_index(mat.node_tree).node("dyt_line"))
+
+
+def setup_dyt_line_attribute(mat, enabled):
+    """Feed the DYT Line from the object attribute (enabled) or put the plain value back"""
+    index = get_role_index(mat.node_tree)
+    dyt_control = camera_dyt_control_node(index)
+    if dyt_control is None:
+        return
+    line_socket = dyt_control.inputs["DYT Line"]
+    line_node = index.node("dyt_line")
+    if not enabled:
+        if line_node is not None:
+            set_socket_default(line_socket, line_node.inputs[1].default_value)
+            for role in DYT_LINE_ROLES:
+                node = index.node(role)
+                if node: index.remove_node(node)
+        return
+    material_line = line_node.inputs[1].default_value if line_node else line_socket.default_value
+    names = NODE_ROLES["xv2"]
+    attribute, _ = index.ensure_node("ShaderNodeAttribute", names["dyt_line_attribute"])
+    set_if_changed(attribute, "attribute_type", 'OBJECT')
+    set_if_changed(attribute, "attribute_name", DYT_LINE_ATTRIBUTE)
+    set_if_changed(attribute, "location", dyt_control.location + mathutils.Vector((-560, -40)))
+    missing, _ = index.ensure_node("ShaderNodeMath", names["dyt_line_missing"])
+    set_if_changed(missing, "operation", 'LESS_THAN')
+    set_socket_default(missing.inputs[1], DYT_LINE_MISSING_EPSILON)
+    set_if_changed(missing, "location", dyt_control.location + mathutils.Vector((-380, 40)))
+    line_node, _ = index.ensure_node("ShaderNodeMath", names["dyt_line"])
+    set_if_changed(line_node, "operation", 'MULTIPLY_ADD')
+    set_if_changed(line_node, "label", "DYT Line (object xv2_dyt_line or material line)")
+    set_socket_default(line_node.inputs[1], material_line)
+    set_if_changed(line_node, "location", dyt_control.location + mathutils.Vector((-200, 0)))
+    index.ensure_link(attribute.outputs["Fac"], missing.inputs[0])
+    index.ensure_link(missing.outputs[0], line_node.inputs[0])
+    index.ensure_link(attribute.outputs["Fac"], line_node.inputs[2])
+    index.ensure_link(line_node.outputs[0], line_socket)
+
+
+def set_object_dyt_line(obj, val):
+    """Per-object DYT Line for materials in per-object mode"""
+    if obj.get(DYT_LINE_ATTRIBUTE) != val:
+        obj[DYT_LINE_ATTRIBUTE] = val
+        obj.update_tag()
 
 
 def create_xv2_material(material_name="Xenoverse 2 - Dimps"):
@@ -2172,6 +3357,10 @@ def create_xv2_material(material_name="Xenoverse 2 - Dimps"):
     mat = bpy.data.materials.get(material_name)
     if not mat:
         mat = bpy.data.materials.new(name=material_name)
+    elif mat.use_nodes and layout_is_current(mat.node_tree, XV2_LAYOUT_NODES):
+        # Already an XV2 material: patch missing links instead of rebuilding the tree
+        patch_layout_links(mat.node_tree, XV2_LAYOUT_LINKS)
+        return mat
     else:
         # Clear existing node tree to ensure fresh setup if material is reused
         if mat.node_tree:
@@ -2187,149 +3376,741 @@ def create_xv2_material(material_name="Xenoverse 2 - Dimps"):
     return mat
 
 
-class XV2_OT_apply(Operator):
-    bl_idname = "xv2.apply_shader"
-    bl_label = "Apply/Update Shaders"
+# --- APPLY PLANNING ---
+# Apply runs in two phases. plan_apply() works on plain data only (material names,
+# a snapshot of bpy.data.images, the EMM map and the texture index) and may use
+# worker threads for filesystem I/O. commit_apply_plan() then performs every bpy
+# write in one tight loop on the main thread.
+
+
+PLAN_IO_WORKERS = min(8, (os.cpu_count() or 1) + 4)
+# Bump whenever the generated node graphs or the way Apply fills them change,
+# so fingerprints from older builds no longer match and materials get rebuilt.
+XV2_GRAPH_VERSION = 1
+XV2_TEXTURE_KINDS = ("dyt", "000", "001", "002")
+EYE_TEXTURE_KINDS = ("000", "001", "dyt")
+
+
+class MaterialPlan:
+    """Everything Apply will do for one material stub"""
+
+    def __init__(self, primary_stub, original_name):
+        self.primary_stub = primary_stub
+        self.original_name = original_name
+        self.shader_type = ""
+        self.mat_scale1x = None
+        self.dyt_line = None  # DYT Control line, non-eye materials only
+        self.dyt_line_attribute = False  # line overridable per object through xv2_dyt_line
+        self.specialize_shaders = False  # use the folded main group variants
+        self.dyt_ramps = None  # [(row, ramp path)] for the DYT node and the dual sampler
+        self.mask_analysis_mode = None  # eye materials only, decides the channel pushes
+        self.textures = {}  # kind -> resolve_texture() result
+        self.dyt_path = None
+        self.data_files = []
+        self.fingerprint = ""
+
+    @property
+    def is_eye(self):
+        return is_eye_shader(self.shader_type)
+
+
+class ApplyPlan:
+    """Output of plan_apply(): one MaterialPlan per stub plus the slot assignments"""
+
+    def __init__(self, rows, shader_types):
+        self.rows = rows
+        self.shader_types = shader_types
+        self.materials = {}  # primary stub -> MaterialPlan, in first-seen order
+        self.slots = []  # (object name, slot index, primary stub or None)
+        self.original_names = set()
+        self.proxies = {}  # cache_key(original path) -> proxy DDS path, in proxy mode
+
+
+def collect_slot_materials(target_objects):
+    """(object name, slot index, material name or None) for every slot of the targets"""
+    slot_materials = []
+    for obj in target_objects:
+        if not obj.data or not obj.material_slots: continue
+        for i, slot in enumerate(obj.material_slots):
+            slot_materials.append((obj.name, i, slot.material.name if slot.material else None))
+    return slot_materials
+
+
+def lookup_mat_scale1x(primary_stub, rows):
+    mat_scale1x = rows.get(primary_stub.lower())
+    if mat_scale1x is None and "_" in primary_stub:
+        parts = primary_stub.split('_')
+        if len(parts) > 2 and parts[-2].isdigit():
+            potential_base = "_".join(parts[:-2] + [parts[-1]])
+            if potential_base.lower() in rows: mat_scale1x = rows[potential_base.lower()]
+    return mat_scale1x
+
+
+def lookup_shader_type(primary_stub, original_name, shader_types):
+    shader_type_key = primary_stub.lower()
+    if shader_type_key not in shader_types and original_name.lower() in shader_types:
+        shader_type_key = original_name.lower()
+    return shader_types.get(shader_type_key, "")
+
+
+def dyt_line_from_mat_scale1x(primary_stub, mat_scale1x):
+    if mat_scale1x is None:
+        return None
+    dyt_val = (mat_scale1x + 1) * 0.1
+    epsilon = 0.00001
+    if dyt_val >= (0.6 - epsilon):
+        original_dyt_for_log = dyt_val
+        dyt_val += 0.02
+        log.debug("Adjusting DYT Line for '%s' (>=0.6 rule): %.3f -> %.3f", primary_stub, original_dyt_for_log, dyt_val)
+    return dyt_val
+
+
+def plan_material(primary_stub, original_name, rows, shader_types, images, tex_index):
+    plan = MaterialPlan(primary_stub, original_name)
+    plan.shader_type = lookup_shader_type(primary_stub, original_name, shader_types)
+    plan.mat_scale1x = lookup_mat_scale1x(primary_stub, rows)
+    for kind in (EYE_TEXTURE_KINDS if plan.is_eye else XV2_TEXTURE_KINDS):
+        plan.textures[kind] = resolve_texture(primary_stub, original_name, kind, images, tex_index)
+    if not plan.is_eye:
+        plan.dyt_line = dyt_line_from_mat_scale1x(primary_stub, plan.mat_scale1x)
+    dyt = plan.textures.get("dyt")
+    if dyt and dyt[2] and os.path.exists(dyt[2]):
+        plan.dyt_path = dyt[2]
+    return plan
+
+
+def path_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def material_fingerprint(material_plan, mtimes):
+    """sha1 over every input that decides what Apply writes into a material"""
+    parts = [bl_info["version"], XV2_GRAPH_VERSION, material_plan.primary_stub, material_plan.shader_type,
+             material_plan.mat_scale1x, material_plan.dyt_line]
+    for kind, resolved in material_plan.textures.items():
+        path = resolved[2] if resolved else ""
+        part = (kind, path, mtimes.get(path))
+        if resolved and resolved[0] == "fixed":
+            part += (resolved[1],)
+        parts.append(part)
+    for data_path in material_plan.data_files:
+        parts.append((data_path, mtimes.get(data_path)))
+    if material_plan.dyt_line_attribute:
+        parts.append("dyt_line_attribute")
+    if material_plan.specialize_shaders:
+        parts.append("specialize_shaders")
+    if material_plan.dyt_ramps:
+        parts.append(("dyt_ramps", material_plan.dyt_ramps))
+    if material_plan.mask_analysis_mode:
+        parts.append(("mask_analysis_mode", material_plan.mask_analysis_mode))
+    return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+
+
+def material_is_up_to_date(mat, material_plan):
+    """True when mat was built from exactly these inputs and its layout is still intact"""
+    if not mat or not mat.use_nodes or mat.get("xv2_fingerprint") != material_plan.fingerprint:
+        return False
+    return layout_is_current(mat.node_tree, EYE_LAYOUT_NODES if material_plan.is_eye else XV2_LAYOUT_NODES)
+
+
+def plan_apply(slot_materials, emm_dir, tex_root, images, broken_dds=None, proxy_size=0, per_object_dyt_line=False,
+               specialize_shaders=False, dyt_ramps=False, mask_analysis_mode='FIRST', dry_run=False):
+    """Resolve a whole Apply run without touching bpy.
+
+    slot_materials comes from collect_slot_materials(), images from snapshot_images().
+    Textures whose file key is in broken_dds (see known_broken_dds) are swapped for
+    their cached fixed copies. With a proxy_size, EMB and mask textures larger than
+    that get cached proxies (see plan_proxy_textures). per_object_dyt_line plans the
+    Attribute-driven DYT Line for main-shader materials, specialize_shaders the folded
+    main group variants and dyt_ramps the cached DYT ramps (see plan_dyt_ramps).
+    mask_analysis_mode is the mode eye materials will be analyzed with. A dry_run writes
+    no cache files: planned cache paths may not exist yet (see pending_cache_files).
+    """
+    with ThreadPoolExecutor(max_workers=PLAN_IO_WORKERS) as pool:
+        with stage("EMM parse + texture index"):
+            rows_future = pool.submit(get_row_map, emm_dir)
+            index_future = pool.submit(get_texture_index, tex_root)
+            rows, shader_types = rows_future.result()
+            tex_index = index_future.result()
+
+        plan = ApplyPlan(rows, shader_types)
+        for obj_name, slot_index, original_name in slot_materials:
+            if original_name is None:
+                plan.slots.append((obj_name, slot_index, None))
+                continue
+            plan.original_names.add(original_name)
+            primary_stub = strip_num(original_name)
+            if primary_stub not in plan.materials:
+                with stage("texture search", primary_stub):
+                    material_plan = plan_material(primary_stub, original_name, rows, shader_types, images, tex_index)
+                    material_plan.dyt_line_attribute = per_object_dyt_line and not material_plan.is_eye
+                    material_plan.specialize_shaders = specialize_shaders and not material_plan.is_eye
+                    material_plan.mask_analysis_mode = mask_analysis_mode if material_plan.is_eye else None
+                    plan.materials[primary_stub] = material_plan
+            plan.slots.append((obj_name, slot_index, primary_stub))
+
+        if broken_dds:
+            with stage("broken DDS routing"):
+                route_broken_textures(plan, broken_dds, create=not dry_run)
+
+        # DATA_xxx scans only hit the filesystem; run one per DYT folder in parallel
+        with stage("DATA scan"):
+            dyt_folders = sorted({os.path.dirname(m.dyt_path) for m in plan.materials.values() if m.dyt_path})
+            data_files = dict(zip(dyt_folders, pool.map(get_dyt_data_files, dyt_folders)))
+            for material_plan in plan.materials.values():
+                if material_plan.dyt_path:
+                    material_plan.data_files = data_files[os.path.dirname(material_plan.dyt_path)]
+
+        if proxy_size:
+            with stage("proxy textures"):
+                plan_proxy_textures(plan, proxy_size, pool, create=not dry_run)
+
+        if dyt_ramps:
+            with stage("DYT ramps"):
+                plan_dyt_ramps(plan, pool, create=not dry_run)
+
+        with stage("fingerprints"):
+            input_paths = {r[2] for m in plan.materials.values() for r in m.textures.values() if r and r[2]}
+            input_paths.update(p for m in plan.materials.values() for p in m.data_files)
+            input_paths = sorted(input_paths)
+            mtimes = dict(zip(input_paths, pool.map(path_mtime, input_paths)))
+            for material_plan in plan.materials.values():
+                material_plan.fingerprint = material_fingerprint(material_plan, mtimes)
+    return plan
+
+
+def route_broken_textures(plan, broken_dds, create=True):
+    """Point textures found broken by the last DDS scan at their fixed copies in the cache"""
+    for material_plan in plan.materials.values():
+        for kind, resolved in material_plan.textures.items():
+            if not resolved or resolved[0] == "fixed" or not resolved[2] or cache_key(resolved[2]) not in broken_dds:
+                continue
+            try:
+                fixed_path = fixed_dds_cache_path(resolved[2], create)
+            except OSError as e:
+                fix_log.warning("Failed to read/process image '%s': %s", resolved[2], e)
+                continue
+            if fixed_path:
+                fix_log.debug("Using fixed copy of '%s' for %s", resolved[2], material_plan.primary_stub)
+                material_plan.textures[kind] = ("fixed", fixed_path, resolved[2])
+    if create:
+        save_fixed_dds_index()
+
+
+def apply_broken_dds(prefs):
+    """broken_dds argument for plan_apply() under the current preferences"""
+    return known_broken_dds(prefs.tex_dir) if prefs.dds_fix_mode == 'CACHE' else None
+
+
+def plan_apply_args(prefs, objects, dry_run=False):
+    """plan_apply() arguments for objects with every option the preferences select"""
+    return (collect_slot_materials(objects), prefs.emm_dir, prefs.tex_dir, snapshot_images(),
+            apply_broken_dds(prefs), proxy_size_from_prefs(prefs), prefs.per_object_dyt_line,
+            prefs.specialize_shaders, prefs.dyt_ramps, prefs.mask_analysis_mode, dry_run)
+
+
+def plan_apply_with_prefs(prefs, objects, dry_run=False):
+    """plan_apply() for objects with every option the preferences select"""
+    return plan_apply(*plan_apply_args(prefs, objects, dry_run))
+
+
+def apply_toon_unif_env_state(mat, is_toon_unif, primary_stub):
+    """Switch a main-shader material into or out of the TOON_UNIF_ENV (glass) setup"""
+    set_toon_unif_env_properties(mat, is_toon_unif)
+    role_index = get_role_index(mat.node_tree)
+    emb_tex_node = role_index.node("emb")
+    shader_grp_node = role_index.node("main_group")
+    has_emb_alpha = emb_tex_node and shader_grp_node and "EMB Alpha" in shader_grp_node.inputs
+    if is_toon_unif:
+        if has_emb_alpha and role_index.unlink(shader_grp_node.inputs["EMB Alpha"],
+                                               emb_tex_node.outputs["Alpha"]):
+            log.debug("Auto-disconnected EMB Alpha for TOON_UNIF_ENV material: '%s'", primary_stub)
+        setup_toon_unif_env_camera_uvs(mat)
+        enhance_toon_unif_env_settings(mat)
+    else:
+        # A patched material may have been TOON_UNIF_ENV before
+        remove_toon_unif_env_camera_uvs(mat)
+        if has_emb_alpha:
+            role_index.ensure_link(emb_tex_node.outputs["Alpha"], shader_grp_node.inputs["EMB Alpha"])
+
+
+def commit_material_plan(material_plan, rows, tex_root):
+    """Create or patch the material for one MaterialPlan. Returns the material or None."""
+    primary_stub = material_plan.primary_stub
+    with stage("node build", primary_stub):
+        mat = create_xv2_material_enhanced(
+            material_name=primary_stub,
+            shader_type=material_plan.shader_type,
+            primary_stub=primary_stub,
+            rows=rows,
+            texture_folder=tex_root
+        )
+    if mat is None:
+        return None
+
+    with stage("image load", primary_stub):
+        images = {kind: load_resolved_texture(resolved) for kind, resolved in material_plan.textures.items()}
+        dyt_ramp, dual_ramp = load_planned_dyt_ramps(material_plan)
+        if dyt_ramp:
+            images["dyt"] = dyt_ramp
+    with stage("texture assign", primary_stub):
+        if material_plan.is_eye:
+            assign_eye_images(mat, images["000"], images["001"], images["dyt"])
+        else:
+            assign_xv2_images(mat, primary_stub, material_plan.shader_type,
+                              images["dyt"], images["000"], images["001"], images["002"])
+
+        if material_plan.dyt_path and mat.use_nodes and mat.node_tree:
+            dyt_node = get_role_index(mat.node_tree).node("dyt")
+            if dyt_node and dyt_node.image:
+                store_dyt_data_files(mat, material_plan.dyt_path, material_plan.data_files)
+
+    # This block is for the MAIN shader, not the EYE shader.
+    if not material_plan.is_eye:
+        with stage("node setup", primary_stub):
+            setup_dual_emb_color(mat, material_plan.shader_type, dual_ramp)
+            setup_dyt_line_attribute(mat, material_plan.dyt_line_attribute)
+            if material_plan.dyt_line is not None: set_dyt_line(mat, material_plan.dyt_line)
+            apply_toon_unif_env_state(mat, material_plan.shader_type == "TOON_UNIF_ENV", primary_stub)
+            specialize_main_group(mat, material_plan.specialize_shaders)
+    if dyt_ramp:
+        mat["xv2_dyt_ramp_row"] = material_plan.dyt_ramps[0][0]
+    elif "xv2_dyt_ramp_row" in mat:
+        del mat["xv2_dyt_ramp_row"]
+    mat["xv2_fingerprint"] = material_plan.fingerprint
+    return mat
+
+
+def assign_planned_slot(obj_name, slot_index, mat):
+    """Put mat into one planned slot. Returns True when the slot changed."""
+    obj = bpy.data.objects.get(obj_name)
+    if obj is None or slot_index >= len(obj.material_slots):
+        return False
+    slot = obj.material_slots[slot_index]
+    if slot.material is None and mat is None:
+        return False
+    if mat is None or slot.material is None or slot.material.name != mat.name:
+        slot.material = mat
+        return mat is not None
+    return False
+
+
+def remove_unused_original_materials(original_names, clones):
+    mats_to_remove = []
+    for name_orig in original_names:
+        if name_orig and strip_num(name_orig) not in clones:
+            mat_data = bpy.data.materials.get(name_orig)
+            if mat_data and mat_data.users == 0 and not mat_data.use_fake_user: mats_to_remove.append(mat_data)
+
+    if mats_to_remove:
+        log.info("Removing %s unused original materials:", len(mats_to_remove))
+        for m_rem in mats_to_remove: log.debug("  - '%s'", m_rem.name); remove_material(m_rem)
+
+
+def commit_plan_entry(plan, primary_stub, tex_root, force, clones, journal=None):
+    """Commit one planned material into clones. Returns True when it was up to date and skipped.
+
+    Materials whose stored fingerprint matches the plan are left alone unless force is set.
+    """
+    material_plan = plan.materials[primary_stub]
+    mat = bpy.data.materials.get(primary_stub)
+    with stage("up-to-date check", primary_stub):
+        skipped = not force and material_is_up_to_date(mat, material_plan)
+    if not skipped:
+        if journal is not None:
+            journal.record(primary_stub)
+        mat = commit_material_plan(material_plan, plan.rows, tex_root)
+    if mat is not None:
+        clones[primary_stub] = mat
+    return skipped
+
+
+def finish_apply_plan(plan, clones):
+    """Assign the committed materials to their slots and drop unused originals. Returns slots changed."""
+    slots_assigned = 0
+    with stage("slots + cleanup"):
+        for obj_name, slot_index, primary_stub in plan.slots:
+            if primary_stub is None:
+                assign_planned_slot(obj_name, slot_index, None)
+            elif primary_stub in clones and assign_planned_slot(obj_name, slot_index, clones[primary_stub]):
+                slots_assigned += 1
+
+        remove_unused_original_materials(plan.original_names, clones)
+    with stage("proxy textures"):
+        set_proxy_textures(clones.values(), plan.proxies)
+    with stage("image budget"):
+        enforce_image_budget()
+    return slots_assigned
+
+
+def commit_apply_plan(plan, tex_root, force=False):
+    """Perform all bpy writes for an ApplyPlan. Returns (clones, slots_assigned, skipped)."""
+    ensure_eye_node_groups()
+    clones = {}
+    skipped = 0
+    for primary_stub in plan.materials:
+        if commit_plan_entry(plan, primary_stub, tex_root, force, clones):
+            skipped += 1
+    return clones, finish_apply_plan(plan, clones), skipped
+
+
+def pending_cache_files(plan):
+    """Cache files an ApplyPlan refers to that are not generated yet (planned by a dry run)"""
+    paths = {resolved[1] for m in plan.materials.values() for resolved in m.textures.values()
+             if resolved and resolved[0] == "fixed"}
+    paths.update(plan.proxies.values())
+    paths.update(path for m in plan.materials.values() for _, path in m.dyt_ramps or () if path)
+    return sorted(path for path in paths if not os.path.isfile(path))
+
+
+def format_apply_plan(plan, force=False):
+    """Human readable dry-run report for an ApplyPlan"""
+    loads = sum(1 for m in plan.materials.values() for r in m.textures.values() if r and r[0] != "image")
+    pending = set(pending_cache_files(plan))
+    lines = [f"XV2 Apply dry run: {len(plan.materials)} shaders, {len(plan.slots)} material slots, "
+             f"{loads} textures to load" + (f", {len(plan.proxies)} viewport proxies" if plan.proxies else "")
+             + (f", {len(pending)} cache files to generate" if pending else ""), ""]
+    for material_plan in plan.materials.values():
+        existing = bpy.data.materials.get(material_plan.primary_stub)
+        if not existing:
+            action = "create"
+        elif not force and material_is_up_to_date(existing, material_plan):
+            action = "unchanged"
+        else:
+            action = "update"
+        lines.append(f"[{action}] {material_plan.primary_stub}  (from '{material_plan.original_name}')")
+        lines.append(f"    shader: {material_plan.shader_type or '(not in EMM)'}"
+                     f"  MatScale1X: {material_plan.mat_scale1x}"
+                     + (f"  DYT Line: {material_plan.dyt_line:.3f}" if material_plan.dyt_line is not None else "")
+                     + ("  (per object)" if material_plan.dyt_line_attribute else ""))
+        for kind, resolved in material_plan.textures.items():
+            if not resolved:
+                lines.append(f"    {kind}: NONE")
+            elif resolved[0] == "image":
+                lines.append(f"    {kind}: existing image '{resolved[1]}'")
+            elif resolved[0] == "fixed":
+                lines.append(f"    {kind}: fixed copy of {resolved[2]}"
+                             + ("  (to generate)" if resolved[1] in pending else ""))
+            else:
+                lines.append(f"    {kind}: load {resolved[1]}")
+            proxy = plan.proxies.get(cache_key(resolved[2])) if resolved and resolved[2] else None
+            if proxy:
+                lines.append(f"    {kind} proxy: {proxy}" + ("  (to generate)" if proxy in pending else ""))
+        if material_plan.dyt_ramps:
+            lines.append("    dyt ramps: rows " + ", ".join(f"{row:.3f}" for row, _ in material_plan.dyt_ramps)
+                         + ("  (to generate)" if any(path is None or path in pending
+                                                     for _, path in material_plan.dyt_ramps) else ""))
+        if material_plan.dyt_path:
+            lines.append(f"    DATA files: {len(material_plan.data_files)}")
+    lines.append("")
+    lines.append("Slots:")
+    for obj_name, slot_index, primary_stub in plan.slots:
+        lines.append(f"    {obj_name}[{slot_index}] -> {primary_stub or '(empty)'}")
+    return lines
+
+
+def write_text_report(name, lines):
+    """Replace the contents of Text datablock `name` with lines"""
+    text = bpy.data.texts.get(name) or bpy.data.texts.new(name)
+    text.clear()
+    text.write("\n".join(lines) + "\n")
+    return text
+
+
+def apply_target_objects(ctx):
+    """Selected meshes, or every mesh in the file when nothing is selected"""
+    return [o for o in ctx.selected_objects if o.type == 'MESH'] or [o for o in bpy.data.objects if
+                                                                     o.type == 'MESH']
+
+
+class XV2_OT_apply(Operator):
+    bl_idname = "xv2.apply_shader"
+    bl_label = "Apply/Update Shaders"
     bl_options = {'REGISTER', 'UNDO'}
 
+    dry_run: BoolProperty(
+        name="Dry Run",
+        description="Only plan: report which materials and textures Apply would touch, without changing anything",
+        default=False
+    )
+    force: BoolProperty(
+        name="Force",
+        description="Rebuild every material, even those whose inputs have not changed since the last Apply",
+        default=False
+    )
+
     def execute(self, ctx):
         prefs = ctx.preferences.addons[__name__].preferences
         if not prefs.emm_dir or not os.path.isdir(prefs.emm_dir): self.report({'WARNING'},
                                                                               "EMM folder not set/invalid.")
-        rows, shader_types = build_row_map(prefs.emm_dir)
-        ensure_eye_node_groups()  # ← ADDED THIS LINE
-        clones = {}
-        slots_assigned = 0
-        processed_original_material_names = set()
-        target_objects = [o for o in ctx.selected_objects if o.type == 'MESH'] or [o for o in bpy.data.objects if
-                                                                                   o.type == 'MESH']
+        target_objects = apply_target_objects(ctx)
         if not target_objects: self.report({'WARNING'}, "No mesh objects to process."); return {'CANCELLED'}
         action_msg = "selected" if ctx.selected_objects else "all scene"
-        print(f"[XV2] Processing {len(target_objects)} {action_msg} mesh object(s).")
+        log.info("Processing %s %s mesh object(s).", len(target_objects), action_msg)
 
-        for obj in target_objects:
-            if not obj.data or not obj.material_slots: continue
-            original_material_info = []
-            for i, slot in enumerate(obj.material_slots):
-                if slot.material:
-                    original_material_info.append((i, slot.material.name))
-                    processed_original_material_names.add(slot.material.name)
-                else:
-                    original_material_info.append((i, None))
+        timer = StageTimer() if prefs.time_apply_stages else None
+        profiler = cProfile.Profile() if prefs.profile_apply else None
+        set_stage_timer(timer)
+        if profiler: profiler.enable()
+        try:
+            plan = plan_apply_with_prefs(prefs, target_objects, self.dry_run)
+            if not self.dry_run:
+                clones, slots_assigned, skipped = commit_apply_plan(plan, prefs.tex_dir, self.force)
+        finally:
+            if profiler: profiler.disable()
+            set_stage_timer(None)
+
+        if self.dry_run:
+            lines = format_apply_plan(plan, self.force)
+            for line in lines: log.info("%s", line)
+            write_text_report("XV2 Apply Dry Run", lines)
+            message = (f"XV2 Dry Run: {len(plan.materials)} shaders planned. "
+                       f"See the 'XV2 Apply Dry Run' text.")
+        else:
+            message = (f"XV2: Processed. {slots_assigned} slots updated. {len(clones) - skipped} unique shaders "
+                       f"created/updated, {skipped} unchanged.")
+
+        if timer:
+            global _last_apply_timings
+            _last_apply_timings = timer.summary(prefs.timing_top_n)
+            for line in format_timing_summary(_last_apply_timings): log.info("%s", line)
+            slowest = ", ".join(f"{name} {seconds * 1000:.0f} ms"
+                                for name, seconds in _last_apply_timings["slowest_materials"])
+            message += f" ({_last_apply_timings['total']:.2f}s" + (f"; slowest: {slowest})" if slowest else ")")
+        if profiler:
+            prof_path = profile_output_path()
+            profiler.dump_stats(prof_path)
+            message += f" Profile saved to {prof_path}"
+        self.report({'INFO'}, message)
+        return {'FINISHED'}
+
+
+# --- MODAL APPLY ---
+# The modal Apply starts right away: plan_apply() runs on a worker thread (it never
+# touches bpy) while the timer polls for it, then the plan is committed a slice of
+# materials per tick. Esc, or an error while committing, rolls the journal back.
+# Between ticks the user can still delete or undo things, so nothing keeps references
+# to materials across ticks: the journal and the committed clones are kept by name.
+# The undo shortcuts are blocked while the modal runs. A rollback restores materials
+# only; images and node groups that existed before keep whatever Apply changed on them.
+
+
+MODAL_APPLY_SLICE = 0.25  # Seconds of material work per timer tick
+MODAL_APPLY_TIMER_STEP = 0.01
+MODAL_APPLY_UNDO_KEYS = {'Z', 'Y'}  # With Ctrl/Cmd: undo and redo
 
-            for slot_index, original_name in original_material_info:
-                if original_name is None:
-                    if slot_index < len(obj.material_slots): obj.material_slots[slot_index].material = None
-                    continue
-                primary_stub = strip_num(original_name)
-                cloned_mat = clones.get(primary_stub)
-                if cloned_mat is None:
-                    mat_scale1x = rows.get(primary_stub.lower())
-                    if mat_scale1x is None and "_" in primary_stub:
-                        parts = primary_stub.split('_')
-                        if len(parts) > 2 and parts[-2].isdigit():
-                            potential_base = "_".join(parts[:-2] + [parts[-1]])
-                            if potential_base.lower() in rows: mat_scale1x = rows[potential_base.lower()]
-
-                    shader_type_key = primary_stub.lower()
-                    if shader_type_key not in shader_types and original_name.lower() in shader_types:
-                        shader_type_key = original_name.lower()
-
-                    shader_type = shader_types.get(shader_type_key, "")
-
-                    # REPLACED material creation call
-                    cloned_mat = create_xv2_material_enhanced(
-                        material_name=primary_stub,
-                        shader_type=shader_type,
-                        primary_stub=primary_stub,
-                        rows=rows,
-                        texture_folder=prefs.tex_dir
-                    )
-                    if cloned_mat is None: continue
-
-                    # REPLACED image assignment call
-                    assign_images_enhanced_with_data_scan(cloned_mat, primary_stub, original_name, prefs.tex_dir, shader_type, mat_scale1x)
-
-                    # This block is for the MAIN shader, not the EYE shader.
-                    if not is_eye_shader(shader_type):
-                        setup_dual_emb_color(cloned_mat, shader_type)
-
-                        dyt_val = None
-                        if mat_scale1x is not None: dyt_val = (mat_scale1x + 1) * 0.1
-                        epsilon = 0.00001
-                        if dyt_val is not None:
-                            if dyt_val >= (0.6 - epsilon):
-                                original_dyt_for_log = dyt_val;
-                                dyt_val += 0.02
-                                print(
-                                    f"[XV2] Adjusting DYT Line for '{primary_stub}' (>=0.6 rule): {original_dyt_for_log:.3f} -> {dyt_val:.3f}")
-                        if dyt_val is not None: set_dyt_line(cloned_mat, dyt_val)
-
-                        is_toon_unif = shader_type == "TOON_UNIF_ENV"
-                        set_toon_unif_env_properties(cloned_mat, is_toon_unif)
-                        if is_toon_unif:
-                            emb_tex_node = cloned_mat.node_tree.nodes.get("Image Texture.001")
-                            shader_grp_node = cloned_mat.node_tree.nodes.get("Group")
-                            if emb_tex_node and shader_grp_node and "EMB Alpha" in shader_grp_node.inputs:
-                                emb_alpha_input = shader_grp_node.inputs["EMB Alpha"]
-                                for link in list(cloned_mat.node_tree.links):
-                                    if link.to_node == shader_grp_node and link.to_socket == emb_alpha_input and \
-                                            link.from_node == emb_tex_node and link.from_socket == emb_tex_node.outputs[
-                                        "Alpha"]:
-                                        cloned_mat.node_tree.links.remove(link)
-                                        print(
-                                            f"[XV2] Auto-disconnected EMB Alpha for TOON_UNIF_ENV material: '{primary_stub}'")
-                                        break
-                            setup_toon_unif_env_camera_uvs(cloned_mat)
-                            enhance_toon_unif_env_settings(cloned_mat)
-
-                    clones[primary_stub] = cloned_mat
-
-                if slot_index < len(obj.material_slots) and \
-                        (obj.material_slots[slot_index].material is None or obj.material_slots[
-                            slot_index].material.name != cloned_mat.name):
-                    obj.material_slots[slot_index].material = cloned_mat;
-                    slots_assigned += 1
-
-        mats_to_remove = []
-        for name_orig in processed_original_material_names:
-            if name_orig and strip_num(name_orig) not in clones:
-                mat_data = bpy.data.materials.get(name_orig)
-                if mat_data and mat_data.users == 0 and not mat_data.use_fake_user: mats_to_remove.append(mat_data)
-
-        if mats_to_remove:
-            print(f"[XV2] Removing {len(mats_to_remove)} unused original materials:")
-            for m_rem in mats_to_remove: print(f"  - '{m_rem.name}'"); bpy.data.materials.remove(m_rem)
 
+def _plan_apply_worker(args, result):
+    """Thread target of the modal Apply: appends plan_apply(*args), or the exception it raised"""
+    try:
+        result.append(plan_apply(*args))
+    except Exception as e:
+        result.append(e)
+
+
+class ApplyJournal:
+    """Undo log for the modal Apply, so Esc can put the file back the way it was"""
+
+    def __init__(self):
+        self.created = []  # Names of materials that did not exist before
+        self.backups = []  # (material name, untouched copy name) for materials that were rebuilt or patched
+        self.image_names = {img.name for img in bpy.data.images}
+        self.node_group_names = {ng.name for ng in bpy.data.node_groups}
+
+    def record(self, material_name):
+        mat = bpy.data.materials.get(material_name)
+        if mat is None:
+            self.created.append(material_name)
+        else:
+            backup = mat.copy()
+            backup.use_fake_user = False
+            self.backups.append((mat.name, backup.name))
+
+    def rollback(self):
+        for name in reversed(self.created):
+            mat = bpy.data.materials.get(name)
+            if mat:
+                remove_material(mat)
+        for name, backup_name in reversed(self.backups):
+            mat, backup = bpy.data.materials.get(name), bpy.data.materials.get(backup_name)
+            if backup is None:
+                log.warning("Cannot restore material '%s', its backup was removed", name)
+                continue
+            if mat is not None:
+                mat.user_remap(backup)
+                remove_material(mat)
+            backup.name = name
+        self.backups = []
+        invalidate_role_index()
+        for img in list(bpy.data.images):
+            if img.name not in self.image_names and img.users == 0:
+                bpy.data.images.remove(img)
+        for ng in list(bpy.data.node_groups):
+            if ng.name not in self.node_group_names and ng.users == 0:
+                bpy.data.node_groups.remove(ng)
+
+    def discard(self):
+        for _, backup_name in self.backups:
+            backup = bpy.data.materials.get(backup_name)
+            if backup is not None:
+                remove_material(backup)
+        self.backups = []
+
+
+class XV2_OT_apply_modal(Operator):
+    """Apply/Update Shaders a few materials at a time with progress. Esc cancels and restores the file"""
+    bl_idname = "xv2.apply_shader_modal"
+    bl_label = "Apply/Update Shaders (Cancellable)"
+    bl_description = ("Apply/Update Shaders a few materials at a time with progress. Esc cancels and restores the "
+                      "materials; images and node groups that existed before keep any changes")
+    bl_options = {'REGISTER', 'UNDO'}
+
+    force: BoolProperty(
+        name="Force",
+        description="Rebuild every material, even those whose inputs have not changed since the last Apply",
+        default=False
+    )
+
+    def execute(self, ctx):
+        return bpy.ops.xv2.apply_shader(force=self.force)
+
+    def invoke(self, ctx, event):
+        prefs = ctx.preferences.addons[__name__].preferences
+        if not prefs.emm_dir or not os.path.isdir(prefs.emm_dir): self.report({'WARNING'},
+                                                                              "EMM folder not set/invalid.")
+        target_objects = apply_target_objects(ctx)
+        if not target_objects: self.report({'WARNING'}, "No mesh objects to process."); return {'CANCELLED'}
+        log.info("Processing %s mesh object(s) in the background.", len(target_objects))
+
+        self._plan = None
+        self._plan_result = []
+        self._tex_dir = prefs.tex_dir
+        self._stubs = []
+        self._done = 0
+        self._skipped = 0
+        self._clone_names = {}  # primary stub -> committed material name
+        self._journal = None
+        addon_cache_dir()  # Resolve the cache folder here, the planning thread must not read prefs
+        threading.Thread(target=_plan_apply_worker, name="xv2-apply-plan", daemon=True,
+                         args=(plan_apply_args(prefs, target_objects), self._plan_result)).start()
+
+        wm = ctx.window_manager
+        wm.progress_begin(0, 1)
+        self._timer = wm.event_timer_add(MODAL_APPLY_TIMER_STEP, window=ctx.window)
+        wm.modal_handler_add(self)
+        self.update_status(ctx)
+        return {'RUNNING_MODAL'}
+
+    def modal(self, ctx, event):
+        if event.type == 'ESC':
+            if self._journal:
+                self._journal.rollback()
+            self.finish(ctx)
+            # A planning thread still running finishes on its own; its plan is dropped
+            self.report({'WARNING'}, f"XV2: Apply cancelled after {self._done}/{len(self._stubs)} shaders. "
+                                     f"All changes were rolled back.")
+            return {'CANCELLED'}
+        if event.type in MODAL_APPLY_UNDO_KEYS and (event.ctrl or event.oskey) and event.value == 'PRESS':
+            return {'RUNNING_MODAL'}
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}
+
+        try:
+            if self._plan is None:
+                return self.start_commit(ctx)
+
+            deadline = time.perf_counter() + MODAL_APPLY_SLICE
+            while self._done < len(self._stubs):
+                primary_stub, clones = self._stubs[self._done], {}
+                if commit_plan_entry(self._plan, primary_stub, self._tex_dir, self.force, clones, self._journal):
+                    self._skipped += 1
+                if primary_stub in clones:
+                    self._clone_names[primary_stub] = clones[primary_stub].name
+                self._done += 1
+                if time.perf_counter() >= deadline:
+                    break
+            ctx.window_manager.progress_update(self._done)
+            self.update_status(ctx)
+            if self._done < len(self._stubs):
+                return {'RUNNING_MODAL'}
+
+            clones = {}
+            for primary_stub, name in self._clone_names.items():
+                mat = bpy.data.materials.get(name)
+                if mat is not None:
+                    clones[primary_stub] = mat
+            slots_assigned = finish_apply_plan(self._plan, clones)
+            self._journal.discard()
+        except Exception as e:
+            log.exception("Modal Apply failed")
+            if self._journal:
+                self._journal.rollback()
+            self.finish(ctx)
+            self.report({'ERROR'}, f"XV2: Apply failed ({e}). All changes were rolled back.")
+            return {'CANCELLED'}
+
+        self.finish(ctx)
         self.report({'INFO'},
-                    f"XV2: Processed. {slots_assigned} slots updated. {len(clones)} unique shaders created/updated.")
+                    f"XV2: Processed. {slots_assigned} slots updated. {len(clones) - self._skipped} unique "
+                    f"shaders created/updated, {self._skipped} unchanged.")
         return {'FINISHED'}
 
+    def start_commit(self, ctx):
+        """Timer tick while planning: once the worker is done, set up committing its plan"""
+        if not self._plan_result:
+            return {'RUNNING_MODAL'}
+        result = self._plan_result[0]
+        if isinstance(result, Exception):
+            raise result
+        self._plan = result
+        self._stubs = list(self._plan.materials)
+        self._journal = ApplyJournal()
+        ensure_eye_node_groups()
+        wm = ctx.window_manager
+        wm.progress_end()
+        wm.progress_begin(0, max(len(self._stubs), 1))
+        self.update_status(ctx)
+        return {'RUNNING_MODAL'}
+
+    def update_status(self, ctx):
+        if self._plan is None:
+            ctx.workspace.status_text_set("XV2 Apply: planning...  (Esc to cancel)")
+        else:
+            ctx.workspace.status_text_set(f"XV2 Apply: {self._done}/{len(self._stubs)} shaders  (Esc to cancel)")
+
+    def finish(self, ctx):
+        wm = ctx.window_manager
+        wm.event_timer_remove(self._timer)
+        wm.progress_end()
+        ctx.workspace.status_text_set(None)
+
+
+def is_dyt_image(img):
+    fp_abs = bpy.path.abspath(img.filepath) if img.filepath else ""
+    name_on_disk_lower = os.path.basename(fp_abs).lower() if fp_abs else ""
+    return "_dyt" in name_on_disk_lower or "_dyt" in img.name.lower()
+
 
 def get_dyt_image_and_line_from_material(mat):
     if not mat or not mat.use_nodes or not mat.node_tree: return None, None
     dyt_img, dyt_line = None, None
-    for node in mat.node_tree.nodes:
-        if node.type == 'TEX_IMAGE' and node.image:
-            img = node.image;
-            fp_abs = bpy.path.abspath(img.filepath) if img.filepath else ""
-            name_on_disk_lower = os.path.basename(fp_abs).lower() if fp_abs else ""
-            name_in_blender_lower = img.name.lower()
-            if "_dyt" in name_on_disk_lower or "_dyt" in name_in_blender_lower:
-                is_main_dyt_tex = False
-                if node.name == "Image Texture.004":
-                    is_main_dyt_tex = True
-                else:
-                    main_shader_group = mat.node_tree.nodes.get("Group")
-                    if main_shader_group:
-                        for link in mat.node_tree.links:
-                            if link.from_node == node and link.to_node == main_shader_group and link.to_socket == main_shader_group.inputs.get(
-                                    "DYT"):
-                                is_main_dyt_tex = True;
-                                break
-                if is_main_dyt_tex: dyt_img = img; break
-    dyt_control_node = mat.node_tree.nodes.get("Group.002")
-    if dyt_control_node and dyt_control_node.type == 'GROUP' and dyt_control_node.node_tree and dyt_control_node.node_tree.name == "DYT Control [CAMERA BASED]" and "DYT Line" in dyt_control_node.inputs:
+    index = get_role_index(mat.node_tree)
+    # The main DYT texture is the DYT role node, or whatever feeds the main group's DYT input
+    candidates = [index.node("dyt")]
+    main_shader_group = index.node("main_group")
+    if main_shader_group and main_shader_group.inputs.get("DYT"):
+        dyt_link = index.incoming_link(main_shader_group.inputs["DYT"])
+        if dyt_link: candidates.append(dyt_link.from_node)
+    for node in candidates:
+        if node and node.type == 'TEX_IMAGE' and node.image and is_dyt_image(node.image):
+            dyt_img = node.image; break
+    dyt_control_node = index.node("dyt_control")
+    if index.node("dyt_line"):
+        dyt_line = index.node("dyt_line").inputs[1].default_value
+    elif dyt_control_node and dyt_control_node.type == 'GROUP' and dyt_control_node.node_tree and dyt_control_node.node_tree.name == "DYT Control [CAMERA BASED]" and "DYT Line" in dyt_control_node.inputs:
         dyt_line = dyt_control_node.inputs["DYT Line"].default_value
     else:
         for node in mat.node_tree.nodes:
@@ -2369,6 +4150,9 @@ class XV2_OT_copy_dyt_settings(Operator):
 
         # Get DYT settings
         dyt_img, dyt_line = get_dyt_image_and_line_from_material(first_mat)
+        if uses_dyt_line_attribute(first_mat) and active_obj.get(DYT_LINE_ATTRIBUTE):
+            dyt_line = active_obj[DYT_LINE_ATTRIBUTE]
+        dyt_img = full_dyt_image(dyt_img)
 
         if dyt_img is None or dyt_line is None:
             self.report({'WARNING'}, f"Material '{first_mat.name}' has no DYT setup.")
@@ -2421,11 +4205,13 @@ class XV2_OT_paste_dyt_settings(Operator):
                     continue
 
                 # Find DYT nodes
-                dyt_img_node = mat.node_tree.nodes.get("Image Texture.004")
-                dyt_ctrl_node = mat.node_tree.nodes.get("Group.002")
+                index = get_role_index(mat.node_tree)
+                dyt_img_node = index.node("dyt")
+                # Eye DYT lines follow their own scale, only the camera-based control takes pasted lines
+                dyt_ctrl_node = index.node("dyt_control") if index.layout == "xv2" else None
 
                 # Check if this looks like an XV2 material
-                main_group = mat.node_tree.nodes.get("Group")
+                main_group = index.node("main_group")
                 if not main_group or main_group.type != 'GROUP':
                     continue
 
@@ -2433,17 +4219,27 @@ class XV2_OT_paste_dyt_settings(Operator):
 
                 # Update DYT image
                 if dyt_img_node and dyt_img_node.type == 'TEX_IMAGE':
-                    dyt_img_node.image = _copied_dyt_image
+                    set_if_changed(dyt_img_node, "image", _copied_dyt_image)
                     success = True
 
-                # Update DYT line
-                if dyt_ctrl_node and dyt_ctrl_node.type == 'GROUP' and "DYT Line" in dyt_ctrl_node.inputs:
-                    dyt_ctrl_node.inputs["DYT Line"].default_value = _copied_dyt_line
+                # A pasted line needs the full DYT again, also in the dual color sampler
+                dual_sampler = index.node("dual_sampler")
+                if dual_sampler and dual_sampler.type == 'TEX_IMAGE' and dual_sampler.image:
+                    set_if_changed(dual_sampler, "image", full_dyt_image(dual_sampler.image))
+                if "xv2_dyt_ramp_row" in mat:
+                    del mat["xv2_dyt_ramp_row"]
+
+                # Update DYT line; per-object materials keep theirs and take it from the object
+                if index.node("dyt_line"):
+                    set_object_dyt_line(obj, _copied_dyt_line)
+                    success = True
+                elif dyt_ctrl_node and dyt_ctrl_node.type == 'GROUP' and "DYT Line" in dyt_ctrl_node.inputs:
+                    set_socket_default(dyt_ctrl_node.inputs["DYT Line"], _copied_dyt_line)
                     success = True
 
                 if success:
                     materials_updated += 1
-                    print(f"[XV2] Updated DYT settings for material: {mat.name}")
+                    log.debug("Updated DYT settings for material: %s", mat.name)
 
         if materials_updated > 0:
             self.report({'INFO'}, f"Applied DYT settings to {materials_updated} materials.")
@@ -2484,8 +4280,9 @@ class XV2_OT_disconnect_emb_alpha(Operator):
                     continue
 
                 # Find the main shader group and EMB texture node
-                main_shader_group = mat.node_tree.nodes.get("Group")
-                emb_texture_node = mat.node_tree.nodes.get("Image Texture.001")
+                index = get_role_index(mat.node_tree)
+                main_shader_group = index.node("main_group")
+                emb_texture_node = index.node("emb")
 
                 if not main_shader_group or main_shader_group.type != 'GROUP':
                     continue
@@ -2494,16 +4291,9 @@ class XV2_OT_disconnect_emb_alpha(Operator):
                     continue
 
                 # Find and remove the EMB Alpha connection
-                emb_alpha_input_socket = main_shader_group.inputs["EMB Alpha"]
-                for link in list(mat.node_tree.links):
-                    if (link.to_node == main_shader_group and
-                            link.to_socket == emb_alpha_input_socket and
-                            link.from_node == emb_texture_node and
-                            link.from_socket == emb_texture_node.outputs["Alpha"]):
-                        mat.node_tree.links.remove(link)
-                        print(f"[XV2] Disconnected EMB Alpha for material: '{mat.name}'")
-                        processed_count += 1
-                        break
+                if index.unlink(main_shader_group.inputs["EMB Alpha"], emb_texture_node.outputs["Alpha"]):
+                    log.debug("Disconnected EMB Alpha for material: '%s'", mat.name)
+                    processed_count += 1
 
         if processed_count > 0:
             self.report({'INFO'}, f"Disconnected EMB Alpha for {processed_count} materials.")
@@ -2529,7 +4319,33 @@ class XV2_PT_Main(Panel):
         col_actions = box_actions.column(align=True);
         col_actions.label(text="Main Actions:", icon='PLAY');
         col_actions.operator("xv2.apply_shader", text="Apply/Update Shaders", icon='SHADING_TEXTURE');
+        col_actions.operator("xv2.apply_shader_modal", text="Apply in Background (Esc to Cancel)", icon='TIME')
+        col_actions.operator("xv2.apply_shader", text="Force Rebuild All", icon='FILE_REFRESH').force = True
+        col_actions.operator("xv2.apply_shader", text="Dry Run (Report Only)", icon='VIEWZOOM').dry_run = True
+        col_actions.operator("xv2.memory_estimate", text="Estimate Texture Memory", icon='MEMORY')
         col_actions.label(text="(If nothing selected, applies to all meshes)")
+        if _last_apply_timings:
+            box_timings = layout.box()
+            col_timings = box_timings.column(align=True)
+            col_timings.label(text=f"Last Apply: {_last_apply_timings['total'] * 1000:.0f} ms", icon='TIME')
+            for name, seconds in _last_apply_timings["stages"][:6]:
+                col_timings.label(text=f"  {name}: {seconds * 1000:.1f} ms")
+            if _last_apply_timings["slowest_materials"]:
+                col_timings.label(text="Slowest materials:")
+                for name, seconds in _last_apply_timings["slowest_materials"]:
+                    col_timings.label(text=f"  {name}: {seconds * 1000:.1f} ms")
+        if _log_buffer in log.handlers:
+            box_log = layout.box()
+            row_log = box_log.row()
+            row_log.label(text=f"Log ({logging.getLevelName(log.level).title()}):", icon='TEXT')
+            row_log.operator("xv2.clear_log", text="", icon='TRASH')
+            col_log = box_log.column(align=True)
+            shown = prefs.log_sidebar_lines
+            records = list(_log_buffer.records)[-shown:]
+            for levelname, message in records:
+                col_log.label(text=message, icon=LOG_LEVEL_ICONS.get(levelname, 'INFO'))
+            if not records:
+                col_log.label(text="(No messages yet)")
         box_notes = layout.box();
         col_notes = box_notes.column(align=True);
         col_notes.label(text="Info & Credits:", icon='INFO');
@@ -2537,75 +4353,1383 @@ class XV2_PT_Main(Panel):
         col_notes.label(text="- Addon automation by Imxiater.")
 
 
+# --- DDS HEADERS ---
+# Every piece of code that looks at a DDS header (DYT fix, folder scan, decoding,
+# memory estimates) goes through DDSHeader instead of slicing bytes itself.
+
+
+DDS_HEADER_SIZE = 128
+DDS_DX10_HEADER_SIZE = 20
+DDSD_MIPMAPCOUNT = 0x20000
+DDSD_LINEARSIZE = 0x80000
+DDPF_FOURCC = 0x4
+DXT1_FIXED_FLAGS = 0x00001007  # CAPS | HEIGHT | WIDTH | PIXELFORMAT, as the game's working DYTs have
+BC_FOURCC_FORMATS = {b"DXT1": "BC1", b"DXT5": "BC3", b"ATI1": "BC4", b"BC4U": "BC4", b"ATI2": "BC5",
+                     b"BC5U": "BC5"}
+BC_DXGI_FORMATS = {70: "BC1", 71: "BC1", 72: "BC1", 76: "BC3", 77: "BC3", 78: "BC3", 79: "BC4", 80: "BC4",
+                   82: "BC5", 83: "BC5"}
+BC_BLOCK_SIZES = {"BC1": 8, "BC3": 16, "BC4": 8, "BC5": 16}
+
+
+def dds_mip_size(fmt, width, height, mip):
+    """(width, height, byte size) of one mip level"""
+    mip_width, mip_height = max(1, width >> mip), max(1, height >> mip)
+    return mip_width, mip_height, ((mip_width + 3) // 4) * ((mip_height + 3) // 4) * BC_BLOCK_SIZES[fmt]
+
+
+class DDSHeader:
+    """The fields of a DDS header (and DX10 extension) that the addon uses.
+
+    parse() unpacks straight from any buffer (bytes, bytearray, memoryview, mmap) and only
+    raises ValueError when the data is not a DDS header at all; everything else is
+    reported by problems(). format is "BC1".."BC5" or None for formats we cannot decode.
+    """
+    __slots__ = ("header_size", "flags", "height", "width", "pitch_or_linear_size", "depth", "mip_count",
+                 "pf_size", "pf_flags", "fourcc", "rgb_bit_count", "caps", "dxgi_format", "data_offset",
+                 "format")
+
+    @classmethod
+    def parse(cls, buffer):
+        if len(buffer) < DDS_HEADER_SIZE or bytes(buffer[0:4]) != b"DDS ":
+            raise ValueError("not a DDS file")
+        self = cls()
+        (self.header_size, self.flags, self.height, self.width, self.pitch_or_linear_size, self.depth,
+         self.mip_count) = struct.unpack_from("<7I", buffer, 4)
+        self.pf_size, self.pf_flags = struct.unpack_from("<2I", buffer, 76)
+        self.fourcc = bytes(buffer[84:88])
+        self.rgb_bit_count = struct.unpack_from("<I", buffer, 88)[0]
+        self.caps = struct.unpack_from("<I", buffer, 108)[0]
+        self.dxgi_format = None
+        self.data_offset = DDS_HEADER_SIZE
+        if self.fourcc == b"DX10":
+            if len(buffer) < DDS_HEADER_SIZE + DDS_DX10_HEADER_SIZE:
+                raise ValueError("truncated DX10 header")
+            self.dxgi_format = struct.unpack_from("<I", buffer, DDS_HEADER_SIZE)[0]
+            self.data_offset += DDS_DX10_HEADER_SIZE
+            self.format = BC_DXGI_FORMATS.get(self.dxgi_format)
+        else:
+            self.format = BC_FOURCC_FORMATS.get(self.fourcc)
+        return self
+
+    @classmethod
+    def read(cls, filepath):
+        with open(filepath, "rb") as f:
+            return cls.parse(f.read(DDS_HEADER_SIZE + DDS_DX10_HEADER_SIZE))
+
+    @property
+    def mip_levels(self):
+        return max(1, self.mip_count)
+
+    @property
+    def max_mip_levels(self):
+        return max(self.width, self.height, 1).bit_length()
+
+    def mip_size(self, mip):
+        """(width, height, byte size) of one mip level; only for BCn formats"""
+        return dds_mip_size(self.format, self.width, self.height, mip)
+
+    def mip_offset(self, mip):
+        return self.data_offset + sum(self.mip_size(level)[2] for level in range(mip))
+
+    def payload_size(self, mips=None):
+        """Bytes of pixel data for the first mips levels (default: all the header claims)"""
+        return sum(self.mip_size(level)[2] for level in range(self.mip_levels if mips is None else mips))
+
+    @property
+    def fix(self):
+        """Name of the fix this header needs, or None"""
+        if self.fourcc == b"DXT1" and not (self.flags == DXT1_FIXED_FLAGS and self.mip_count == 0):
+            return "dxt1_header"
+        return None
+
+    def problems(self, file_size=None):
+        """Inconsistencies worth reporting, as short sentences"""
+        problems = []
+        if self.header_size != 124:
+            problems.append(f"header size {self.header_size}, expected 124")
+        if self.pf_size != 32:
+            problems.append(f"pixel format size {self.pf_size}, expected 32")
+        if not self.width or not self.height:
+            problems.append("zero width or height")
+            return problems
+        if self.mip_count > self.max_mip_levels:
+            problems.append(f"{self.mip_count} mips claimed, at most {self.max_mip_levels} possible")
+        if self.mip_count > 1 and not self.flags & DDSD_MIPMAPCOUNT:
+            problems.append("mip count set without the MIPMAPCOUNT flag")
+        if self.fix:
+            problems.append("DXT1 header flags / mip count the game accepts but Blender does not")
+        if self.format:
+            if self.flags & DDSD_LINEARSIZE and self.pitch_or_linear_size not in (0, self.mip_size(0)[2]):
+                problems.append(f"linear size {self.pitch_or_linear_size}, expected {self.mip_size(0)[2]}")
+            if file_size is not None and file_size < self.data_offset + self.mip_size(0)[2]:
+                problems.append(f"file is {file_size} bytes, top mip needs {self.data_offset + self.mip_size(0)[2]}")
+            elif (file_size is not None and self.mip_count > 1 and self.mip_count <= self.max_mip_levels
+                  and file_size < self.data_offset + self.payload_size()):
+                problems.append(f"file is too short for the {self.mip_count} mips it claims")
+        return problems
+
+    @staticmethod
+    def write_dxt1_fix(buffer):
+        """Rewrite a DXT1 header in a writable buffer so Blender accepts it"""
+        struct.pack_into("<I", buffer, 8, DXT1_FIXED_FLAGS)
+        struct.pack_into("<I", buffer, 20, 0)
+        struct.pack_into("<I", buffer, 28, 0)
+        struct.pack_into("<I", buffer, 88, 0)
+
+
+# --- DDS DECODING ---
+# NumPy decoder for the block-compressed DDS formats the game uses, so textures can be
+# inspected without creating (and decoding) a Blender image. All blocks of a mip are
+# decoded at once; the output is float RGBA in image.pixels order (bottom row first).
+# BC4 decodes to grey, BC5 to (R, G, 0).
+
+
+def image_source_path(image):
+    """Absolute path of the file an image was loaded from, or None (packed, generated, missing)"""
+    if getattr(image, "packed_file", None) or not image.filepath:
+        return None
+    path = bpy.path.abspath(image.filepath)
+    return path if os.path.isfile(path) else None
+
+
+def dds_source_path(image):
+    """image_source_path() for DDS files only"""
+    path = image_source_path(image)
+    return path if path and path.lower().endswith(".dds") else None
+
+
+def read_bc_dds_header(filepath):
+    """DDSHeader of a BCn DDS we can decode. ValueError for anything else."""
+    header = DDSHeader.read(filepath)
+    if header.format is None:
+        raise ValueError(f"unsupported DDS format {header.fourcc!r}")
+    if not header.width or not header.height:
+        raise ValueError("empty DDS")
+    return header
+
+
+def dds_mip_for_size(width, height, mip_count, min_size):
+    """Smallest mip level whose shorter side is still at least min_size (or the top mip)"""
+    mip = 0
+    while mip + 1 < mip_count and min(width >> (mip + 1), height >> (mip + 1)) >= min_size:
+        mip += 1
+    return mip
+
+
+def _expand_565(colors):
+    r, g, b = (colors >> 11) & 31, (colors >> 5) & 63, colors & 31
+    return np.stack([(r << 3) | (r >> 2), (g << 2) | (g >> 4), (b << 3) | (b >> 2)], axis=-1)
+
+
+def decode_bc1_blocks(blocks, four_color_only=False):
+    """(N, 16, 4) uint8 RGBA texels for (N, 8) BC1 colour blocks.
+
+    four_color_only is for the colour half of BC3 blocks, which never use the
+    three-colour + transparent mode.
+    """
+    endpoints = np.ascontiguousarray(blocks[:, 0:4]).view("<u2").astype(np.int32)
+    c0, c1 = endpoints[:, 0], endpoints[:, 1]
+    p0, p1 = _expand_565(c0), _expand_565(c1)
+    four = np.ones_like(c0, dtype=bool) if four_color_only else c0 > c1
+    p2 = np.where(four[:, None], (2 * p0 + p1) // 3, (p0 + p1) // 2)
+    p3 = np.where(four[:, None], (p0 + 2 * p1) // 3, 0)
+    alpha = np.full((len(blocks), 4, 1), 255, dtype=np.int32)
+    alpha[:, 3, 0] = np.where(four, 255, 0)
+    palette = np.concatenate([np.stack([p0, p1, p2, p3], axis=1), alpha], axis=2).astype(np.uint8)
+    bits = np.ascontiguousarray(blocks[:, 4:8]).view("<u4")[:, 0]
+    indices = (bits[:, None] >> (2 * np.arange(16, dtype=np.uint32))) & 3
+    return np.take_along_axis(palette, indices[..., None].astype(np.intp), axis=1)
+
+
+def decode_bc4_blocks(blocks):
+    """(N, 16) uint8 values for (N, 8) BC4 / BC3-alpha blocks"""
+    a0, a1 = blocks[:, 0].astype(np.int32)[:, None], blocks[:, 1].astype(np.int32)[:, None]
+    k6, k4 = np.arange(1, 7), np.arange(1, 5)
+    six = ((7 - k6) * a0 + k6 * a1) // 7
+    four = np.concatenate([((5 - k4) * a0 + k4 * a1) // 5, np.zeros_like(a0), np.full_like(a0, 255)], axis=1)
+    palette = np.concatenate([a0, a1, np.where(a0 > a1, six, four)], axis=1).astype(np.uint8)
+    bits = np.zeros(len(blocks), dtype=np.uint64)
+    for i in range(6):
+        bits |= blocks[:, 2 + i].astype(np.uint64) << np.uint64(8 * i)
+    indices = (bits[:, None] >> (np.uint64(3) * np.arange(16, dtype=np.uint64))) & np.uint64(7)
+    return np.take_along_axis(palette, indices.astype(np.intp), axis=1)
+
+
+def decode_bc_blocks(fmt, data):
+    """(N, 16, 4) uint8 RGBA texels for the raw block bytes of one mip"""
+    blocks = np.frombuffer(data, dtype=np.uint8).reshape(-1, BC_BLOCK_SIZES[fmt])
+    if fmt == "BC1":
+        return decode_bc1_blocks(blocks)
+    if fmt == "BC3":
+        texels = decode_bc1_blocks(blocks[:, 8:], four_color_only=True)
+        texels[..., 3] = decode_bc4_blocks(blocks[:, :8])
+        return texels
+    texels = np.empty((len(blocks), 16, 4), dtype=np.uint8)
+    texels[..., 3] = 255
+    if fmt == "BC4":
+        texels[..., :3] = decode_bc4_blocks(blocks)[..., None]
+    else:
+        texels[..., 0] = decode_bc4_blocks(blocks[:, :8])
+        texels[..., 1] = decode_bc4_blocks(blocks[:, 8:])
+        texels[..., 2] = 0
+    return texels
+
+
+def decode_dds_pixels(filepath, mip=0, bottom_rows=None):
+    """Decode one mip of a BCn DDS to (width, height, float32 (rows, width, 4) RGBA).
+
+    Rows come bottom first like image.pixels. bottom_rows limits decoding (and reading)
+    to the block rows covering that many bottom rows.
+    """
+    header = read_bc_dds_header(filepath)
+    if not 0 <= mip < header.mip_levels:
+        raise ValueError(f"mip {mip} out of range ({header.mip_levels} levels)")
+    fmt, offset = header.format, header.mip_offset(mip)
+    width, height, size = header.mip_size(mip)
+    blocks_w, blocks_h = (width + 3) // 4, (height + 3) // 4
+    row_bytes = blocks_w * BC_BLOCK_SIZES[fmt]
+    first_block_row = 0
+    if bottom_rows is not None:
+        # The file stores the top row first, so the bottom rows are at the end of the mip
+        first_block_row = max(0, height - bottom_rows) // 4
+    with open(filepath, "rb") as f:
+        f.seek(offset + first_block_row * row_bytes)
+        data = f.read(size - first_block_row * row_bytes)
+    if len(data) < size - first_block_row * row_bytes:
+        raise ValueError(f"truncated DDS data for mip {mip}")
+    read_rows = blocks_h - first_block_row
+    texels = decode_bc_blocks(fmt, data)
+    image = texels.reshape(read_rows, blocks_w, 4, 4, 4).transpose(0, 2, 1, 3, 4)
+    image = image.reshape(read_rows * 4, blocks_w * 4, 4)
+    top = 0 if bottom_rows is None else max(0, height - bottom_rows) - first_block_row * 4
+    image = image[top:height - first_block_row * 4, :width]
+    return width, height, image[::-1].astype(np.float32) / 255.0
+
+
+# --- DISK CACHES ---
+# Results that only depend on file contents survive between sessions as versioned JSON
+# files in the cache folder, keyed by absolute path and validated by size and mtime.
+# Eye mask classifications live in mask_analysis.json; bump MASK_ANALYZER_VERSION
+# whenever analyze_mask_type or the push table changes.
+
+
+MASK_ANALYZER_VERSION = 2
+MASK_CACHE_FILE = "mask_analysis.json"
+_mask_analysis_cache = None
+_cache_dir = None  # Last folder addon_cache_dir() resolved on the main thread
+
+
+def addon_cache_dir():
+    """The cache folder preference, or the addon's folder under Blender's user datafiles.
+
+    Worker threads must not read bpy; they get the folder last resolved on the main thread.
+    """
+    global _cache_dir
+    if _cache_dir and threading.current_thread() is not threading.main_thread():
+        return _cache_dir
+    prefs = addon_preferences()
+    if prefs and prefs.cache_dir:
+        folder = bpy.path.abspath(prefs.cache_dir)
+    else:
+        folder = bpy.utils.user_resource('DATAFILES', path="xv2autoshader", create=True)
+    os.makedirs(folder, exist_ok=True)
+    _cache_dir = folder
+    return folder
+
+
+def file_signature(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def cache_key(path):
+    return os.path.normcase(os.path.abspath(path))
+
+
+def load_json_cache(filename, version):
+    """Entries of a JSON cache file in the cache folder; {} if it is missing or from another version"""
+    try:
+        with open(os.path.join(addon_cache_dir(), filename), encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") == version:
+            return data.get("entries", {})
+    except (OSError, ValueError, AttributeError):
+        pass
+    return {}
+
+
+def save_json_cache(filename, version, entries):
+    path = os.path.join(addon_cache_dir(), filename)
+    try:
+        write_json(path + ".tmp", {"version": version, "entries": entries})
+        os.replace(path + ".tmp", path)
+    except OSError as e:
+        log.warning("Could not save cache '%s': %s", path, e)
+
+
+def load_mask_analysis_cache():
+    global _mask_analysis_cache
+    if _mask_analysis_cache is None:
+        _mask_analysis_cache = load_json_cache(MASK_CACHE_FILE, MASK_ANALYZER_VERSION)
+    return _mask_analysis_cache
+
+
+def save_mask_analysis_cache():
+    if _mask_analysis_cache is not None:
+        save_json_cache(MASK_CACHE_FILE, MASK_ANALYZER_VERSION, _mask_analysis_cache)
+
+
+def mask_cache_key(path, mode):
+    return f"{cache_key(path)}|{mode}"
+
+
+def lookup_mask_analysis(path, mode):
+    entry = load_mask_analysis_cache().get(mask_cache_key(path, mode))
+    if entry and entry.get("signature") == file_signature(path):
+        return entry
+    return None
+
+
+def store_mask_analysis(path, mode, mask_type, pushes):
+    signature = file_signature(path)
+    if signature is None:
+        return
+    load_mask_analysis_cache()[mask_cache_key(path, mode)] = {"signature": signature, "mask_type": mask_type,
+                                                              "pushes": pushes}
+    save_mask_analysis_cache()
+
+
+def clear_mask_analysis_cache():
+    global _mask_analysis_cache
+    _mask_analysis_cache = {}
+    try:
+        os.remove(os.path.join(addon_cache_dir(), MASK_CACHE_FILE))
+    except OSError:
+        pass
+
+
+class XV2_OT_clear_mask_cache(Operator):
+    bl_idname = "xv2.clear_mask_cache"
+    bl_label = "Clear Mask Analysis Cache"
+    bl_description = "Forget cached eye mask classifications so they are analyzed again"
+
+    def execute(self, context):
+        clear_mask_analysis_cache()
+        self.report({'INFO'}, "XV2: Mask analysis cache cleared.")
+        return {'FINISHED'}
+
+
 def is_likely_broken_dxt1_dds(filepath):
     try:
-        with open(filepath, "rb") as f:
-            header = f.read(128)
-        if len(header) < 128 or header[0:4] != b"DDS ": return False
-        if header[84:88] != b"DXT1": return False
-        flags = struct.unpack_from("<I", header, 8)[0];
-        mipcount = struct.unpack_from("<I", header, 28)[0]
-        return not (flags == 0x00001007 and mipcount == 0)
+        return DDSHeader.read(filepath).fix == "dxt1_header"
+    except ValueError:
+        return False
     except Exception as e:
-        print(f"[XV2][DYT Fix] Error checking DDS header for '{filepath}': {e}");
+        fix_log.warning("Error checking DDS header for '%s': %s", filepath, e);
         return False
 
 
-def patch_dxt1_header_to_bytes(original_bytes):
-    if len(original_bytes) < 128 or original_bytes[0:4] != b"DDS ": return original_bytes
-    header = bytearray(original_bytes[:128])
-    struct.pack_into("<I", header, 8, 0x00001007);
-    struct.pack_into("<I", header, 20, 0);
-    struct.pack_into("<I", header, 28, 0);
-    struct.pack_into("<I", header, 88, 0)
-    return bytes(header) + original_bytes[128:]
+def patch_dxt1_header(buffer):
+    """Rewrite the DXT1 header of a DDS held in a writable buffer, in place.
+
+    Returns True if any header byte changed. The payload is never touched or copied.
+    """
+    view = memoryview(buffer)
+    if len(view) < DDS_HEADER_SIZE or view[0:4] != b"DDS ": return False
+    original_header = bytes(view[:DDS_HEADER_SIZE])
+    DDSHeader.write_dxt1_fix(view)
+    return view[:DDS_HEADER_SIZE] != original_header
+
+
+def read_file_into_buffer(path):
+    """Whole file as a bytearray, read straight into a preallocated buffer"""
+    with open(path, "rb") as f:
+        buffer = bytearray(os.fstat(f.fileno()).st_size)
+        read = f.readinto(buffer)
+    return buffer if read == len(buffer) else buffer[:read]
+
 
+class ImageNameAllocator:
+    """Hands out free image names from one snapshot of bpy.data.images.
 
-def create_fixed_image_from_path(original_path, new_name_base):
+    Each base name remembers the next numeric suffix to try, so fixing many images
+    does not probe bpy.data.images candidate by candidate.
+    """
+
+    def __init__(self):
+        self.taken = {img.name for img in bpy.data.images}
+        self.next_suffix = {}
+
+    def allocate(self, base):
+        counter = self.next_suffix.get(base, 0)
+        name = base if counter == 0 else f"{base}.{counter:03d}"
+        while name in self.taken or (counter == 0 and f"{base}.000" in self.taken):
+            counter += 1
+            name = f"{base}.{counter:03d}"
+        self.next_suffix[base] = counter + 1
+        self.taken.add(name)
+        return name
+
+
+def create_fixed_image_from_path(original_path, new_name_base, names=None):
+    """Packed image holding a header-fixed copy of original_path, or None if it needs no fix"""
     try:
-        with open(original_path, "rb") as f:
-            data = f.read()
-        patched_data = patch_dxt1_header_to_bytes(data)
-        if patched_data == data: return None
-        new_blender_image_name = bpy.path.display_name_from_filepath(new_name_base);
-        final_name = new_blender_image_name;
-        counter = 0
-        while bpy.data.images.get(final_name) or bpy.data.images.get(
-                f"{final_name}.000"): counter += 1; final_name = f"{new_blender_image_name}.{str(counter).zfill(3)}"
-        tmp_file_path = ""
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".dds") as tmp_f:
-            tmp_file_path = tmp_f.name;
-            tmp_f.write(patched_data)
-        img = None
-        try:
-            img = bpy.data.images.load(tmp_file_path, check_existing=False);
-            img.name = final_name;
-            img.pack();
-            img.filepath = "";
-            img.filepath_raw = ""
-        finally:
-            if os.path.exists(tmp_file_path):
-                try:
-                    os.remove(tmp_file_path)
-                except PermissionError:
-                    print(f"[XV2][DYT Fix] Warning: Could not delete temp file '{tmp_file_path}' (permission error).")
-                except Exception as e_del:
-                    print(f"[XV2][DYT Fix] Warning: Could not delete temp file '{tmp_file_path}': {e_del}")
+        data = read_file_into_buffer(original_path)
+        if not patch_dxt1_header(data): return None
+        final_name = (names or ImageNameAllocator()).allocate(bpy.path.display_name_from_filepath(new_name_base))
+        # Blender decodes packed data by content, so the fixed bytes never hit the disk
+        img = bpy.data.images.new(final_name, 8, 8)
+        img.pack(data=bytes(data), data_len=len(data))
+        img.source = 'FILE'
+        img.filepath_raw = ""
+        img["xv2_fixed_from"] = original_path
         return img
     except Exception as e_read:
-        print(f"[XV2][DYT Fix] Failed to read/process image '{original_path}': {e_read}");
+        fix_log.warning("Failed to read/process image '%s': %s", original_path, e_read);
+        return None
+
+
+# --- FIXED DDS CACHE ---
+# In CACHE mode the DYT fix writes each fixed file once to <cache dir>/fixed_dds/<sha1>.dds,
+# named by the hash of the original bytes, and images reference that file instead of
+# packing a copy into every .blend. fixed_dds_index.json maps original path + size/mtime
+# to the hash (or None when the file needs no fix), so known files are not read again.
+
+
+FIXED_DDS_DIR = "fixed_dds"
+FIXED_DDS_INDEX_FILE = "fixed_dds_index.json"
+FIXED_DDS_INDEX_VERSION = 1
+_fixed_dds_index = None
+_fixed_dds_index_dirty = False
+
+
+def load_fixed_dds_index():
+    global _fixed_dds_index
+    if _fixed_dds_index is None:
+        _fixed_dds_index = load_json_cache(FIXED_DDS_INDEX_FILE, FIXED_DDS_INDEX_VERSION)
+    return _fixed_dds_index
+
+
+def save_fixed_dds_index():
+    global _fixed_dds_index_dirty
+    if _fixed_dds_index_dirty:
+        save_json_cache(FIXED_DDS_INDEX_FILE, FIXED_DDS_INDEX_VERSION, _fixed_dds_index)
+        _fixed_dds_index_dirty = False
+
+
+def fixed_dds_cache_path(original_path, create=True):
+    """Path of the cached fixed copy of original_path, or None if it needs no fix. Raises OSError.
+
+    Without create nothing is written: the path is where the copy would go.
+    """
+    global _fixed_dds_index_dirty
+    index = load_fixed_dds_index()
+    key = cache_key(original_path)
+    signature = file_signature(original_path)
+    fixed_dir = os.path.join(addon_cache_dir(), FIXED_DDS_DIR)
+    entry = index.get(key)
+    if entry and entry["signature"] == signature:
+        if entry["sha1"] is None:
+            return None
+        cached_path = os.path.join(fixed_dir, entry["sha1"] + ".dds")
+        if os.path.isfile(cached_path):
+            return cached_path
+
+    digest = None
+    if is_likely_broken_dxt1_dds(original_path):
+        data = read_file_into_buffer(original_path)
+        digest = hashlib.sha1(data).hexdigest()
+        cached_path = os.path.join(fixed_dir, digest + ".dds")
+        if not os.path.isfile(cached_path):
+            if not patch_dxt1_header(data):
+                digest = None
+            elif create:
+                os.makedirs(fixed_dir, exist_ok=True)
+                with open(cached_path + ".tmp", "wb") as f:
+                    f.write(data)
+                os.replace(cached_path + ".tmp", cached_path)
+    if create:
+        index[key] = {"signature": signature, "sha1": digest}
+        _fixed_dds_index_dirty = True
+    return cached_path if digest else None
+
+
+def load_fixed_image(fixed_path, original_path, new_name_base, names):
+    """Image for a cached fixed DDS, reusing one that already points at it"""
+    img = load_image_deduplicated(fixed_path)
+    if img.name not in names.taken:
+        img.name = names.allocate(bpy.path.display_name_from_filepath(new_name_base))
+        img["xv2_fixed_from"] = original_path
+    return track_image(img, fixed_path)
+
+
+def clear_fixed_dds_cache():
+    global _fixed_dds_index, _fixed_dds_index_dirty
+    _fixed_dds_index, _fixed_dds_index_dirty = {}, False
+    shutil.rmtree(os.path.join(addon_cache_dir(), FIXED_DDS_DIR), ignore_errors=True)
+    try:
+        os.remove(os.path.join(addon_cache_dir(), FIXED_DDS_INDEX_FILE))
+    except OSError:
+        pass
+
+
+# --- DDS HEADER SCAN ---
+# Reads only the 128-byte header of every DDS under the texture folder, on a thread
+# pool, and keeps the classification in dds_header_scan.json. Files whose size and
+# mtime did not change keep their previous result without being opened. Apply uses
+# the report to swap known-broken DXT1 files for their cached fixed copies.
+
+
+DDS_SCAN_FILE = "dds_header_scan.json"
+DDS_SCAN_VERSION = 1
+DDS_SCAN_WORKERS = 8
+DDS_SCAN_STATUSES = ("ok", "broken_dxt1", "truncated", "not_dds")
+_dds_scan_cache = None
+
+
+def classify_dds_header(data, file_size):
+    """One of DDS_SCAN_STATUSES for the start of a DDS file and the file's size"""
+    try:
+        header = DDSHeader.parse(data)
+    except ValueError:
+        return "not_dds"
+    if header.fix == "dxt1_header":
+        return "broken_dxt1"
+    if header.format and header.width and header.height and file_size < header.data_offset + header.mip_size(0)[2]:
+        return "truncated"
+    return "ok"
+
+
+def scan_dds_file(path, previous):
+    """Scan entry for one file; reuses previous when size and mtime match. Runs on worker threads."""
+    signature = file_signature(path)
+    if previous and previous["signature"] == signature:
+        return previous
+    try:
+        with open(path, "rb") as f:
+            data = f.read(DDS_HEADER_SIZE + DDS_DX10_HEADER_SIZE)
+        status = classify_dds_header(data, signature[0] if signature else 0)
+    except OSError:
+        status = "not_dds"
+    return {"path": path, "signature": signature, "status": status}
+
+
+def load_dds_scan_cache():
+    global _dds_scan_cache
+    if _dds_scan_cache is None:
+        _dds_scan_cache = load_json_cache(DDS_SCAN_FILE, DDS_SCAN_VERSION)
+    return _dds_scan_cache
+
+
+def scan_dds_headers(tex_dir):
+    """Scan every .dds under tex_dir, store the report and return {file key: entry}"""
+    index = get_texture_index(tex_dir)
+    if index is None:
+        return {}
+    reports = load_dds_scan_cache()
+    previous = reports.get(cache_key(tex_dir), {})
+    paths = [path for _, _, path in index.entries if path.lower().endswith(".dds")]
+    with ThreadPoolExecutor(max_workers=DDS_SCAN_WORKERS) as pool:
+        entries = list(pool.map(lambda path: scan_dds_file(path, previous.get(cache_key(path))), paths))
+    report = {cache_key(entry["path"]): entry for entry in entries}
+    reports[cache_key(tex_dir)] = report
+    save_json_cache(DDS_SCAN_FILE, DDS_SCAN_VERSION, reports)
+    return report
+
+
+def known_broken_dds(tex_dir):
+    """File keys the last scan of tex_dir found broken, without scanning again"""
+    if not tex_dir:
+        return set()
+    report = load_dds_scan_cache().get(cache_key(tex_dir), {})
+    return {key for key, entry in report.items() if entry["status"] == "broken_dxt1"}
+
+
+def format_dds_scan_report(tex_dir, report):
+    counts = {status: 0 for status in DDS_SCAN_STATUSES}
+    for entry in report.values():
+        counts[entry["status"]] += 1
+    lines = [f"XV2 DDS header scan of {tex_dir}: {len(report)} files, "
+             + ", ".join(f"{counts[status]} {status}" for status in DDS_SCAN_STATUSES), ""]
+    for status in DDS_SCAN_STATUSES[1:]:
+        paths = sorted(entry["path"] for entry in report.values() if entry["status"] == status)
+        if paths:
+            lines.append(f"{status}:")
+            lines.extend(f"    {path}" for path in paths)
+    return lines, counts
+
+
+class XV2_OT_scan_dds(Operator):
+    bl_idname = "xv2.scan_dds"
+    bl_label = "Scan Texture Folder for Broken DDS"
+    bl_description = ("Read the header of every DDS under the texture folder and list broken ones. "
+                      "Apply then uses fixed copies of broken DXT1 files automatically")
+
+    def execute(self, context):
+        prefs = context.preferences.addons[__name__].preferences
+        if not prefs.tex_dir or not os.path.isdir(prefs.tex_dir):
+            self.report({'WARNING'}, "Texture folder not set/invalid."); return {'CANCELLED'}
+        report = scan_dds_headers(prefs.tex_dir)
+        lines, counts = format_dds_scan_report(prefs.tex_dir, report)
+        for line in lines: log.info("%s", line)
+        write_text_report("XV2 DDS Scan", lines)
+        self.report({'WARNING'} if counts["broken_dxt1"] or counts["truncated"] else {'INFO'},
+                    f"XV2 DDS Scan: {len(report)} files, {counts['broken_dxt1']} broken DXT1, "
+                    f"{counts['truncated']} truncated. See the 'XV2 DDS Scan' text.")
+        return {'FINISHED'}
+
+
+class XV2_OT_clear_fixed_dds_cache(Operator):
+    bl_idname = "xv2.clear_fixed_dds_cache"
+    bl_label = "Clear Fixed DYT Cache"
+    bl_description = "Delete the cached fixed DDS files. Images still using them will show as missing"
+
+    def execute(self, context):
+        clear_fixed_dds_cache()
+        self.report({'INFO'}, "XV2: Fixed DYT cache cleared.")
+        return {'FINISHED'}
+
+
+# --- MEMORY ESTIMATE ---
+# What the textures of a planned Apply will cost once Blender loads them, worked out
+# from DDS headers alone. Blender keeps a decoded 8-bit RGBA copy of each image in RAM;
+# on the GPU we count the BCn data with a full mip chain (RGBA8 with mips for files we
+# cannot read). No image datablocks are created, so this is cheap enough to run first.
+
+
+MEMORY_DOMINANT_SHARE = 0.10  # textures holding at least this share of the total get flagged
+_texture_memory_cache = {}  # path -> (file signature, TextureMemory or None)
+
+
+class TextureMemory:
+    __slots__ = ("path", "width", "height", "format", "ram_bytes", "gpu_bytes")
+
+    def __init__(self, path, width, height, fmt, ram_bytes, gpu_bytes):
+        self.path, self.width, self.height, self.format = path, width, height, fmt
+        self.ram_bytes, self.gpu_bytes = ram_bytes, gpu_bytes
+
+
+def estimate_texture_memory(path):
+    """TextureMemory for one file from its header, or None when it is not a readable DDS"""
+    signature = file_signature(path)
+    cached = _texture_memory_cache.get(path)
+    if cached and cached[0] == signature:
+        return cached[1]
+    estimate = None
+    if signature and path.lower().endswith(".dds"):
+        try:
+            header = DDSHeader.read(path)
+        except (OSError, ValueError):
+            header = None
+        if header and header.width and header.height:
+            rgba_bytes = header.width * header.height * 4
+            gpu_bytes = header.payload_size(header.max_mip_levels) if header.format else rgba_bytes * 4 // 3
+            estimate = TextureMemory(path, header.width, header.height, header.format or header.fourcc.decode(
+                "ascii", "replace"), rgba_bytes, gpu_bytes)
+    _texture_memory_cache[path] = (signature, estimate)
+    return estimate
+
+
+class MemoryEstimate:
+    """Output of estimate_plan_memory(). Group totals count every texture once."""
+
+    def __init__(self):
+        self.textures = {}  # path -> TextureMemory or None
+        self.loaded = set()  # paths already in bpy.data.images
+        self.materials = {}  # primary stub -> [paths]
+        self.objects = {}  # object name -> [paths]
+
+    def totals(self, paths=None):
+        """(ram bytes, gpu bytes) over paths (default: every texture)"""
+        estimates = [self.textures[p] for p in (self.textures if paths is None else paths) if self.textures[p]]
+        return sum(e.ram_bytes for e in estimates), sum(e.gpu_bytes for e in estimates)
+
+    def dominant(self, share=MEMORY_DOMINANT_SHARE):
+        """Estimates holding at least share of the total GPU memory, largest first"""
+        total_gpu = self.totals()[1]
+        estimates = sorted((e for e in self.textures.values() if e), key=lambda e: e.gpu_bytes, reverse=True)
+        return [e for e in estimates if total_gpu and e.gpu_bytes >= share * total_gpu]
+
+
+def estimate_plan_memory(plan):
+    """Estimate every texture an ApplyPlan assigns (DYT, 000-002 and DATA_NNN files)"""
+    estimate = MemoryEstimate()
+    for primary_stub, material_plan in plan.materials.items():
+        paths = [resolved[2] for resolved in material_plan.textures.values() if resolved and resolved[2]]
+        estimate.loaded.update(resolved[2] for resolved in material_plan.textures.values()
+                               if resolved and resolved[0] == "image" and resolved[2])
+        estimate.materials[primary_stub] = list(dict.fromkeys(paths + list(material_plan.data_files)))
+    for obj_name, _, primary_stub in plan.slots:
+        if primary_stub is not None:
+            paths = estimate.objects.setdefault(obj_name, [])
+            paths.extend(p for p in estimate.materials[primary_stub] if p not in paths)
+    unique_paths = list(dict.fromkeys(p for paths in estimate.materials.values() for p in paths))
+    with ThreadPoolExecutor(max_workers=DDS_SCAN_WORKERS) as pool:
+        estimate.textures = dict(zip(unique_paths, pool.map(estimate_texture_memory, unique_paths)))
+    return estimate
+
+
+def format_memory(num_bytes):
+    return f"{num_bytes / (1024 * 1024):.1f} MB"
+
+
+def format_memory_estimate(estimate):
+    ram, gpu = estimate.totals()
+    unknown = sorted(p for p, e in estimate.textures.items() if e is None)
+    lines = [f"XV2 texture memory estimate: {len(estimate.textures)} textures, "
+             f"~{format_memory(ram)} RAM, ~{format_memory(gpu)} VRAM "
+             f"({len(estimate.loaded)} already loaded)", ""]
+    dominant = estimate.dominant()
+    if dominant:
+        lines.append(f"Dominating textures (>= {MEMORY_DOMINANT_SHARE:.0%} of VRAM each):")
+        for e in dominant:
+            lines.append(f"    {format_memory(e.gpu_bytes):>10} VRAM  {e.width}x{e.height} {e.format}  {e.path}")
+        lines.append("")
+    for title, groups in (("Per object", estimate.objects), ("Per material", estimate.materials)):
+        lines.append(f"{title}:")
+        ranked = sorted(groups.items(), key=lambda item: estimate.totals(item[1])[1], reverse=True)
+        for name, paths in ranked:
+            group_ram, group_gpu = estimate.totals(paths)
+            lines.append(f"    {name}: {len(paths)} textures, {format_memory(group_ram)} RAM, "
+                         f"{format_memory(group_gpu)} VRAM")
+        lines.append("")
+    if unknown:
+        lines.append("Not estimated (missing or not a readable DDS):")
+        lines.extend(f"    {path}" for path in unknown)
+    return lines
+
+
+class XV2_OT_memory_estimate(Operator):
+    bl_idname = "xv2.memory_estimate"
+    bl_label = "Estimate Texture Memory"
+    bl_description = ("Estimate the RAM and VRAM the textures Apply would assign will need, from DDS headers only. "
+                      "Nothing is loaded")
+
+    def execute(self, context):
+        prefs = context.preferences.addons[__name__].preferences
+        target_objects = apply_target_objects(context)
+        if not target_objects: self.report({'WARNING'}, "No mesh objects to process."); return {'CANCELLED'}
+        # Same plan Apply would make, without writing any cache files
+        plan = plan_apply_with_prefs(prefs, target_objects, dry_run=True)
+        estimate = estimate_plan_memory(plan)
+        lines = format_memory_estimate(estimate)
+        for line in lines: log.info("%s", line)
+        write_text_report("XV2 Memory Estimate", lines)
+        ram, gpu = estimate.totals()
+        self.report({'INFO'}, f"XV2: ~{format_memory(ram)} RAM, ~{format_memory(gpu)} VRAM for "
+                              f"{len(estimate.textures)} textures. See the 'XV2 Memory Estimate' text.")
+        return {'FINISHED'}
+
+
+# --- IMAGE BUDGET ---
+# Images the addon loads (Apply textures, DYT originals, DATA_NNN transformations, fixed
+# DYT copies) are tracked in least-recently-used order with their estimated RAM. Once the
+# total passes the budget preference, the oldest ones nothing uses any more are removed.
+# Images still in use stay counted and are left alone: freeing their pixel buffers would
+# only last until the next draw reloads them from disk. Images with unsaved edits are
+# never touched.
+
+
+_managed_images = collections.OrderedDict()  # image name -> estimated resident bytes, oldest first
+
+
+def image_memory_bytes(img, path=None):
+    """Estimated RAM of an image's decoded buffer, without forcing Blender to load it"""
+    estimate = estimate_texture_memory(path) if path else None
+    if estimate:
+        return estimate.ram_bytes
+    if img.has_data:
+        return img.size[0] * img.size[1] * (16 if img.is_float else 4)
+    return 0
+
+
+def track_image(img, path=None):
+    """Mark img as just used by the addon. Returns img."""
+    if img is not None:
+        _managed_images[img.name] = image_memory_bytes(img, path)
+        _managed_images.move_to_end(img.name)
+    return img
+
+
+def load_tracked_image(path):
+    """load_image_deduplicated(path), tracked for the image budget"""
+    return track_image(load_image_deduplicated(path), path)
+
+
+def image_budget_bytes():
+    prefs = addon_preferences()
+    return prefs.image_budget_mb * 1024 * 1024 if prefs else 0
+
+
+def enforce_image_budget(budget_bytes=None):
+    """Evict least recently used tracked images until they fit the budget. Returns (images evicted, bytes)."""
+    if budget_bytes is None:
+        budget_bytes = image_budget_bytes()
+    total = sum(_managed_images.values())
+    evicted = released = 0
+    if not budget_bytes or total <= budget_bytes:
+        return evicted, released
+    for name in list(_managed_images):
+        if total <= budget_bytes:
+            break
+        size = _managed_images[name]
+        img = bpy.data.images.get(name)
+        if img is None:
+            del _managed_images[name]
+            total -= size
+            continue
+        if not size or img.is_dirty or img.users or img is _copied_dyt_image:
+            continue
+        log.debug("Image budget: removing unused '%s' (%s)", name, format_memory(size))
+        del _managed_images[name]
+        bpy.data.images.remove(img)
+        total -= size
+        evicted += 1
+        released += size
+    if evicted:
+        log.info("Image budget: evicted %d images, ~%s released", evicted, format_memory(released))
+    return evicted, released
+
+
+@persistent
+def _forget_managed_images(*_args):
+    _managed_images.clear()
+
+
+class XV2_OT_trim_images(Operator):
+    bl_idname = "xv2.trim_images"
+    bl_label = "Trim XV2 Images to Budget"
+    bl_description = "Remove the least recently used images the addon loaded that nothing uses any more, until they fit the image budget"
+
+    def execute(self, context):
+        budget = context.preferences.addons[__name__].preferences.image_budget_mb * 1024 * 1024
+        if not budget:
+            self.report({'WARNING'}, "Set an image budget in the addon preferences first."); return {'CANCELLED'}
+        evicted, released = enforce_image_budget(budget)
+        self.report({'INFO'}, f"XV2: {evicted} images evicted, ~{format_memory(released)} released. "
+                              f"{len(_managed_images)} tracked, ~{format_memory(sum(_managed_images.values()))} "
+                              f"resident.")
+        return {'FINISHED'}
+
+
+# --- IMAGE DEDUPLICATION ---
+# images.load(check_existing=True) only matches the exact path string, so one DDS reached
+# through another case, a relative path or a symlinked root is loaded again. Images are
+# keyed here by realpath + normcase (packed fixed DYT copies by the file they fix) and
+# every addon load goes through that index. With the content preference on, files
+# with identical bytes under different paths share one image as well. The dedup
+# operator merges duplicates already in the file by remapping their users.
+
+
+_canonical_images = {}  # canonical key -> image name
+_canonical_images_count = -1  # len(bpy.data.images) when _canonical_images was built
+_content_images = {}  # sha1 of file contents -> image name
+_content_digest_cache = {}  # canonical path -> (file signature, sha1)
+
+
+def canonical_path(path):
+    return os.path.normcase(os.path.realpath(path))
+
+
+def image_canonical_key(img):
+    """Key shared by every image of the same file, or None for generated/packed images"""
+    fixed_from = img.get("xv2_fixed_from")
+    if fixed_from and img.packed_file:
+        return "fixed:" + canonical_path(fixed_from)
+    if img.packed_file or img.source != 'FILE' or not img.filepath:
         return None
+    return canonical_path(bpy.path.abspath(img.filepath))
+
+
+def content_digest(path):
+    """sha1 of a file's bytes, cached by size and mtime. None when unreadable."""
+    signature = file_signature(path)
+    cached = _content_digest_cache.get(path)
+    if cached and cached[0] == signature:
+        return cached[1]
+    try:
+        with open(path, "rb") as f:
+            digest = hashlib.file_digest(f, "sha1").hexdigest()
+    except OSError:
+        digest = None
+    _content_digest_cache[path] = (signature, digest)
+    return digest
+
+
+def dedup_by_content():
+    prefs = addon_preferences()
+    return bool(prefs and prefs.dedup_by_content)
+
+
+def rebuild_canonical_index():
+    global _canonical_images_count
+    _canonical_images.clear()
+    for img in bpy.data.images:
+        key = image_canonical_key(img)
+        if key and key not in _canonical_images:
+            _canonical_images[key] = img.name
+    _canonical_images_count = len(bpy.data.images)
+
+
+def find_canonical_image(key):
+    if len(bpy.data.images) != _canonical_images_count:
+        rebuild_canonical_index()
+    for attempt in range(2):
+        name = _canonical_images.get(key)
+        if name is None:
+            return None
+        img = bpy.data.images.get(name)
+        if img is not None and image_canonical_key(img) == key:
+            return img
+        # Renamed or replaced since the index was built
+        rebuild_canonical_index()
+    return None
+
+
+def find_image_by_content(path):
+    digest = content_digest(path)
+    img = bpy.data.images.get(_content_images.get(digest, "")) if digest else None
+    key = image_canonical_key(img) if img is not None else None
+    if key and not key.startswith("fixed:") and content_digest(key) == digest:
+        return img
+    return None
+
+
+def load_image_deduplicated(path):
+    """bpy.data.images.load(path, check_existing=True) that also reuses an image of the
+    same file reached through another path (or, optionally, with the same contents)"""
+    global _canonical_images_count
+    key = canonical_path(path)
+    img = find_canonical_image(key)
+    use_content = dedup_by_content()
+    if img is None and use_content:
+        img = find_image_by_content(key)
+    if img is None:
+        img = bpy.data.images.load(path, check_existing=True)
+        _canonical_images_count = len(bpy.data.images)
+    _canonical_images.setdefault(key, img.name)
+    if use_content:
+        digest = content_digest(key)
+        if digest:
+            _content_images.setdefault(digest, img.name)
+    return img
+
+
+def duplicate_image_groups(use_content=False):
+    """Lists of images sharing a canonical key (and optionally file contents), two or more each"""
+    groups = {}
+    for img in bpy.data.images:
+        key = image_canonical_key(img)
+        if key:
+            groups.setdefault(key, []).append(img)
+    if use_content:
+        merged = {}
+        for key, images in groups.items():
+            digest = None if key.startswith("fixed:") else content_digest(key)
+            merged.setdefault(("sha1", digest) if digest else ("key", key), []).extend(images)
+        groups = merged
+    return [images for images in groups.values() if len(images) > 1]
+
+
+def merge_duplicate_images(use_content=False):
+    """Remap every duplicate image to one kept image and remove it. Returns (removed, bytes saved)."""
+    removed = saved = 0
+    for images in duplicate_image_groups(use_content):
+        keep = max(images, key=lambda img: (img.users, -len(img.name)))
+        for dup in images:
+            if dup is keep or dup.is_dirty or dup is _copied_dyt_image:
+                continue
+            dup.user_remap(keep)
+            if dup.users == 0:
+                saved += image_memory_bytes(dup, image_canonical_key(keep) if not dup.packed_file else None)
+                log.debug("Merged duplicate image '%s' into '%s'", dup.name, keep.name)
+                _managed_images.pop(dup.name, None)
+                bpy.data.images.remove(dup)
+                removed += 1
+    rebuild_canonical_index()
+    return removed, saved
+
+
+class XV2_OT_dedup_images(Operator):
+    bl_idname = "xv2.dedup_images"
+    bl_label = "Merge Duplicate Images"
+    bl_description = ("Point every user of an image loaded twice (other path case, relative path, symlink or "
+                      "repeated DYT fix) at one copy and remove the rest")
+    bl_options = {'REGISTER', 'UNDO'}
+
+    def execute(self, context):
+        removed, saved = merge_duplicate_images(context.preferences.addons[__name__].preferences.dedup_by_content)
+        self.report({'INFO'}, f"XV2: {removed} duplicate images merged"
+                              + (f", ~{format_memory(saved)} saved." if saved else "."))
+        return {'FINISHED'}
+
+
+# --- PROXY TEXTURES ---
+# Optional viewport proxies for the EMB and mask textures (000/001/002). plan_apply()
+# writes each proxy once to <cache dir>/proxy_textures/, named by a hash of the source
+# path, its size/mtime and the proxy size: when the DDS already has a small enough mip
+# the mips are copied over as they are, otherwise its smallest mip is decoded and box
+# filtered into an uncompressed RGBA8 DDS. Proxy images remember their original in
+# "xv2_proxy_of"; the render handlers swap the originals in for final renders and put
+# the proxies back afterwards. DYTs are small and never get proxies (see DYT RAMPS).
+
+
+PROXY_DIR = "proxy_textures"
+PROXY_VERSION = 1
+PROXY_TEXTURE_KINDS = ("000", "001", "002")
+PROXY_NODE_ROLES = ("emb", "mask")
+PROXY_RENDER_BEGIN_HANDLERS = ("render_init", "render_pre")
+PROXY_RENDER_END_HANDLERS = ("render_complete", "render_cancel")
+_proxy_render_swaps = []  # (material name, node name, proxy path, original path) during a render
+
+
+def proxy_size_from_prefs(prefs):
+    return int(prefs.proxy_textures) if prefs and prefs.proxy_textures != 'OFF' else 0
+
+
+def rgba8_dds_bytes(width, height, rgba):
+    """Uncompressed DDS for top-down (height, width, 4) uint8 RGBA"""
+    header = bytearray(DDS_HEADER_SIZE)
+    header[0:4] = b"DDS "
+    struct.pack_into("<7I", header, 4, 124, 0x0000100F, height, width, width * 4, 0, 0)
+    struct.pack_into("<8I", header, 76, 32, 0x41, 0, 32, 0x00FF0000, 0x0000FF00, 0x000000FF, 0xFF000000)
+    struct.pack_into("<I", header, 108, 0x1000)
+    return bytes(header) + np.ascontiguousarray(rgba[..., [2, 1, 0, 3]]).tobytes()
+
+
+def proxy_dds_bytes(path, header, max_size):
+    """Contents of a proxy of path no larger than max_size on its longer side"""
+    file_size = os.path.getsize(path)
+    level = next(mip for mip in range(header.max_mip_levels) if max(header.mip_size(mip)[:2]) <= max_size)
+    present = [mip for mip in range(header.mip_levels)
+               if header.mip_offset(mip) + header.mip_size(mip)[2] <= file_size]
+    if level in present:
+        levels = [mip for mip in present if mip >= level]
+        width, height, top_size = header.mip_size(level)
+        with open(path, "rb") as f:
+            head = bytearray(f.read(header.data_offset))
+            f.seek(header.mip_offset(level))
+            body = f.read(sum(header.mip_size(mip)[2] for mip in levels))
+        flags = 0x00081007 | (DDSD_MIPMAPCOUNT if len(levels) > 1 else 0)
+        struct.pack_into("<7I", head, 4, 124, flags, height, width, top_size, 0, len(levels) if len(levels) > 1 else 0)
+        struct.pack_into("<I", head, 88, 0)
+        struct.pack_into("<I", head, 108, 0x00401008 if len(levels) > 1 else 0x1000)
+        return bytes(head) + body
+    # No mip that small in the file: box filter the smallest one there is
+    source = max(present)
+    width, height, pixels = decode_dds_pixels(path, source)
+    factor = 1 << (level - source)
+    rows, cols = max(1, height // factor), max(1, width // factor)
+    pixels = pixels[::-1][:rows * factor, :cols * factor]
+    pixels = pixels.reshape(rows, pixels.shape[0] // rows, cols, pixels.shape[1] // cols, 4).mean(axis=(1, 3))
+    return rgba8_dds_bytes(cols, rows, np.rint(pixels * 255.0).astype(np.uint8))
+
+
+def proxy_texture_path(path, max_size, proxy_dir, create=True):
+    """Cached proxy DDS for path, or None when path is small enough or cannot be proxied. Thread safe.
+
+    Without create nothing is written: the path is where the proxy would go.
+    """
+    signature = file_signature(path)
+    if not signature or not path.lower().endswith(".dds"):
+        return None
+    try:
+        header = DDSHeader.read(path)
+        if not header.format or not header.width or not header.height or max(header.width, header.height) <= max_size:
+            return None
+        digest = hashlib.sha1(f"{PROXY_VERSION}|{cache_key(path)}|{signature}|{max_size}".encode("utf-8")).hexdigest()
+        proxy_path = os.path.join(proxy_dir, digest + ".dds")
+        if not create or os.path.isfile(proxy_path):
+            return proxy_path
+        data = proxy_dds_bytes(path, header, max_size)
+        os.makedirs(proxy_dir, exist_ok=True)
+        with open(proxy_path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(proxy_path + ".tmp", proxy_path)
+        return proxy_path
+    except (OSError, ValueError) as e:
+        log.warning("Could not make a proxy of '%s': %s", path, e)
+        return None
+
+
+def plan_proxy_textures(plan, max_size, pool, create=True):
+    """Fill plan.proxies for the EMB and mask textures of an ApplyPlan"""
+    proxy_dir = os.path.join(addon_cache_dir(), PROXY_DIR)
+    paths = sorted({resolved[2] for material_plan in plan.materials.values()
+                    for kind, resolved in material_plan.textures.items()
+                    if kind in PROXY_TEXTURE_KINDS and resolved and resolved[2]})
+    proxies = pool.map(lambda path: proxy_texture_path(path, max_size, proxy_dir, create), paths)
+    plan.proxies = {cache_key(path): proxy for path, proxy in zip(paths, proxies) if proxy}
+
+
+def load_proxy_image(proxy_path, original_path):
+    img = load_image_deduplicated(proxy_path)
+    if img.get("xv2_proxy_of") != original_path:
+        img.name = f"{os.path.splitext(os.path.basename(original_path))[0]}_proxy"
+        img["xv2_proxy_of"] = original_path
+    return track_image(img, proxy_path)
+
+
+def proxy_texture_nodes(mat):
+    if not mat or not mat.use_nodes or not mat.node_tree:
+        return []
+    index = get_role_index(mat.node_tree)
+    return [node for node in (index.node(role) for role in PROXY_NODE_ROLES)
+            if node and node.type == 'TEX_IMAGE' and node.image]
+
+
+def set_proxy_textures(materials, proxies):
+    """Put proxy images into the EMB/mask nodes of materials, or the originals back where
+    proxies (cache_key(original path) -> proxy path) has none. Returns nodes changed."""
+    changed = 0
+    for mat in materials:
+        for node in proxy_texture_nodes(mat):
+            original_path = node.image.get("xv2_proxy_of") or image_source_path(node.image)
+            proxy_path = proxies.get(cache_key(original_path)) if original_path else None
+            try:
+                if proxy_path:
+                    target = load_proxy_image(proxy_path, original_path)
+                elif node.image.get("xv2_proxy_of"):
+                    target = load_tracked_image(original_path)
+                else:
+                    continue
+            except RuntimeError as e:
+                log.warning("Could not load image: %s - %s", proxy_path or original_path, e)
+                continue
+            if node.image != target:
+                node.image = target
+                changed += 1
+    return changed
+
+
+@persistent
+def _proxy_render_begin(*_args):
+    # render_pre fires for every frame; swap once per render
+    if _proxy_render_swaps:
+        return
+    for mat in bpy.data.materials:
+        for node in proxy_texture_nodes(mat):
+            original_path = node.image.get("xv2_proxy_of")
+            if not original_path:
+                continue
+            try:
+                full_image = load_tracked_image(original_path)
+            except RuntimeError as e:
+                log.warning("Could not load full resolution image: %s - %s", original_path, e)
+                continue
+            _proxy_render_swaps.append((mat.name, node.name, bpy.path.abspath(node.image.filepath), original_path))
+            node.image = full_image
+    if _proxy_render_swaps:
+        log.info("Render: using full resolution for %d proxy textures", len(_proxy_render_swaps))
+
+
+@persistent
+def _proxy_render_end(*_args):
+    for mat_name, node_name, proxy_path, original_path in _proxy_render_swaps:
+        mat = bpy.data.materials.get(mat_name)
+        node = mat.node_tree.nodes.get(node_name) if mat and mat.node_tree else None
+        if node is None or not os.path.isfile(proxy_path):
+            continue
+        try:
+            node.image = load_proxy_image(proxy_path, original_path)
+        except RuntimeError as e:
+            log.warning("Could not load image: %s - %s", proxy_path, e)
+    _proxy_render_swaps.clear()
+
+
+def clear_proxy_cache():
+    shutil.rmtree(os.path.join(addon_cache_dir(), PROXY_DIR), ignore_errors=True)
+
+
+class XV2_OT_clear_proxy_cache(Operator):
+    bl_idname = "xv2.clear_proxy_cache"
+    bl_label = "Clear Proxy Texture Cache"
+    bl_description = "Delete the cached proxy textures. Images still using them show as missing until the next Apply"
+
+    def execute(self, context):
+        clear_proxy_cache()
+        self.report({'INFO'}, "XV2: Proxy texture cache cleared.")
+        return {'FINISHED'}
+
+
+# --- DYT RAMPS ---
+# A main-shader material only ever reads one row of its DYT: DYT Control [CAMERA BASED]
+# turns "DYT Line" into v = 2.1 - 1.2 * line (wrapped by the REPEAT extension) and only
+# the view-dependent u varies. The DYT Dual Color Sampler reads the same row (MSK, shifted
+# in u) or the row 0.9 above it. With the DYT Ramps preference plan_apply() extracts those
+# rows once into 1 pixel high RGBA8 DDS files in <cache dir>/dyt_ramps/, blended between
+# the two nearest texel rows in linear space like the GPU's bilinear lookup, and Apply
+# assigns them instead of the full DYT. A single-row texture returns that row for any v,
+# so the node graph stays as it is. Per-object DYT Lines pick their row at render time
+# and keep the full DYT.
+
+
+DYT_RAMP_DIR = "dyt_ramps"
+DYT_RAMP_VERSION = 1
+DYT_DUAL_ROW_OFFSET = 0.9  # "Dual Color UV Map" offset for non-MSK materials
+
+
+def dyt_row_from_line(line):
+    """v the DYT Control [CAMERA BASED] group samples for a DYT Line, wrapped to [0, 1)"""
+    return (1.9 - (line * 1.2 - 0.2)) % 1.0
+
+
+def dyt_ramp_rows(material_plan):
+    """v rows read by the DYT node and by the dual color sampler"""
+    row = dyt_row_from_line(material_plan.dyt_line)
+    if "MSK" in material_plan.shader_type.upper():
+        return row, row
+    return row, (row + DYT_DUAL_ROW_OFFSET) % 1.0
+
+
+def srgb_to_linear(c):
+    return np.where(c <= 0.04045, c / 12.92, ((c + 0.055) / 1.055) ** 2.4)
+
+
+def linear_to_srgb(c):
+    return np.where(c <= 0.0031308, c * 12.92, 1.055 * np.maximum(c, 0.0) ** (1 / 2.4) - 0.055)
+
+
+def dyt_ramp_pixels(path, row):
+    """(width, uint8 (1, width, 4) RGBA) of path's top mip filtered at v=row"""
+    width, height, pixels = decode_dds_pixels(path, 0)
+    y = row * height - 0.5
+    below = int(np.floor(y))
+    t = y - below
+    a, b = pixels[below % height], pixels[(below + 1) % height]
+    rgb = linear_to_srgb(srgb_to_linear(a[:, :3]) * (1.0 - t) + srgb_to_linear(b[:, :3]) * t)
+    alpha = a[:, 3:] * (1.0 - t) + b[:, 3:] * t
+    ramp = np.concatenate([rgb, alpha], axis=1)
+    return width, np.rint(np.clip(ramp, 0.0, 1.0) * 255.0).astype(np.uint8)[np.newaxis]
+
+
+def dyt_ramp_path(path, row, ramp_dir, create=True):
+    """Cached ramp DDS of path at row, or None when path is not a BCn DDS. Thread safe.
+
+    Without create nothing is written: the path is where the ramp would go.
+    """
+    signature = file_signature(path)
+    if not signature or not path.lower().endswith(".dds"):
+        return None
+    try:
+        if not DDSHeader.read(path).format:
+            return None
+        digest = hashlib.sha1(f"{DYT_RAMP_VERSION}|{cache_key(path)}|{signature}|{row:.6f}".encode("utf-8")).hexdigest()
+        ramp_path = os.path.join(ramp_dir, digest + ".dds")
+        if not create or os.path.isfile(ramp_path):
+            return ramp_path
+        width, ramp = dyt_ramp_pixels(path, row)
+        os.makedirs(ramp_dir, exist_ok=True)
+        with open(ramp_path + ".tmp", "wb") as f:
+            f.write(rgba8_dds_bytes(width, 1, ramp))
+        os.replace(ramp_path + ".tmp", ramp_path)
+        return ramp_path
+    except (OSError, ValueError) as e:
+        log.warning("Could not extract a DYT ramp from '%s': %s", path, e)
+        return None
+
+
+def dyt_ramp_source(material_plan):
+    """DYT file to extract ramps from, None when the material keeps its full DYT"""
+    resolved = material_plan.textures.get("dyt")
+    if material_plan.is_eye or material_plan.dyt_line is None or material_plan.dyt_line_attribute or \
+            not resolved or not resolved[2]:
+        return None
+    return resolved[1] if resolved[0] == "fixed" else resolved[2]
+
+
+def plan_dyt_ramps(plan, pool, create=True):
+    """Fill MaterialPlan.dyt_ramps for main-shader materials with a fixed DYT Line"""
+    ramp_dir = os.path.join(addon_cache_dir(), DYT_RAMP_DIR)
+    jobs = sorted({(source, row) for material_plan in plan.materials.values()
+                   for source in [dyt_ramp_source(material_plan)] if source
+                   for row in dyt_ramp_rows(material_plan)})
+    ramps = dict(zip(jobs, pool.map(lambda job: dyt_ramp_path(job[0], job[1], ramp_dir, create), jobs)))
+    for material_plan in plan.materials.values():
+        source = dyt_ramp_source(material_plan)
+        if not source:
+            continue
+        rows = dyt_ramp_rows(material_plan)
+        if all(ramps[(source, row)] for row in rows):
+            material_plan.dyt_ramps = [(row, ramps[(source, row)]) for row in rows]
+        elif not create and not os.path.isfile(source):
+            # A fixed DYT copy the dry run did not write: the ramp paths depend on its contents
+            material_plan.dyt_ramps = [(row, None) for row in rows]
+
+
+def load_dyt_ramp_image(ramp_path, original_path, row):
+    img = load_image_deduplicated(ramp_path)
+    if img.get("xv2_dyt_ramp_of") != original_path:
+        img.name = f"{os.path.splitext(os.path.basename(original_path))[0]}_ramp_{row:.3f}"
+        img["xv2_dyt_ramp_of"] = original_path
+    return track_image(img, ramp_path)
+
+
+def load_planned_dyt_ramps(material_plan):
+    """(DYT image, dual sampler image) ramps of a MaterialPlan, (None, None) without ramps"""
+    if not material_plan.dyt_ramps:
+        return None, None
+    original_path = material_plan.textures["dyt"][2]
+    try:
+        return tuple(load_dyt_ramp_image(ramp_path, original_path, row) for row, ramp_path in material_plan.dyt_ramps)
+    except RuntimeError as e:
+        log.warning("Could not load DYT ramp for '%s': %s", material_plan.primary_stub, e)
+        return None, None
+
+
+def load_material_dyt(mat, path):
+    """DYT image for path as mat samples it: its ramp when mat uses DYT ramps, else the full texture"""
+    row = mat.get("xv2_dyt_ramp_row")
+    if row is not None:
+        ramp_path = dyt_ramp_path(path, row, os.path.join(addon_cache_dir(), DYT_RAMP_DIR))
+        if ramp_path:
+            return load_dyt_ramp_image(ramp_path, path, row)
+    return load_tracked_image(path)
+
+
+def full_dyt_image(img):
+    """The full DYT a ramp image was extracted from (img itself for anything else)"""
+    original_path = img.get("xv2_dyt_ramp_of") if img else None
+    if not original_path:
+        return img
+    try:
+        return load_tracked_image(original_path)
+    except RuntimeError as e:
+        log.warning("Could not load DYT: %s - %s", original_path, e)
+        return img
+
+
+def clear_dyt_ramp_cache():
+    shutil.rmtree(os.path.join(addon_cache_dir(), DYT_RAMP_DIR), ignore_errors=True)
+
+
+class XV2_OT_clear_dyt_ramp_cache(Operator):
+    bl_idname = "xv2.clear_dyt_ramp_cache"
+    bl_label = "Clear DYT Ramp Cache"
+    bl_description = "Delete the cached DYT ramps. Images still using them show as missing until the next Apply"
+
+    def execute(self, context):
+        clear_dyt_ramp_cache()
+        self.report({'INFO'}, "XV2: DYT ramp cache cleared.")
+        return {'FINISHED'}
 
 
 class XV2_OT_dyt_fix(Operator):
     bl_idname = "xv2.dyt_fix";
     bl_label = "Fix Invisible DYT DDS"
-    bl_description = "Scans for malformed DXT1 DYT DDS. Creates fixed, packed copies. Does not alter originals.";
+    bl_description = ("Scans for malformed DXT1 DYT DDS. Creates fixed copies in the cache folder "
+                      "(or packed, see preferences). Does not alter originals.");
     bl_options = {'REGISTER', 'UNDO'}
 
     def execute(self, context):
         fixed_count, skipped_count, error_count = 0, 0, 0;
         processed_images = {}
+        names = ImageNameAllocator()
+        addon = context.preferences.addons.get(__name__)
+        use_cache = not addon or addon.preferences.dds_fix_mode == 'CACHE'
         for mat in bpy.data.materials:
             if not mat or not mat.use_nodes or not mat.node_tree: continue
             for node in mat.node_tree.nodes:
@@ -2626,20 +5750,30 @@ class XV2_OT_dyt_fix(Operator):
                     else:
                         skipped_count += 1
                     continue
-                if not is_likely_broken_dxt1_dds(orig_path): skipped_count += 1; processed_images[
-                    orig_path] = None; continue
                 name_no_ext = os.path.splitext(os.path.basename(orig_path))[0];
                 new_img_base_name = f"{name_no_ext}_fixed"
-                new_fixed_img = create_fixed_image_from_path(orig_path, new_img_base_name)
+                if use_cache:
+                    try:
+                        fixed_path = fixed_dds_cache_path(orig_path)
+                    except OSError as e:
+                        fix_log.warning("Failed to read/process image '%s': %s", orig_path, e)
+                        fixed_path = ""
+                    if fixed_path is None: skipped_count += 1; processed_images[orig_path] = None; continue
+                    new_fixed_img = load_fixed_image(fixed_path, orig_path, new_img_base_name, names) if fixed_path else None
+                else:
+                    if not is_likely_broken_dxt1_dds(orig_path): skipped_count += 1; processed_images[
+                        orig_path] = None; continue
+                    new_fixed_img = create_fixed_image_from_path(orig_path, new_img_base_name, names)
                 if new_fixed_img:
                     node.image = new_fixed_img;
                     processed_images[orig_path] = new_fixed_img;
                     fixed_count += 1;
-                    print(
-                        f"[XV2][DYT Fix] Fixed '{base_name_lower}' in '{mat.name}' to '{new_fixed_img.name}'.")
+                    fix_log.info("Fixed '%s' in '%s' to '%s'.", base_name_lower, mat.name, new_fixed_img.name)
                 else:
                     error_count += 1;
                     processed_images[orig_path] = None
+        if use_cache: save_fixed_dds_index()
+        enforce_image_budget()
         if fixed_count > 0:
             self.report({'INFO'}, f"DYT Fix: {fixed_count} fixed, {error_count} errors, {skipped_count} skipped.")
         elif error_count > 0:
@@ -2668,6 +5802,7 @@ class XV2_PT_material_utilities_panel(Panel):
         col_dyt_fix = box_dyt_fix.column(align=True)
         col_dyt_fix.label(text="Invisible DYT DDS Fix:", icon='FILE_IMAGE')
         col_dyt_fix.operator("xv2.dyt_fix", text="Scan & Fix DYTs", icon='TOOL_SETTINGS')
+        col_dyt_fix.operator("xv2.scan_dds", text="Scan Texture Folder", icon='VIEWZOOM')
         col_dyt_fix.label(text="(Fixes common DXT1 header issues)")
 
         # DYT Copy/Paste
@@ -2695,22 +5830,324 @@ class XV2_PT_material_utilities_panel(Panel):
         col_alpha_fix.label(text="(Works on all materials from selected objects)")
 
 
-classes = (XV2_Prefs, XV2_OT_apply, XV2_PT_Main, XV2_OT_dyt_fix, XV2_PT_material_utilities_panel,
+classes = (XV2_Prefs, XV2_OT_clear_log, XV2_OT_clear_mask_cache, XV2_OT_clear_fixed_dds_cache, XV2_OT_scan_dds, XV2_OT_memory_estimate, XV2_OT_trim_images, XV2_OT_clear_proxy_cache, XV2_OT_clear_dyt_ramp_cache, XV2_OT_dedup_images, XV2_OT_apply, XV2_OT_apply_modal, XV2_PT_Main, XV2_OT_dyt_fix, XV2_PT_material_utilities_panel,
            XV2_OT_copy_dyt_settings, XV2_OT_paste_dyt_settings, XV2_OT_disconnect_emb_alpha,
            XV2_OT_set_dyt_transformation, XV2_PT_transformation_panel)
 
 def register():
     for cls in classes: bpy.utils.register_class(cls)
+    for handler_name in ROLE_INDEX_HANDLERS:
+        getattr(bpy.app.handlers, handler_name).append(_clear_role_index_cache)
+    bpy.app.handlers.load_post.append(_forget_managed_images)
+    for handler_name in PROXY_RENDER_BEGIN_HANDLERS:
+        getattr(bpy.app.handlers, handler_name).append(_proxy_render_begin)
+    for handler_name in PROXY_RENDER_END_HANDLERS:
+        getattr(bpy.app.handlers, handler_name).append(_proxy_render_end)
+    prefs = addon_preferences()
+    if prefs:
+        apply_logging_prefs(prefs)
+        if not bpy.app.background and (prefs.emm_dir or prefs.tex_dir):
+            start_cache_prewarm(prefs.emm_dir, prefs.tex_dir)
 
 
 def unregister():
+    for handler_name in ROLE_INDEX_HANDLERS:
+        handlers = getattr(bpy.app.handlers, handler_name)
+        if _clear_role_index_cache in handlers: handlers.remove(_clear_role_index_cache)
+    _role_index_cache.clear()
+    if _forget_managed_images in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(_forget_managed_images)
+    for handler_names, handler in ((PROXY_RENDER_BEGIN_HANDLERS, _proxy_render_begin),
+                                   (PROXY_RENDER_END_HANDLERS, _proxy_render_end)):
+        for handler_name in handler_names:
+            handlers = getattr(bpy.app.handlers, handler_name)
+            if handler in handlers: handlers.remove(handler)
+    _managed_images.clear()
+    stop_cache_prewarm()
+    release_mask_pixel_buffer()
+    configure_logging()
     for cls in reversed(classes): bpy.utils.unregister_class(cls)
 
 
+# --- HEADLESS BATCH ---
+# blender -b --factory-startup --python XV2AutoShader.py -- --fbx-dir FBX --emm-dir EMM --tex-dir TEX --out-dir OUT --jobs 4
+
+
+def build_batch_arg_parser():
+    parser = argparse.ArgumentParser(
+        prog="blender -b --factory-startup --python XV2AutoShader.py --",
+        description="Import FBX files, apply the XV2 shaders and save one .blend per file.")
+    parser.add_argument("--fbx-dir", default="", help="Folder searched recursively for .fbx files")
+    parser.add_argument("--files", nargs="*", default=[], help="FBX files to process (instead of --fbx-dir)")
+    parser.add_argument("--emm-dir", default="", help="EMM XML folder")
+    parser.add_argument("--tex-dir", default="", help="Texture root folder")
+    parser.add_argument("--out-dir", default="", help="Folder the .blend files are written to")
+    parser.add_argument("--jobs", type=int, default=1, help="Number of background Blender processes")
+    parser.add_argument("--summary", default="", help="JSON summary path (default: OUT/xv2_batch_summary.json)")
+    parser.add_argument("--force", action="store_true", help="Rebuild materials even if their inputs are unchanged")
+    parser.add_argument("--serve", default="",
+                        help="Run as a warm worker on a Unix socket path or loopback [HOST:]PORT")
+    parser.add_argument("--log-level", default="INFO", choices=LOG_LEVELS, help="Console log level")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--result", default="", help=argparse.SUPPRESS)
+    return parser
+
+
+def find_fbx_files(fbx_dir):
+    fbx_files = []
+    for r, _, fs in os.walk(fbx_dir):
+        fbx_files.extend(os.path.join(r, f) for f in fs if f.lower().endswith(".fbx"))
+    return sorted(fbx_files)
+
+
+WARM_RESET_COLLECTIONS = ("objects", "meshes", "materials", "images", "armatures", "actions", "collections",
+                          "cameras", "lights", "curves")
+
+
+def reset_scene_keep_node_groups():
+    """Empty the file for the next warm-worker job, keeping the XV2 node groups"""
+    bpy.data.batch_remove([item for attr in WARM_RESET_COLLECTIONS for item in getattr(bpy.data, attr)])
+    invalidate_role_index()
+    _managed_images.clear()
+
+
+def batch_process_file(fbx_path, emm_dir, tex_dir, out_dir, force=False, blend_path="", keep_warm=False):
+    """Import one FBX into an empty file, run Apply on every mesh and save it. Returns a result dict.
+
+    keep_warm empties the current file instead of loading the startup file, so node groups survive.
+    """
+    result = {"fbx": fbx_path, "blend": "", "ok": False, "error": "", "materials": 0, "slots_assigned": 0,
+              "seconds": {}}
+    seconds = result["seconds"]
+    start = time.perf_counter()
+    try:
+        if keep_warm:
+            reset_scene_keep_node_groups()
+        else:
+            bpy.ops.wm.read_homefile(use_empty=True)
+            # Don't rely on load_post having run for the startup file
+            invalidate_role_index()
+            _managed_images.clear()
+
+        t = time.perf_counter()
+        bpy.ops.import_scene.fbx(filepath=fbx_path)
+        seconds["import"] = time.perf_counter() - t
+
+        t = time.perf_counter()
+        meshes = [o for o in bpy.data.objects if o.type == 'MESH']
+        plan = plan_apply(collect_slot_materials(meshes), emm_dir, tex_dir, snapshot_images(),
+                          known_broken_dds(tex_dir), specialize_shaders=True,
+                          mask_analysis_mode=current_mask_analysis_mode())
+        clones, slots_assigned, _skipped = commit_apply_plan(plan, tex_dir, force)
+        seconds["apply"] = time.perf_counter() - t
+
+        t = time.perf_counter()
+        blend_path = blend_path or os.path.join(out_dir, os.path.splitext(os.path.basename(fbx_path))[0] + ".blend")
+        os.makedirs(os.path.dirname(os.path.abspath(blend_path)), exist_ok=True)
+        bpy.ops.wm.save_as_mainfile(filepath=blend_path)
+        seconds["save"] = time.perf_counter() - t
+
+        result.update(ok=True, blend=blend_path, materials=len(clones), slots_assigned=slots_assigned)
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    seconds["total"] = time.perf_counter() - start
+    if result["ok"]:
+        batch_log.info("OK %s (%.2fs)", fbx_path, seconds["total"])
+    else:
+        batch_log.error("FAILED %s (%.2fs): %s", fbx_path, seconds["total"], result["error"])
+    return result
+
+
+def write_json(path, data):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+
+
+def run_batch_worker(args):
+    """Process args.files in this process, rewriting args.result after every file"""
+    results = []
+    for fbx_path in args.files:
+        results.append(batch_process_file(fbx_path, args.emm_dir, args.tex_dir, args.out_dir, args.force))
+        if args.result:
+            write_json(args.result, results)
+    return results
+
+
+def split_batch_files(fbx_files, jobs):
+    """Spread files over jobs buckets, largest first onto the lightest bucket"""
+    buckets = [[0, []] for _ in range(jobs)]
+    for fbx_path in sorted(fbx_files, key=lambda p: os.path.getsize(p) if os.path.exists(p) else 0, reverse=True):
+        bucket = min(buckets, key=lambda b: b[0])
+        bucket[0] += os.path.getsize(fbx_path) if os.path.exists(fbx_path) else 0
+        bucket[1].append(fbx_path)
+    return [files for _, files in buckets if files]
+
+
+def run_batch_workers(fbx_files, args, jobs):
+    """Run the files across jobs background Blender processes and collect their results"""
+    result_dir = tempfile.mkdtemp(prefix="xv2_batch_")
+    workers = []
+    for i, chunk in enumerate(split_batch_files(fbx_files, jobs)):
+        result_path = os.path.join(result_dir, f"worker_{i}.json")
+        cmd = [bpy.app.binary_path, "-b", "--factory-startup", "--python", os.path.abspath(__file__), "--",
+               "--worker", "--result", result_path, "--emm-dir", args.emm_dir, "--tex-dir", args.tex_dir,
+               "--out-dir", args.out_dir, "--log-level", args.log_level]
+        if args.force: cmd.append("--force")
+        cmd += ["--files", *chunk]
+        workers.append((subprocess.Popen(cmd), chunk, result_path))
+
+    results = []
+    for proc, chunk, result_path in workers:
+        code = proc.wait()
+        try:
+            with open(result_path, encoding="utf-8") as f:
+                worker_results = json.load(f)
+        except (OSError, ValueError):
+            worker_results = []
+        results.extend(worker_results)
+        finished = {r["fbx"] for r in worker_results}
+        for fbx_path in chunk:
+            if fbx_path not in finished:
+                results.append({"fbx": fbx_path, "blend": "", "ok": False, "materials": 0, "slots_assigned": 0,
+                                "error": f"Worker exited with code {code} before finishing this file",
+                                "seconds": {}})
+    shutil.rmtree(result_dir, ignore_errors=True)
+    return results
+
+
+# --- WARM WORKER ---
+# One JSON object per line in each direction, see README "Warm Worker".
+
+
+def parse_serve_address(address):
+    """(family, address) for --serve: a Unix socket path, or [HOST:]PORT on a loopback host"""
+    if os.sep in address or address.endswith(".sock"):
+        return socket.AF_UNIX, address
+    host, _, port = address.rpartition(":")
+    host = host.strip("[]") or "127.0.0.1"
+    if host not in ("127.0.0.1", "localhost", "::1"):
+        raise ValueError(f"Refusing to listen on non-loopback host '{host}'")
+    return (socket.AF_INET6 if host == "::1" else socket.AF_INET), (host, int(port))
+
+
+def warm_worker_caches(emm_dir, tex_dir):
+    """Build the node groups, EMM map and texture index before the first job arrives"""
+    ensure_node_group("Xenoverse - Dimps.001", xenoverse___dimps_001_node_group_def)
+    ensure_node_group("DYT Control [CAMERA BASED]", dyt_control__camera_based__node_group_def)
+    ensure_eye_node_groups()
+    get_row_map(emm_dir)
+    get_texture_index(tex_dir)
+
+
+def handle_worker_request(request, args):
+    cmd = request.get("cmd", "apply")
+    if cmd == "ping":
+        return {"ok": True, "pid": os.getpid(), "version": ".".join(str(v) for v in bl_info["version"])}
+    if cmd == "shutdown":
+        return {"ok": True, "shutdown": True}
+    if cmd != "apply":
+        return {"ok": False, "error": f"Unknown cmd '{cmd}'"}
+    if not request.get("fbx"):
+        return {"ok": False, "error": "Missing 'fbx'"}
+    return batch_process_file(request["fbx"], request.get("emm_dir", args.emm_dir),
+                              request.get("tex_dir", args.tex_dir), request.get("out_dir", args.out_dir),
+                              request.get("force", args.force), request.get("blend", ""), keep_warm=True)
+
+
+def serve_worker(args):
+    """Serve apply jobs one connection at a time until a shutdown request arrives"""
+    family, address = parse_serve_address(args.serve)
+    if family == socket.AF_UNIX and os.path.exists(address):
+        os.remove(address)
+    server = socket.socket(family, socket.SOCK_STREAM)
+    server.bind(address)
+    server.listen()
+    warm_worker_caches(args.emm_dir, args.tex_dir)
+    batch_log.info("Listening on %s (pid %s)", args.serve, os.getpid())
+
+    running = True
+    try:
+        while running:
+            conn, _ = server.accept()
+            # A client that hangs up early only loses its own replies, the worker keeps serving
+            try:
+                with conn, conn.makefile("rb") as rfile, conn.makefile("wb") as wfile:
+                    for line in rfile:
+                        if not line.strip():
+                            continue
+                        try:
+                            request = json.loads(line)
+                            if not isinstance(request, dict):
+                                raise ValueError("expected a JSON object")
+                        except ValueError as e:
+                            request, response = {}, {"ok": False, "error": f"Bad request: {e}"}
+                        else:
+                            response = handle_worker_request(request, args)
+                        if "id" in request:
+                            response["id"] = request["id"]
+                        running = not response.get("shutdown")
+                        wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+                        wfile.flush()
+                        if not running:
+                            break
+            except OSError as e:
+                batch_log.warning("Client connection dropped: %s", e)
+    finally:
+        server.close()
+        if family == socket.AF_UNIX and os.path.exists(address):
+            os.remove(address)
+    batch_log.info("Shut down.")
+    return 0
+
+
+def batch_main(argv):
+    parser = build_batch_arg_parser()
+    args = parser.parse_args(argv)
+    configure_logging(args.log_level)
+    if args.serve:
+        return serve_worker(args)
+    if args.worker:
+        run_batch_worker(args)
+        return 0
+    if not args.out_dir:
+        parser.error("--out-dir is required")
+
+    fbx_files = list(args.files) or (find_fbx_files(args.fbx_dir) if args.fbx_dir else [])
+    if not fbx_files:
+        batch_log.info("No FBX files to process.")
+        return 1
+    os.makedirs(args.out_dir, exist_ok=True)
+    jobs = max(1, min(args.jobs, len(fbx_files)))
+    batch_log.info("%s FBX file(s) across %s process(es).", len(fbx_files), jobs)
+
+    start = time.perf_counter()
+    if jobs == 1:
+        results = [batch_process_file(f, args.emm_dir, args.tex_dir, args.out_dir, args.force) for f in fbx_files]
+    else:
+        results = run_batch_workers(fbx_files, args, jobs)
+    failed = [r for r in results if not r["ok"]]
+    summary = {
+        "addon_version": ".".join(str(v) for v in bl_info["version"]),
+        "jobs": jobs,
+        "files": len(results),
+        "succeeded": len(results) - len(failed),
+        "failed": len(failed),
+        "wall_seconds": time.perf_counter() - start,
+        "results": results,
+    }
+    summary_path = args.summary or os.path.join(args.out_dir, "xv2_batch_summary.json")
+    write_json(summary_path, summary)
+    batch_log.info("Done: %s ok, %s failed in %.1fs. Summary: %s",
+                   summary["succeeded"], summary["failed"], summary["wall_seconds"], summary_path)
+    return 1 if failed else 0
+
+
 if __name__ == "__main__":
+    if "--" in sys.argv:
+        sys.exit(batch_main(sys.argv[sys.argv.index("--") + 1:]))
     try:
         unregister()
     except Exception:
         pass
     register()
-    print("[XV2] Auto-Shader v4.5.0")
+    log.info("Auto-Shader v4.5.0")
@@ -0,0 +1,167 @@
+"""Check the addon's NumPy BCn decoder against a straightforward per-texel reference.
+
+Writes random BC1/BC3/BC4/BC5 DDS files (FourCC and DX10 headers, odd sizes, mip chains),
+checks that DDSHeader reads their layout back, decodes every mip with decode_dds_pixels()
+and compares with the reference below:
+
+    python benchmarks/check_bcn_decoder.py [--cases 40] [--seed 1]
+
+Exits 1 on the first mismatch.
+"""
+
+import argparse
+import os
+import random
+import shutil
+import struct
+import sys
+import tempfile
+
+import numpy as np
+
+from run_benchmarks import addon
+
+FOURCCS = {"BC1": b"DXT1", "BC3": b"DXT5", "BC4": b"ATI1", "BC5": b"ATI2"}
+DXGI = {"BC1": 71, "BC3": 77, "BC4": 80, "BC5": 83}
+
+
+# --- Reference decoder, one texel at a time ---
+
+
+def ref_565(c):
+    r, g, b = (c >> 11) & 31, (c >> 5) & 63, c & 31
+    return [(r << 3) | (r >> 2), (g << 2) | (g >> 4), (b << 3) | (b >> 2)]
+
+
+def ref_bc1(block, four_color_only=False):
+    c0, c1, bits = struct.unpack("<HHI", block)
+    p0, p1 = ref_565(c0), ref_565(c1)
+    if c0 > c1 or four_color_only:
+        palette = [p0 + [255], p1 + [255],
+                   [(2 * a + b) // 3 for a, b in zip(p0, p1)] + [255],
+                   [(a + 2 * b) // 3 for a, b in zip(p0, p1)] + [255]]
+    else:
+        palette = [p0 + [255], p1 + [255], [(a + b) // 2 for a, b in zip(p0, p1)] + [255], [0, 0, 0, 0]]
+    return [palette[(bits >> (2 * i)) & 3] for i in range(16)]
+
+
+def ref_bc4(block):
+    a0, a1 = block[0], block[1]
+    if a0 > a1:
+        palette = [a0, a1] + [((7 - k) * a0 + k * a1) // 7 for k in range(1, 7)]
+    else:
+        palette = [a0, a1] + [((5 - k) * a0 + k * a1) // 5 for k in range(1, 5)] + [0, 255]
+    bits = int.from_bytes(block[2:8], "little")
+    return [palette[(bits >> (3 * i)) & 7] for i in range(16)]
+
+
+def ref_block(fmt, block):
+    if fmt == "BC1":
+        return ref_bc1(block)
+    if fmt == "BC3":
+        alpha = ref_bc4(block[:8])
+        return [rgb[:3] + [a] for rgb, a in zip(ref_bc1(block[8:], True), alpha)]
+    if fmt == "BC4":
+        return [[v, v, v, 255] for v in ref_bc4(block)]
+    return [[r, g, 0, 255] for r, g in zip(ref_bc4(block[:8]), ref_bc4(block[8:]))]
+
+
+def ref_decode(fmt, data, width, height):
+    """Top-down rows of RGBA uint8 lists"""
+    block_size = addon.BC_BLOCK_SIZES[fmt]
+    blocks_w = (width + 3) // 4
+    image = [[None] * width for _ in range(height)]
+    for i in range(len(data) // block_size):
+        bx, by = i % blocks_w, i // blocks_w
+        texels = ref_block(fmt, data[i * block_size:(i + 1) * block_size])
+        for t, texel in enumerate(texels):
+            x, y = bx * 4 + t % 4, by * 4 + t // 4
+            if x < width and y < height:
+                image[y][x] = texel
+    return image
+
+
+# --- Test files ---
+
+
+def write_dds(path, fmt, width, height, mips, rng, dx10):
+    header = bytearray(128)
+    header[0:4] = b"DDS "
+    struct.pack_into("<7I", header, 4, 124, 0x000A1007, height, width, 0, 0, mips)
+    struct.pack_into("<2I", header, 76, 32, 0x4)
+    header[84:88] = b"DX10" if dx10 else FOURCCS[fmt]
+    struct.pack_into("<I", header, 108, 0x1000)
+    if dx10:
+        header += struct.pack("<5I", DXGI[fmt], 3, 0, 1, 0)
+    levels = []
+    for mip in range(mips):
+        size = addon.dds_mip_size(fmt, width, height, mip)[2]
+        levels.append(bytes(rng.getrandbits(8) for _ in range(size)))
+    with open(path, "wb") as f:
+        f.write(bytes(header) + b"".join(levels))
+    return levels
+
+
+def check_header(path, fmt, width, height, mips, dx10):
+    header = addon.DDSHeader.read(path)
+    fields = (header.format, header.width, header.height, header.mip_count, header.data_offset)
+    expected = (fmt, width, height, mips, 148 if dx10 else 128)
+    if fields != expected:
+        return f"header fields {fields}, expected {expected}"
+    if header.payload_size() != os.path.getsize(path) - header.data_offset:
+        return f"payload size {header.payload_size()} does not match the file"
+    expected_fix = "dxt1_header" if fmt == "BC1" and not dx10 else None
+    if header.fix != expected_fix:
+        return f"fix {header.fix!r}, expected {expected_fix!r}"
+    problems = [p for p in header.problems(os.path.getsize(path)) if not p.startswith("DXT1 header")]
+    if problems:
+        return f"unexpected header problems {problems}"
+    if not header.problems(os.path.getsize(path) - 1):
+        return "a file one byte short is not reported"
+    return None
+
+
+def check_case(path, fmt, width, height, mips, rng, dx10):
+    levels = write_dds(path, fmt, width, height, mips, rng, dx10)
+    error = check_header(path, fmt, width, height, mips, dx10)
+    if error:
+        return f"{fmt} {width}x{height} dx10={dx10}: {error}"
+    for mip, data in enumerate(levels):
+        mip_width, mip_height, _ = addon.dds_mip_size(fmt, width, height, mip)
+        expected = np.array(ref_decode(fmt, data, mip_width, mip_height), dtype=np.float32)[::-1] / 255.0
+        got_width, got_height, got = addon.decode_dds_pixels(path, mip)
+        if (got_width, got_height) != (mip_width, mip_height) or not np.array_equal(got, expected):
+            return f"{fmt} {width}x{height} mip {mip} dx10={dx10}: pixels differ"
+        rows = rng.randint(1, mip_height)
+        _, _, bottom = addon.decode_dds_pixels(path, mip, bottom_rows=rows)
+        if not np.array_equal(bottom, expected[:rows]):
+            return f"{fmt} {width}x{height} mip {mip} dx10={dx10}: bottom {rows} rows differ"
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the BCn decoder against a reference")
+    parser.add_argument("--cases", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    temp_dir = tempfile.mkdtemp(prefix="xv2_bcn_")
+    try:
+        for case in range(args.cases):
+            fmt = rng.choice(sorted(FOURCCS))
+            width, height = rng.randint(1, 40), rng.randint(1, 40)
+            mips = rng.randint(1, max(width, height).bit_length())
+            error = check_case(os.path.join(temp_dir, f"case_{case}.dds"), fmt, width, height, mips, rng,
+                               dx10=rng.random() < 0.5)
+            if error:
+                print(f"FAIL case {case}: {error}")
+                return 1
+        print(f"OK: {args.cases} cases")
+        return 0
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
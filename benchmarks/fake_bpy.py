@@ -0,0 +1,841 @@
+"""Minimal in-process stand-in for the parts of bpy the XV2 addon touches.
+
+Only enough behaviour is modelled to run the addon's node building, texture
+resolution and Apply pipeline headlessly: ID collections, node trees with
+sockets and links, images with a pixel buffer, and the registration and
+property APIs as no-ops. Call install() before importing the addon.
+"""
+
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+import types
+
+
+# --- mathutils ---
+
+class Vector(tuple):
+    def __new__(cls, values=(0.0, 0.0)):
+        return super().__new__(cls, (float(v) for v in values))
+
+    def __add__(self, other):
+        return Vector(a + b for a, b in zip(self, other))
+
+    def __sub__(self, other):
+        return Vector(a - b for a, b in zip(self, other))
+
+    @property
+    def x(self):
+        return self[0]
+
+    @property
+    def y(self):
+        return self[1]
+
+
+# --- ID collections ---
+
+class _ID:
+    _pointer_seq = 0
+
+    def __init__(self, name):
+        self.name = name
+        self.use_fake_user = False
+        self._props = {}
+        _ID._pointer_seq += 1
+        self._pointer = _ID._pointer_seq
+
+    def as_pointer(self):
+        return self._pointer
+
+    def __getitem__(self, key):
+        return self._props[key]
+
+    def __setitem__(self, key, value):
+        self._props[key] = value
+
+    def __delitem__(self, key):
+        del self._props[key]
+
+    def __contains__(self, key):
+        return key in self._props
+
+    def get(self, key, default=None):
+        return self._props.get(key, default)
+
+    def keys(self):
+        return self._props.keys()
+
+    def user_remap(self, new_id):
+        for obj in data.objects:
+            for slot in obj.material_slots:
+                if slot.material is self:
+                    slot.material = new_id
+        trees = [mat.node_tree for mat in data.materials if mat.node_tree] + list(data.node_groups)
+        for tree in trees:
+            for node in tree.nodes:
+                if getattr(node, "image", None) is self:
+                    node.image = new_id
+                if getattr(node, "node_tree", None) is self:
+                    node.node_tree = new_id
+
+
+class _IDCollection:
+    def __init__(self, factory):
+        self._items = {}
+        self._factory = factory
+
+    def _unique_name(self, name):
+        if name not in self._items:
+            return name
+        i = 1
+        while f"{name}.{i:03d}" in self._items:
+            i += 1
+        return f"{name}.{i:03d}"
+
+    def _rename(self, item, new_name):
+        self._items.pop(item._name, None)
+        new_name = self._unique_name(new_name)
+        self._items[new_name] = item
+        return new_name
+
+    def new(self, name, *args, **kwargs):
+        item = self._factory(self._unique_name(name), *args, **kwargs)
+        item._collection = self
+        self._items[item._name] = item
+        return item
+
+    def remove(self, item, do_unlink=True):
+        self._items.pop(item._name, None)
+        item._removed = True
+
+    def get(self, name, default=None):
+        return self._items.get(name, default)
+
+    def __getitem__(self, name):
+        if isinstance(name, int):
+            return list(self._items.values())[name]
+        return self._items[name]
+
+    def __contains__(self, name):
+        return name in self._items
+
+    def __iter__(self):
+        return iter(list(self._items.values()))
+
+    def __len__(self):
+        return len(self._items)
+
+    def keys(self):
+        return list(self._items.keys())
+
+
+class _NamedID(_ID):
+    """ID whose name setter keeps its owning collection in sync."""
+
+    def __init__(self, name):
+        self._collection = None
+        self._name = name
+        self._removed = False
+        super().__init__(name)
+
+    @property
+    def name(self):
+        return self._name
+
+    @name.setter
+    def name(self, value):
+        if self._collection is not None and value != self._name:
+            value = self._collection._rename(self, value)
+        self._name = value
+
+
+# --- Sockets, nodes, links ---
+
+class NodeSocket:
+    def __init__(self, node, name, identifier, is_output, default_value=0.0):
+        self.node = node
+        self.name = name
+        self.identifier = identifier
+        self.is_output = is_output
+        self.default_value = list(default_value) if isinstance(default_value, (tuple, list)) else default_value
+        self.enabled = True
+        self.hide = False
+
+    @property
+    def links(self):
+        tree = self.node.id_data
+        if self.is_output:
+            return [l for l in tree.links if l.from_socket is self]
+        return [l for l in tree.links if l.to_socket is self]
+
+    @property
+    def is_linked(self):
+        return bool(self.links)
+
+    def __repr__(self):
+        return f"<Socket {self.node.name}.{self.name}>"
+
+
+class _SocketList:
+    """Socket collection that grows on demand for index/name access."""
+
+    def __init__(self, node, is_output, names=(), strict=False):
+        self._node = node
+        self._is_output = is_output
+        self._sockets = []
+        self._strict = strict
+        for name, default in names:
+            self._add(name, default)
+
+    def _add(self, name, default=0.0):
+        sock = NodeSocket(self._node, name, f"{name}_{len(self._sockets)}", self._is_output, default)
+        self._sockets.append(sock)
+        return sock
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            while key >= len(self._sockets):
+                if self._strict:
+                    raise IndexError(key)
+                self._add(f"Socket_{len(self._sockets)}")
+            return self._sockets[key]
+        for sock in self._sockets:
+            if sock.name == key:
+                return sock
+        if self._strict:
+            raise KeyError(key)
+        return self._add(key)
+
+    def get(self, key, default=None):
+        for sock in self._sockets:
+            if sock.name == key:
+                return sock
+        return default
+
+    def __contains__(self, key):
+        return any(s.name == key for s in self._sockets) or not self._strict
+
+    def __iter__(self):
+        return iter(self._sockets)
+
+    def __len__(self):
+        return len(self._sockets)
+
+
+_VEC3 = (0.0, 0.0, 0.0)
+_RGBA = (0.8, 0.8, 0.8, 1.0)
+
+# (type, inputs, outputs) for the node types whose socket names matter.
+_NODE_SOCKETS = {
+    "ShaderNodeTexImage": ("TEX_IMAGE", [("Vector", _VEC3)], [("Color", _RGBA), ("Alpha", 1.0)]),
+    "ShaderNodeMapping": ("MAPPING", [("Vector", _VEC3), ("Location", _VEC3), ("Rotation", _VEC3),
+                                      ("Scale", (1.0, 1.0, 1.0))], [("Vector", _VEC3)]),
+    "ShaderNodeInvert": ("INVERT", [("Fac", 1.0), ("Color", _RGBA)], [("Color", _RGBA)]),
+    "ShaderNodeTexCoord": ("TEX_COORD", [], [("Generated", _VEC3), ("Normal", _VEC3), ("UV", _VEC3)]),
+    "ShaderNodeVectorTransform": ("VECT_TRANSFORM", [("Vector", _VEC3)], [("Vector", _VEC3)]),
+    "ShaderNodeOutputMaterial": ("OUTPUT_MATERIAL", [("Surface", None), ("Volume", None),
+                                                     ("Displacement", _VEC3), ("Thickness", 0.0)], []),
+    "ShaderNodeAttribute": ("ATTRIBUTE", [], [("Color", _RGBA), ("Vector", _VEC3), ("Fac", 0.0),
+                                              ("Alpha", 1.0)]),
+    "ShaderNodeNewGeometry": ("NEW_GEOMETRY", [], [("Position", _VEC3), ("Normal", _VEC3)]),
+    "ShaderNodeBsdfPrincipled": ("BSDF_PRINCIPLED", [("Base Color", _RGBA)], [("BSDF", None)]),
+    "ShaderNodeMath": ("MATH", [("Value", 0.5), ("Value", 0.5), ("Value", 0.5)], [("Value", 0.0)]),
+    "NodeFrame": ("FRAME", [], []),
+    "NodeReroute": ("REROUTE", [("Input", None)], [("Output", None)]),
+}
+
+
+class ImageUser:
+    def __init__(self):
+        self.frame_current = 1
+        self.frame_duration = 1
+        self.frame_offset = 0
+        self.frame_start = 1
+        self.tile = 0
+        self.use_auto_refresh = False
+        self.use_cyclic = False
+
+
+class Node:
+    def __init__(self, tree, bl_idname, name):
+        self.id_data = tree
+        self.bl_idname = bl_idname
+        self.name = name
+        self.label = ""
+        self.location = Vector((0.0, 0.0))
+        self.parent = None
+        self.width = 140.0
+        self.height = 100.0
+        self.hide = False
+        self._node_tree = None
+        spec = _NODE_SOCKETS.get(bl_idname)
+        if bl_idname == "ShaderNodeGroup":
+            self.type = "GROUP"
+            self.inputs = _SocketList(self, False, strict=True)
+            self.outputs = _SocketList(self, True, strict=True)
+        elif bl_idname == "NodeGroupInput":
+            self.type = "GROUP_INPUT"
+            self.inputs = _SocketList(self, False)
+            self.outputs = _SocketList(self, True, [(s.name, s.default_value) for s in tree.interface._inputs()])
+        elif bl_idname == "NodeGroupOutput":
+            self.type = "GROUP_OUTPUT"
+            self.inputs = _SocketList(self, False, [(s.name, s.default_value) for s in tree.interface._outputs()])
+            self.outputs = _SocketList(self, True)
+        elif spec:
+            self.type = spec[0]
+            self.inputs = _SocketList(self, False, spec[1])
+            self.outputs = _SocketList(self, True, spec[2])
+        else:
+            self.type = bl_idname.replace("ShaderNode", "").upper()
+            self.inputs = _SocketList(self, False)
+            self.outputs = _SocketList(self, True)
+        if bl_idname == "ShaderNodeMath":
+            self.operation = 'ADD'
+        if bl_idname == "ShaderNodeAttribute":
+            self.attribute_type = 'GEOMETRY'
+            self.attribute_name = ""
+        if bl_idname == "ShaderNodeTexImage":
+            self.image = None
+            self.image_user = ImageUser()
+            self.extension = 'REPEAT'
+            self.interpolation = 'Linear'
+            self.projection = 'FLAT'
+            self.projection_blend = 0.0
+
+    @property
+    def node_tree(self):
+        return self._node_tree
+
+    @node_tree.setter
+    def node_tree(self, group):
+        self._node_tree = group
+        if group is None:
+            return
+        # Like Blender, sockets that still exist keep their values and links
+        self.inputs = self._group_sockets(self.inputs, False, group.interface._inputs())
+        self.outputs = self._group_sockets(self.outputs, True, group.interface._outputs())
+
+    def _group_sockets(self, old, is_output, items):
+        sockets = _SocketList(self, is_output, [(s.name, s.default_value) for s in items], strict=True)
+        for i, sock in enumerate(sockets._sockets):
+            kept = old.get(sock.name) if old is not None else None
+            if kept is not None:
+                sockets._sockets[i] = kept
+        return sockets
+
+    def __repr__(self):
+        return f"<Node {self.name}>"
+
+
+class NodeLink:
+    def __init__(self, from_socket, to_socket):
+        self.from_socket = from_socket
+        self.to_socket = to_socket
+        self.from_node = from_socket.node
+        self.to_node = to_socket.node
+        self.is_valid = True
+        self.is_muted = False
+
+
+class _Nodes:
+    def __init__(self, tree):
+        self._tree = tree
+        self._nodes = {}
+
+    def new(self, bl_idname):
+        base = bl_idname.replace("ShaderNode", "").replace("Node", "") or bl_idname
+        name = base
+        i = 0
+        while name in self._nodes:
+            i += 1
+            name = f"{base}.{i:03d}"
+        node = _TrackedNode(self, self._tree, bl_idname, name)
+        self._nodes[name] = node
+        self._tree._mutations += 1
+        return node
+
+    def remove(self, node):
+        self._tree.links._remove_for_node(node)
+        self._nodes.pop(node.name, None)
+        self._tree._mutations += 1
+
+    def get(self, name, default=None):
+        return self._nodes.get(name, default)
+
+    def __getitem__(self, name):
+        return self._nodes[name]
+
+    def __contains__(self, name):
+        return name in self._nodes
+
+    def __iter__(self):
+        return iter(list(self._nodes.values()))
+
+    def __len__(self):
+        return len(self._nodes)
+
+
+class _TrackedNode(Node):
+    """Node whose renames keep the owning nodes mapping keyed by name."""
+
+    def __init__(self, owner, tree, bl_idname, name):
+        self.__dict__["_owner"] = owner
+        super().__init__(tree, bl_idname, name)
+
+    def __setattr__(self, key, value):
+        if key == "name" and "name" in self.__dict__:
+            owner = self.__dict__["_owner"]
+            old = self.__dict__["name"]
+            if old != value:
+                owner._nodes.pop(old, None)
+                base, i = value, 0
+                while value in owner._nodes:
+                    i += 1
+                    value = f"{base}.{i:03d}"
+                owner._nodes[value] = self
+        super().__setattr__(key, value)
+
+
+class _Links:
+    def __init__(self, tree):
+        self._tree = tree
+        self._links = []
+
+    def new(self, from_socket, to_socket, verify_limits=True):
+        if not to_socket.is_output:
+            self._links = [l for l in self._links if l.to_socket is not to_socket]
+        link = NodeLink(from_socket, to_socket)
+        self._links.append(link)
+        self._tree._mutations += 1
+        return link
+
+    def remove(self, link):
+        self._links.remove(link)
+        link.is_valid = False
+        self._tree._mutations += 1
+
+    def _remove_for_node(self, node):
+        self._links = [l for l in self._links if l.from_node is not node and l.to_node is not node]
+
+    def __iter__(self):
+        return iter(list(self._links))
+
+    def __len__(self):
+        return len(self._links)
+
+
+class _InterfaceSocket:
+    item_type = 'SOCKET'
+
+    def __init__(self, name, in_out, socket_type):
+        self.name = name
+        self.in_out = in_out
+        self.socket_type = socket_type
+        self.default_value = 0.0
+        self.min_value = 0.0
+        self.max_value = 1.0
+        self.subtype = 'NONE'
+        self.attribute_domain = 'POINT'
+        self.description = ""
+        self.hide_value = False
+
+
+class _Interface:
+    def __init__(self):
+        self.items_tree = []
+
+    def new_socket(self, name, in_out='INPUT', socket_type='NodeSocketFloat', **_):
+        sock = _InterfaceSocket(name, in_out, socket_type)
+        self.items_tree.append(sock)
+        return sock
+
+    def _inputs(self):
+        return [s for s in self.items_tree if s.in_out == 'INPUT']
+
+    def _outputs(self):
+        return [s for s in self.items_tree if s.in_out == 'OUTPUT']
+
+
+class NodeTree(_NamedID):
+    def __init__(self, name, type='ShaderNodeTree'):
+        super().__init__(name)
+        self.bl_idname = type
+        self.interface = _Interface()
+        self._mutations = 0
+        self.nodes = _Nodes(self)
+        self.links = _Links(self)
+        self.color_tag = 'NONE'
+        self.description = ""
+
+    @property
+    def users(self):
+        trees = [m.node_tree for m in data.materials if m.node_tree] + list(data.node_groups)
+        return sum(1 for t in trees for n in t.nodes if getattr(n, "node_tree", None) is self)
+
+
+# --- Materials, images, objects ---
+
+class Material(_NamedID):
+    def __init__(self, name):
+        super().__init__(name)
+        self._use_nodes = False
+        self.node_tree = None
+        self.blend_method = 'OPAQUE'
+        self.show_transparent_back = True
+        self.use_backface_culling = False
+
+    @property
+    def use_nodes(self):
+        return self._use_nodes
+
+    @use_nodes.setter
+    def use_nodes(self, value):
+        self._use_nodes = value
+        if value and self.node_tree is None:
+            self.node_tree = NodeTree(f"{self.name} Tree")
+            bsdf = self.node_tree.nodes.new("ShaderNodeBsdfPrincipled")
+            bsdf.name = "Principled BSDF"
+            out = self.node_tree.nodes.new("ShaderNodeOutputMaterial")
+            out.name = "Material Output"
+            self.node_tree.links.new(bsdf.outputs[0], out.inputs[0])
+
+    @property
+    def users(self):
+        return sum(1 for obj in data.objects for slot in obj.material_slots if slot.material is self)
+
+    def copy(self):
+        dup = data.materials.new(self.name)
+        dup._use_nodes = self._use_nodes
+        dup.node_tree = self.node_tree
+        dup._props = dict(self._props)
+        return dup
+
+
+class _Pixels:
+    """Flat RGBA float buffer with the foreach_get/slice API of Image.pixels."""
+
+    def __init__(self, image):
+        self._image = image
+
+    def _buffer(self):
+        img = self._image
+        if img._pixels is None:
+            w, h = img.size
+            img._pixels = [0.0] * (w * h * 4)
+        return img._pixels
+
+    def __len__(self):
+        w, h = self._image.size
+        return w * h * 4
+
+    def __getitem__(self, key):
+        return self._buffer()[key]
+
+    def __iter__(self):
+        return iter(self._buffer())
+
+    def foreach_get(self, seq):
+        buf = self._buffer()
+        seq[:len(buf)] = buf
+
+    def foreach_set(self, seq):
+        self._image._pixels = [float(v) for v in seq]
+
+
+class _ColorSpace:
+    def __init__(self):
+        self.name = 'sRGB'
+
+
+class Image(_NamedID):
+    def __init__(self, name, width=8, height=8, alpha=True, float_buffer=False, **_):
+        super().__init__(name)
+        self.filepath = ""
+        self.filepath_raw = ""
+        self.size = (width, height)
+        self.source = 'GENERATED'
+        self.packed_file = None
+        self.file_format = 'PNG'
+        self.alpha_mode = 'STRAIGHT'
+        self.colorspace_settings = _ColorSpace()
+        self.is_float = float_buffer
+        self.has_data = False
+        self.is_dirty = False
+        self._pixels = None
+        self.pixels = _Pixels(self)
+
+    @property
+    def users(self):
+        count = 0
+        for mat in data.materials:
+            if mat.node_tree:
+                count += sum(1 for n in mat.node_tree.nodes if getattr(n, "image", None) is self)
+        return count + (1 if self.use_fake_user else 0)
+
+    def pack(self, data=None, data_len=0):
+        self.packed_file = types.SimpleNamespace(size=data_len or 0, data=data)
+
+    def unpack(self, method='USE_LOCAL'):
+        self.packed_file = None
+
+    def reload(self):
+        self._pixels = None
+
+    def buffers_free(self):
+        self._pixels = None
+        self.has_data = False
+
+    def update(self):
+        pass
+
+    def save(self, filepath=None, quality=None):
+        path = filepath or self.filepath_raw
+        with open(path, "wb") as f:
+            f.write(b"\x89PNG\r\n\x1a\n")
+
+    def scale(self, width, height):
+        self.size = (width, height)
+        self._pixels = None
+
+
+def _read_dds_size(path):
+    try:
+        with open(path, "rb") as f:
+            header = f.read(20)
+        if header[:4] == b"DDS ":
+            height = int.from_bytes(header[12:16], "little")
+            width = int.from_bytes(header[16:20], "little")
+            return width, height
+    except OSError:
+        pass
+    return 8, 8
+
+
+class _Images(_IDCollection):
+    def __init__(self):
+        super().__init__(Image)
+
+    def load(self, filepath, check_existing=False):
+        abs_path = os.path.abspath(filepath)
+        if not os.path.exists(abs_path):
+            raise RuntimeError(f"Error: Cannot read image '{filepath}'")
+        if check_existing:
+            for img in self:
+                if img.filepath and os.path.abspath(img.filepath) == abs_path:
+                    return img
+        img = self.new(os.path.basename(filepath))
+        img.filepath = filepath
+        img.filepath_raw = filepath
+        img.source = 'FILE'
+        img.size = _read_dds_size(abs_path)
+        return img
+
+
+class MaterialSlot:
+    def __init__(self, material=None):
+        self.material = material
+        self.link = 'DATA'
+
+
+class Object(_NamedID):
+    def __init__(self, name, object_data=None):
+        super().__init__(name)
+        self.type = 'MESH'
+        self.data = object_data if object_data is not None else types.SimpleNamespace(name=name)
+        self.material_slots = []
+        self._selected = False
+
+    def select_get(self):
+        return self._selected
+
+    def select_set(self, state):
+        self._selected = state
+
+    def update_tag(self, refresh=None):
+        pass
+
+
+class Text(_NamedID):
+    def __init__(self, name):
+        super().__init__(name)
+        self._body = []
+
+    def clear(self):
+        self._body = []
+
+    def write(self, text):
+        self._body.append(text)
+
+    def as_string(self):
+        return "".join(self._body)
+
+
+# --- Module assembly ---
+
+class _BlendData:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.images = _Images()
+        self.materials = _IDCollection(Material)
+        self.node_groups = _IDCollection(NodeTree)
+        self.objects = _IDCollection(Object)
+        self.texts = _IDCollection(Text)
+        self.meshes = _IDCollection(_NamedID)
+        self.filepath = ""
+        self.is_dirty = False
+
+    def batch_remove(self, ids):
+        for item in ids:
+            if getattr(item, "_collection", None) is not None:
+                item._collection.remove(item)
+
+
+data = _BlendData()
+
+
+class _Prop:
+    def __init__(self, *args, **kwargs):
+        self.default = kwargs.get("default")
+
+
+def _prop_factory(*args, **kwargs):
+    return _Prop(*args, **kwargs)
+
+
+class _BaseStruct:
+    bl_idname = ""
+
+    def report(self, level, message):
+        self.last_report = (set(level), message)
+
+
+def _abspath(path, start=None, library=None):
+    if path.startswith("//"):
+        base = os.path.dirname(data.filepath) if data.filepath else os.getcwd()
+        return os.path.join(base, path[2:])
+    return path
+
+
+def _display_name_from_filepath(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def _register_timer(fn, first_interval=0.0, persistent=False):
+    _pending_timers.append(fn)
+
+
+def _unregister_timer(fn):
+    if fn in _pending_timers:
+        _pending_timers.remove(fn)
+
+
+def _is_timer_registered(fn):
+    return fn in _pending_timers
+
+
+_pending_timers = []
+
+
+def run_timers(limit=1000):
+    """Drive registered bpy.app.timers callbacks until they stop re-arming."""
+    for _ in range(limit):
+        if not _pending_timers:
+            return
+        for fn in list(_pending_timers):
+            interval = fn()
+            if interval is None:
+                _unregister_timer(fn)
+
+
+def _fake_home():
+    """XV2_FAKE_BPY_HOME, or a throwaway folder removed at exit so caches never land in the tree"""
+    if "XV2_FAKE_BPY_HOME" not in os.environ:
+        os.environ["XV2_FAKE_BPY_HOME"] = tempfile.mkdtemp(prefix="xv2_fake_bpy_home_")
+        atexit.register(shutil.rmtree, os.environ["XV2_FAKE_BPY_HOME"], ignore_errors=True)
+    return os.environ["XV2_FAKE_BPY_HOME"]
+
+
+def _user_resource(resource_type, path="", create=False):
+    root = os.path.join(_fake_home(), resource_type.lower(), path)
+    if create:
+        os.makedirs(root, exist_ok=True)
+    return root
+
+
+def install():
+    """Register bpy and mathutils stand-ins in sys.modules."""
+    bpy = types.ModuleType("bpy")
+    bpy.data = data
+    bpy.props = types.ModuleType("bpy.props")
+    for prop in ("StringProperty", "EnumProperty", "BoolProperty", "IntProperty", "FloatProperty",
+                 "PointerProperty", "CollectionProperty"):
+        setattr(bpy.props, prop, _prop_factory)
+    bpy.types = types.ModuleType("bpy.types")
+    for cls_name in ("AddonPreferences", "Panel", "Operator", "PropertyGroup", "UIList", "Menu"):
+        setattr(bpy.types, cls_name, type(cls_name, (_BaseStruct,), {}))
+    bpy.types.Image = Image
+    bpy.types.Material = Material
+    bpy.types.Object = Object
+    bpy.utils = types.SimpleNamespace(register_class=lambda cls: None, unregister_class=lambda cls: None,
+                                      user_resource=_user_resource)
+    bpy.path = types.SimpleNamespace(abspath=_abspath, display_name_from_filepath=_display_name_from_filepath,
+                                     basename=os.path.basename)
+    handlers = types.ModuleType("bpy.app.handlers")
+    for name in ("load_post", "undo_post", "redo_post", "render_init", "render_pre", "render_post",
+                 "render_complete", "render_cancel", "save_pre", "depsgraph_update_post"):
+        setattr(handlers, name, [])
+    handlers.persistent = lambda fn: fn
+    timers = types.ModuleType("bpy.app.timers")
+    timers.register = _register_timer
+    timers.unregister = _unregister_timer
+    timers.is_registered = _is_timer_registered
+    bpy.app = types.ModuleType("bpy.app")
+    bpy.app.version = (4, 2, 0)
+    bpy.app.background = True
+    bpy.app.handlers = handlers
+    bpy.app.timers = timers
+    bpy.app.binary_path = "blender"
+    bpy.app.tempdir = ""
+    bpy.ops = types.SimpleNamespace()
+    bpy.context = types.SimpleNamespace(preferences=types.SimpleNamespace(addons={}))
+    mathutils = types.ModuleType("mathutils")
+    mathutils.Vector = Vector
+    sys.modules["bpy"] = bpy
+    sys.modules["bpy.props"] = bpy.props
+    sys.modules["bpy.types"] = bpy.types
+    sys.modules["bpy.app"] = bpy.app
+    sys.modules["bpy.app.handlers"] = handlers
+    sys.modules["bpy.app.timers"] = timers
+    sys.modules["mathutils"] = mathutils
+    return bpy
+
+
+class Preferences:
+    """Stand-in for the addon preferences object read through context.preferences."""
+
+    def __init__(self, **values):
+        self.__dict__.update(values)
+
+
+def make_context(prefs, addon_name, selected_objects=()):
+    """Build a context exposing preferences.addons[addon_name].preferences."""
+    addon = types.SimpleNamespace(preferences=prefs)
+    return types.SimpleNamespace(
+        preferences=types.SimpleNamespace(addons={addon_name: addon}),
+        selected_objects=list(selected_objects),
+        active_object=selected_objects[0] if selected_objects else None,
+        window=object(),
+        window_manager=types.SimpleNamespace(progress_begin=lambda a, b: None,
+                                             progress_update=lambda v: None,
+                                             progress_end=lambda: None,
+                                             event_timer_add=lambda step, window=None: object(),
+                                             event_timer_remove=lambda timer: None,
+                                             modal_handler_add=lambda op: None),
+        workspace=types.SimpleNamespace(status_text_set=lambda text: None),
+        scene=types.SimpleNamespace(render=types.SimpleNamespace(engine='BLENDER_EEVEE_NEXT')),
+    )
@@ -0,0 +1,120 @@
+"""Synthetic XV2 asset trees for the benchmarks.
+
+Writes, under one output folder:
+
+    emm/<char>.emm.xml                      one Material entry per part
+    textures/<char>/<char>_<part>_<kind>.dds  000/001/002/dyt with valid DDS headers
+    textures/<char>/DATA_001.dds ...         DATA_NNN set per character
+    manifest.json                           characters -> material names, for building scenes
+
+Usage: python generate_assets.py OUT [--characters 20] [--parts 8] [--data-files 3] [--size 256]
+"""
+
+import argparse
+import json
+import os
+import struct
+
+PARTS = ("body", "hair", "face", "eye", "glass", "shoes", "gloves", "belt", "cape", "armor", "pants", "scarf")
+SHADERS = {
+    "eye": "EYE_MUT1",
+    "glass": "TOON_UNIF_ENV",
+    "hair": "TOON_UNIF_STAIN3_MSK",
+    "face": "TOON_UNIF_STAIN3_DFD",
+}
+DEFAULT_SHADER = "TOON_UNIF_STAIN3_DFD_XVM"
+KIND_FORMATS = {"000": b"DXT1", "001": b"DXT5", "002": b"DXT5", "dyt": b"DXT1"}
+
+DDSD_CAPS, DDSD_HEIGHT, DDSD_WIDTH, DDSD_PIXELFORMAT = 0x1, 0x2, 0x4, 0x1000
+DDSD_MIPMAPCOUNT, DDSD_LINEARSIZE = 0x20000, 0x80000
+DDPF_FOURCC = 0x4
+DDSCAPS_TEXTURE = 0x1000
+
+SCALES = {
+    "small": {"characters": 5, "parts": 6, "data_files": 2, "size": 64},
+    "medium": {"characters": 20, "parts": 8, "data_files": 3, "size": 256},
+    "large": {"characters": 60, "parts": 10, "data_files": 4, "size": 512},
+}
+
+
+def dds_bytes(width, height, fourcc=b"DXT1", broken=False):
+    """Top-mip-only BCn DDS. broken reproduces the bad DXT1 header the DYT fix repairs."""
+    block_size = 8 if fourcc in (b"DXT1", b"ATI1", b"BC4U") else 16
+    linear_size = max(1, (width + 3) // 4) * max(1, (height + 3) // 4) * block_size
+    header = bytearray(128)
+    header[0:4] = b"DDS "
+    flags = DDSD_CAPS | DDSD_HEIGHT | DDSD_WIDTH | DDSD_PIXELFORMAT
+    if broken:
+        flags |= DDSD_MIPMAPCOUNT | DDSD_LINEARSIZE
+    struct.pack_into("<7I", header, 4, 124, flags, height, width, linear_size if broken else 0, 0, 3 if broken else 0)
+    struct.pack_into("<2I", header, 76, 32, DDPF_FOURCC)
+    header[84:88] = fourcc
+    struct.pack_into("<I", header, 108, DDSCAPS_TEXTURE)
+    return bytes(header) + bytes(linear_size)
+
+
+def emm_xml(character, parts):
+    lines = ["<EMM>"]
+    for i, part in enumerate(parts):
+        shader = SHADERS.get(part, DEFAULT_SHADER)
+        lines.append(f'  <Material Name="{character}_{part}" Shader="{shader}">')
+        lines.append(f'    <Parameter Name="MatScale1X" value="{i % 7}"/>')
+        lines.append("  </Material>")
+    lines.append("</EMM>")
+    return "\n".join(lines) + "\n"
+
+
+def generate(out_dir, characters=20, parts=8, data_files=3, size=256):
+    """Write a synthetic tree into out_dir and return its manifest"""
+    emm_dir = os.path.join(out_dir, "emm")
+    tex_dir = os.path.join(out_dir, "textures")
+    os.makedirs(emm_dir, exist_ok=True)
+    os.makedirs(tex_dir, exist_ok=True)
+    part_names = [PARTS[i % len(PARTS)] + ("" if i < len(PARTS) else f"{i // len(PARTS)}") for i in range(parts)]
+    manifest = {"emm_dir": emm_dir, "tex_dir": tex_dir, "size": size, "characters": {}}
+    payloads = {(fourcc, broken): dds_bytes(size, size, fourcc, broken)
+                for fourcc in set(KIND_FORMATS.values()) for broken in (False, True)}
+
+    for c in range(characters):
+        character = f"chr{c:03d}"
+        char_dir = os.path.join(tex_dir, character)
+        os.makedirs(char_dir, exist_ok=True)
+        with open(os.path.join(emm_dir, f"{character}.emm.xml"), "w", encoding="utf-8") as f:
+            f.write(emm_xml(character, part_names))
+        for p, part in enumerate(part_names):
+            for kind, fourcc in KIND_FORMATS.items():
+                # Every few characters get a broken DXT1 DYT, as seen in real mods
+                broken = kind == "dyt" and (c + p) % 5 == 0
+                with open(os.path.join(char_dir, f"{character}_{part}_{kind}.dds"), "wb") as f:
+                    f.write(payloads[(fourcc, broken)])
+        for d in range(1, data_files + 1):
+            with open(os.path.join(char_dir, f"DATA_{d:03d}.dds"), "wb") as f:
+                f.write(payloads[(b"DXT1", False)])
+        # Imported FBX materials often come in with .001 suffixes
+        manifest["characters"][character] = [f"{character}_{part}" + (".001" if p % 3 == 2 else "")
+                                             for p, part in enumerate(part_names)]
+
+    with open(os.path.join(out_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("out_dir")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="medium")
+    parser.add_argument("--characters", type=int)
+    parser.add_argument("--parts", type=int)
+    parser.add_argument("--data-files", type=int)
+    parser.add_argument("--size", type=int)
+    args = parser.parse_args()
+    params = dict(SCALES[args.scale])
+    for key in params:
+        if getattr(args, key) is not None:
+            params[key] = getattr(args, key)
+    manifest = generate(args.out_dir, **params)
+    print(f"Generated {len(manifest['characters'])} characters in {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""Headless benchmarks for the XV2 addon's hot paths.
+
+Runs the addon against fake_bpy (no Blender needed) on a synthetic asset tree
+from generate_assets.py and writes timings as JSON:
+
+    python benchmarks/run_benchmarks.py --scale medium --output results.json
+    python benchmarks/run_benchmarks.py --compare results.json   # exit 1 on regressions
+
+Timings are wall-clock seconds per benchmark run; min and median over --repeat runs.
+"""
+
+import argparse
+import contextlib
+import datetime
+import importlib.util
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+import fake_bpy  # noqa: E402
+import generate_assets  # noqa: E402
+
+bpy = fake_bpy.install()
+ADDON_PATH = os.path.join(os.path.dirname(HERE), "XV2AutoShader.py")
+
+
+def load_addon(path=ADDON_PATH):
+    spec = importlib.util.spec_from_file_location("XV2AutoShader", path)
+    addon = importlib.util.module_from_spec(spec)
+    sys.modules["XV2AutoShader"] = addon
+    spec.loader.exec_module(addon)
+    return addon
+
+
+addon = load_addon()
+
+
+# --- Scene helpers ---
+
+
+def reset_data():
+    fake_bpy.data.reset()
+    addon.invalidate_role_index()
+
+
+def clear_caches():
+    """Forget everything the addon keeps between runs, for cold timings"""
+    for name in dir(addon):
+        value = getattr(addon, name)
+        if name.startswith("_") and name.endswith("_cache") and isinstance(value, dict):
+            value.clear()
+    addon.clear_mask_analysis_cache()
+
+
+def build_scene(manifest):
+    for character, materials in manifest["characters"].items():
+        obj = bpy.data.objects.new(character)
+        for name in materials:
+            obj.material_slots.append(fake_bpy.MaterialSlot(bpy.data.materials.get(name) or
+                                                            bpy.data.materials.new(name)))
+
+
+def make_context(manifest):
+    prefs = fake_bpy.Preferences(emm_dir=manifest["emm_dir"], tex_dir=manifest["tex_dir"])
+    for name, prop in getattr(addon.XV2_Prefs, "__annotations__", {}).items():
+        if not hasattr(prefs, name):
+            setattr(prefs, name, getattr(prop, "default", None))
+    return fake_bpy.make_context(prefs, addon.__name__)
+
+
+def new_operator(cls, **props):
+    op = cls()
+    for name, prop in getattr(cls, "__annotations__", {}).items():
+        setattr(op, name, props.get(name, getattr(prop, "default", None)))
+    return op
+
+
+# --- Benchmarks ---
+# Each returns (setup, run); setup is untimed and runs before every repeat.
+
+
+def bench_build_row_map(manifest):
+    return clear_caches, lambda: addon.build_row_map(manifest["emm_dir"])
+
+
+def material_stubs(manifest):
+    return [addon.strip_num(name) for materials in manifest["characters"].values() for name in materials]
+
+
+def bench_find_image(manifest):
+    stubs = material_stubs(manifest)
+
+    def setup():
+        reset_data()
+        clear_caches()
+
+    def run():
+        for stub in stubs:
+            for kind in ("dyt", "000", "001", "002"):
+                addon.find_image(stub, stub, kind, manifest["tex_dir"])
+    return setup, run
+
+
+def bench_scan_dyt_data_files(manifest):
+    stubs = material_stubs(manifest)
+    pairs = []
+
+    def setup():
+        reset_data()
+        pairs[:] = [(bpy.data.materials.new(stub), addon.find_image(stub, stub, "dyt", manifest["tex_dir"]))
+                    for stub in stubs]
+
+    def run():
+        for mat, dyt_image in pairs:
+            addon.scan_and_store_dyt_data_files(mat, dyt_image)
+    return setup, run
+
+
+def bench_analyze_mask_type(manifest, mode="FIRST"):
+    size = manifest["size"]
+    rng = random.Random(1234)
+    pixels = [rng.random() for _ in range(size * size * 4)]
+    images = []
+
+    def setup():
+        reset_data()
+        images[:] = []
+        for i in range(8):
+            img = bpy.data.images.new(f"mask_{i}", width=size, height=size)
+            img.pixels.foreach_set(pixels)
+            images.append(img)
+
+    def run():
+        for img in images:
+            addon.analyze_mask_type(img, mode)
+    return setup, run
+
+
+def bench_decode_dds(manifest):
+    tex_dir = manifest["tex_dir"]
+    paths = sorted(os.path.join(root, f) for root, _, files in os.walk(tex_dir) for f in files
+                   if f.endswith("_001.dds"))[:16]
+    return (lambda: None), lambda: [addon.decode_dds_pixels(path, 0) for path in paths]
+
+
+def bench_memory_estimate(manifest):
+    ctx = make_context(manifest)
+
+    def setup():
+        reset_data()
+        build_scene(manifest)
+
+    def run():
+        assert new_operator(addon.XV2_OT_memory_estimate).execute(ctx) == {'FINISHED'}
+    return setup, run
+
+
+def bench_apply(manifest, warm=False):
+    ctx = make_context(manifest)
+
+    def setup():
+        reset_data()
+        clear_caches()
+        build_scene(manifest)
+        if warm:
+            new_operator(addon.XV2_OT_apply).execute(ctx)
+
+    def run():
+        op = new_operator(addon.XV2_OT_apply)
+        assert op.execute(ctx) == {'FINISHED'}
+    return setup, run
+
+
+BENCHMARKS = {
+    "build_row_map": bench_build_row_map,
+    "find_image": bench_find_image,
+    "scan_and_store_dyt_data_files": bench_scan_dyt_data_files,
+    "analyze_mask_type": bench_analyze_mask_type,
+    "analyze_mask_type_stratified": lambda manifest: bench_analyze_mask_type(manifest, "STRATIFIED"),
+    "analyze_mask_type_full": lambda manifest: bench_analyze_mask_type(manifest, "FULL"),
+    "decode_dds": bench_decode_dds,
+    "memory_estimate": bench_memory_estimate,
+    "apply_cold": bench_apply,
+    "apply_reapply": lambda manifest: bench_apply(manifest, warm=True),
+}
+
+
+def time_benchmark(make, manifest, repeat):
+    setup, run = make(manifest)
+    samples = []
+    with open(os.devnull, "w") as devnull:
+        for _ in range(repeat):
+            with contextlib.redirect_stdout(devnull):
+                setup()
+                start = time.perf_counter()
+                run()
+                samples.append(time.perf_counter() - start)
+    return {
+        "repeat": repeat,
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "mean": statistics.fmean(samples),
+        "samples": samples,
+    }
+
+
+def compare(results, baseline, threshold):
+    """Print a comparison against a previous results file. Returns the names that regressed."""
+    regressions = []
+    for name, result in results["results"].items():
+        old = baseline.get("results", {}).get(name)
+        if not old:
+            continue
+        ratio = result["median"] / old["median"] if old["median"] else float("inf")
+        flag = "REGRESSION" if ratio > 1 + threshold else ""
+        print(f"  {name:32s} {old['median'] * 1000:10.2f} ms -> {result['median'] * 1000:10.2f} ms  "
+              f"x{ratio:5.2f} {flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="XV2 Auto-Shader benchmarks")
+    parser.add_argument("--scale", choices=sorted(generate_assets.SCALES), default="small")
+    parser.add_argument("--assets", default="", help="Reuse a tree from generate_assets.py instead of a temp one")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", nargs="*", default=[], help="Benchmark names to run (default: all)")
+    parser.add_argument("--output", default="", help="Write results JSON here")
+    parser.add_argument("--compare", default="", help="Previous results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed median slowdown before failing")
+    args = parser.parse_args()
+
+    temp_dir = None
+    if args.assets:
+        with open(os.path.join(args.assets, "manifest.json"), encoding="utf-8") as f:
+            manifest = json.load(f)
+    else:
+        temp_dir = tempfile.mkdtemp(prefix="xv2_bench_")
+        manifest = generate_assets.generate(temp_dir, **generate_assets.SCALES[args.scale])
+
+    try:
+        results = {
+            "meta": {
+                "addon_version": ".".join(str(v) for v in addon.bl_info["version"]),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+                "scale": args.scale if not args.assets else "custom",
+                "characters": len(manifest["characters"]),
+                "materials": sum(len(m) for m in manifest["characters"].values()),
+                "texture_size": manifest["size"],
+            },
+            "results": {},
+        }
+        for name, make in BENCHMARKS.items():
+            if args.only and name not in args.only:
+                continue
+            result = time_benchmark(make, manifest, args.repeat)
+            results["results"][name] = result
+            print(f"{name:32s} min {result['min'] * 1000:10.2f} ms   median {result['median'] * 1000:10.2f} ms")
+    finally:
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"Compared with {args.compare}:")
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())